@@ -3,9 +3,10 @@ from django.contrib import admin
 from .models import (Activity, Parameter, Item, Participant)
 from management.admin import (AdminFileInline, ProtectedFileInline,
                                 ProtectedImageInline)
+from communication.admin import FullTextSearchMixin
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'publication_date', 'start_date', 'end_date',
             'is_big_activity', 'is_frontpage', 'is_member_only', 'summary',
             'creation_date', 'modification_date',)
@@ -27,10 +28,12 @@ class ActivityAdmin(admin.ModelAdmin):
 class ParameterInline(admin.StackedInline):
     model = Parameter
     extra = 0
+    readonly_fields = ('bought_items',)
 
 class ItemInline(admin.StackedInline):
     model = Item
     extra = 0
+    readonly_fields = ('bought_items',)
 
 #@admin.register(Parameter)
 class ParameterAdmin(admin.ModelAdmin):
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ActivitiesConfig(AppConfig):
+    name = 'activities'
+
+    def ready(self):
+        #Connect the receivers keeping the bought items counters in sync.
+        from . import signals
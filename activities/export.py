@@ -0,0 +1,70 @@
+"""Export of the participants of an activity.
+
+Participants are read with a single query joining their item, parameter and
+user, and iterated without being cached, so rows can be streamed in constant
+memory whatever the number of participants.
+
+This exports:
+    - EXPORT_HEADER: tuple of the column titles.
+
+    - Echo: pseudo buffer returning what is written in it.
+    - participants_of: return the queryset of the participants of an activity.
+    - participant_rows: yield the rows of the export of an activity.
+    - csv_lines: yield the CSV lines of the export of an activity.
+"""
+from django.db.models import Q
+from django.utils.translation import ugettext as _
+from activities.models import (Parameter, Participant)
+import csv
+
+EXPORT_HEADER = (_('parameter'), _('item'), _('last name'), _('first name'),
+    _('email'), _('phone'), _('unregistered user'), _('payment mean'),
+    _('bank of the cheque'), _('creation date'))
+
+
+class Echo(object):
+    """Pseudo buffer for csv.writer: write returns the line instead of storing
+    it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def participants_of(activity):
+    """Return the participants of activity and of its parameters' subcategories.
+
+    Subcategories are walked level by level, one query per level.
+    """
+
+    parameters = []
+    level = Q(activity=activity)
+    while True:
+        ids = list(Parameter.objects.filter(level).values_list('pk', flat=True))
+        if not ids:
+            break
+        parameters.extend(ids)
+        level = Q(parent_parameter__in=ids)
+    return Participant.objects.filter(item__parameter__in=parameters).\
+        select_related('registered_user__user', 'item__parameter').\
+        order_by('item__parameter__creation_date', 'item__name', 'pk')
+
+
+def participant_rows(activity):
+    yield EXPORT_HEADER
+    for participant in participants_of(activity).iterator():
+        user = participant.registered_user
+        yield (participant.item.parameter.name, participant.item.name,
+            user.user.last_name if user else '',
+            user.user.first_name if user else '',
+            user.user.email if user else '',
+            user.phone if user else '',
+            participant.unregistered_user or '',
+            participant.get_payment_mean_display(), participant.cheque_bank,
+            participant.creation_date.isoformat())
+
+
+def csv_lines(activity):
+    writer = csv.writer(Echo())
+    for row in participant_rows(activity):
+        yield writer.writerow(row)
@@ -0,0 +1,24 @@
+from django.core.management.base import (BaseCommand, CommandError)
+from activities.export import csv_lines
+from activities.models import Activity
+
+
+class Command(BaseCommand):
+    help = 'Write the participants of an activity as CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('activity', type=int, help='Id of the activity.')
+        parser.add_argument('--output', default=None,
+            help='File to write, the standard output by default.')
+
+    def handle(self, *args, **options):
+        try:
+            activity = Activity.objects.get(pk=options['activity'])
+        except Activity.DoesNotExist:
+            raise CommandError('Activity %s does not exist.' % options['activity'])
+        if options['output'] is None:
+            for line in csv_lines(activity):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(csv_lines(activity))
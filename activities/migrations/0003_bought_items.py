@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+CAPPED_TABLES = ('activities_item', 'activities_parameter')
+
+
+def fill_bought_items(apps, schema_editor):
+    Item = apps.get_model('activities', 'Item')
+    Parameter = apps.get_model('activities', 'Parameter')
+    for item in Item.objects.annotate(count=models.Count('participants')):
+        Item.objects.filter(pk=item.pk).update(bought_items=item.count)
+    for parameter in Parameter.objects.annotate(count=models.Count(
+            'items__participants')):
+        Parameter.objects.filter(pk=parameter.pk).\
+            update(bought_items=parameter.count)
+
+
+def add_caps(apps, schema_editor):
+    #The constraint is only added on PostgreSQL: on the other databases (SQLite
+    #cannot add a constraint to an existing table), the conditional updates of
+    #Item.reserve are the only guard.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in CAPPED_TABLES:
+        schema_editor.execute('ALTER TABLE %s ADD CONSTRAINT %s_bought_items_cap '
+            'CHECK (max_bought_items IS NULL OR bought_items <= '
+            'max_bought_items)' % (table, table))
+
+
+def remove_caps(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in CAPPED_TABLES:
+        schema_editor.execute('ALTER TABLE %s DROP CONSTRAINT %s_bought_items_cap'
+            % (table, table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0002_auto_20150823_1739'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='bought_items',
+            field=models.PositiveIntegerField(verbose_name='bought items', default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='parameter',
+            name='bought_items',
+            field=models.PositiveIntegerField(verbose_name='bought items', default=0, editable=False),
+        ),
+        migrations.RunPython(fill_bought_items, migrations.RunPython.noop),
+        migrations.RunPython(add_caps, remove_caps),
+    ]
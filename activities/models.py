@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import (models, transaction)
 from sorl.thumbnail import ImageField
 from django.utils.translation import ugettext as _
 from django.core.exceptions import ValidationError
@@ -104,6 +104,8 @@ class Parameter(models.Model):
     level...).
 
     Attributes:
+        - bought_items: integer storing the number of items of this parameter
+            bought. Maintained with the participants, it cannot be edited.
         - creation_date: datetime of the creation of the parameter. Not editable.
         - default_price: float storing the default price.
         - description: string storing a description of the parameter. Can be None.
@@ -130,8 +132,15 @@ class Parameter(models.Model):
             parameter.
 
     Ordering by ASCending creation_date.
+
+    Clean:
+        - activity or parent_parameter has to be set.
+        - parent_parameter cannot have a parent parameter itself.
+        - max_bought_items cannot be less than bought_items.
     """
 
+    bought_items = models.PositiveIntegerField(_('bought items'), default=0,
+                    editable=False)
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
     default_price = models.DecimalField(_('default price'), max_digits=5, decimal_places=2, default=0,
                     validators = [MinValueValidator(0),])
@@ -159,11 +168,31 @@ class Parameter(models.Model):
     def clean(self):
         if self.activity is None and self.parent_parameter is None:
             raise ValidationError(_('Parent parameter or activity has to be set.'))
+        if self.max_bought_items is not None and \
+                self.max_bought_items < self.bought_items:
+            raise ValidationError(_('More items have already been bought.'))
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            kwargs.setdefault('update_fields', _fields_but_counter(self))
+        super(Parameter, self).save(*args, **kwargs)
 
     def __str__(self):
         return '%s' % (self.name)
 
 
+def _fields_but_counter(instance):
+    #bought_items is only written by Item.reserve and Item.release: saving an
+    #instance read before a registration must not overwrite it.
+    return [field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name != 'bought_items']
+
+
+def _has_places(count):
+    return models.Q(max_bought_items__isnull=True) | \
+        models.Q(max_bought_items__gte=models.F('bought_items') + count)
+
+
 class Item(models.Model):
     """Item of a parameter.
 
@@ -172,6 +201,8 @@ class Item(models.Model):
     specific default price and member price.
 
     Attributes:
+        - bought_items: integer storing the number of this item bought.
+            Maintained with the participants, it cannot be edited.
         - creation_date: datetime of the creation of the item. Not editable.
         - description: string storing a description of the item. Can be None.
         - default_price: float storing the default price specific to this item.
@@ -187,8 +218,18 @@ class Item(models.Model):
         - participants: several participants associated to this item.
 
     Ordering by ASCending name.
+
+    Clean:
+        - max_bought_items cannot be less than bought_items.
+
+    Methods:
+        - reserve: take places from the item and its parameter, raise
+            ValidationError if there are not enough places left.
+        - release: give places back to the item and its parameter.
     """
 
+    bought_items = models.PositiveIntegerField(_('bought items'), default=0,
+                    editable=False)
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
     default_price = models.DecimalField(_('default price'), max_digits=5, decimal_places=2, default=0,
                     validators = [MinValueValidator(0),])
@@ -207,6 +248,38 @@ class Item(models.Model):
         verbose_name_plural = _('items')
         ordering = ['name']
 
+    def clean(self):
+        if self.max_bought_items is not None and \
+                self.max_bought_items < self.bought_items:
+            raise ValidationError(_('More items have already been bought.'))
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            kwargs.setdefault('update_fields', _fields_but_counter(self))
+        super(Item, self).save(*args, **kwargs)
+
+    def reserve(self, count=1):
+        #Each counter is incremented only if the cap allows it, in the UPDATE
+        #itself, so concurrent registrations cannot exceed it. The item is
+        #always locked before its parameter.
+        with transaction.atomic():
+            if Item.objects.filter(_has_places(count), pk=self.pk).\
+                    update(bought_items=models.F('bought_items') + count) != 1:
+                raise ValidationError(_('Maximum number of bought items is \
+                                        reached for this item.'))
+            if Parameter.objects.filter(_has_places(count),
+                    pk=self.parameter_id).update(bought_items=\
+                    models.F('bought_items') + count) != 1:
+                raise ValidationError(_('Maximum number of bought items is \
+                                        reached for this parameter.'))
+
+    def release(self, count=1):
+        with transaction.atomic():
+            Item.objects.filter(pk=self.pk).\
+                update(bought_items=models.F('bought_items') - count)
+            Parameter.objects.filter(pk=self.parameter_id).\
+                update(bought_items=models.F('bought_items') - count)
+
     def __str__(self):
         return '%s' % (self.name)
 
@@ -230,8 +303,13 @@ class Participant(models.Model):
     Relationships with other models:
         - cash_register: cash register associated to the payment of the participant.
         - item: item bought by the participant.
+        - ledger_entries: entry of the payment in the ledger of the cash register.
         - registered_user: user representing the participant.
 
+    Saving a new participant reserves a place of its item (see Item.reserve),
+    unless reserve=False is given because the place was already reserved,
+    deleting it gives the place back.
+
     Ordering by ASCending registered_user and then by unregistered_user.
 
     Clean:
@@ -253,6 +331,8 @@ class Participant(models.Model):
     cash_register = models.ForeignKey(CashRegister, related_name='bought_items',
                     on_delete=models.SET_NULL, null=True, verbose_name=_('cash register'))
     item = models.ForeignKey(Item, related_name='participants', verbose_name=_('item'))
+    ledger_entries = GenericRelation('treasury.LedgerEntry',
+                        verbose_name=_('ledger entries'))
     registered_user = models.ForeignKey(CustomUser, null=True, blank=True,
                         related_name='participations', verbose_name=_('registered user'))
 
@@ -275,19 +355,40 @@ class Participant(models.Model):
             return
         if self.unregistered_user is not None and \
                 (self.item.parameter.is_member_only is True or \
-                self.item.parameter.activity.is_member_only is True):
+                (self.item.parameter.activity is not None and \
+                self.item.parameter.activity.is_member_only is True)):
             raise ValidationError(_('Unregistered users cannot buy parameters \
                                     reserved to members or participate in \
                                     activity reserved to members.'))
-        if Participant.objects.filter(item=self.item).count() >= self.item.\
-                max_bought_items:
+        if self.pk is not None and Participant.objects.filter(pk=self.pk,
+                item=self.item).exists():
+            return
+        if self.item.max_bought_items is not None and \
+                self.item.bought_items >= self.item.max_bought_items:
             raise ValidationError(_('Maximum number of bought items is reached \
                                     for this item.'))
-        if Participant.objects.filter(item__parameter=self.item.parameter).\
-                count() >= self.item.parameter.max_bought_items:
+        if self.item.parameter.max_bought_items is not None and \
+                self.item.parameter.bought_items >= \
+                self.item.parameter.max_bought_items:
             raise ValidationError(_('Maximum number of bought items is reached \
                                     for this parameter.'))
 
+    def save(self, *args, reserve=True, **kwargs):
+        #reserve is False when the places of new participants were already
+        #reserved at once (see activities.registration).
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                #Lock the saved participant so its place is moved only once.
+                previous = Participant.objects.select_for_update().\
+                    filter(pk=self.pk).select_related('item').first()
+            if reserve and (previous is None or \
+                    previous.item_id != self.item_id):
+                if previous is not None:
+                    previous.item.release()
+                self.item.reserve()
+            super(Participant, self).save(*args, **kwargs)
+
     def __str__(self):
         return '%s (%s)' % (self.unregistered_user if not self.unregistered_user\
             else self.registered_user.user.get_full_name(), self.item.name)
@@ -0,0 +1,32 @@
+"""Registration of several participants at once.
+
+The places are reserved with a single UPDATE per counter and the participants
+are inserted in the same transaction: either every participant is registered or
+none is.
+
+This exports:
+    - register: register participants to an item.
+"""
+from django.db import transaction
+
+
+def register(item, participants):
+    """Reserve len(participants) places of item and save the participants.
+
+    participants are unsaved Participant instances, their item is set to item.
+    Raise ValidationError if a participant is invalid or if there are not
+    enough places left. Return the list of participants.
+    """
+
+    participants = list(participants)
+    if not participants:
+        return participants
+    for participant in participants:
+        participant.item = item
+        participant.full_clean()
+    with transaction.atomic():
+        #The places are reserved at once, not by each save.
+        item.reserve(len(participants))
+        for participant in participants:
+            participant.save(reserve=False)
+    return participants
@@ -0,0 +1,21 @@
+"""Receivers keeping the bought items of items and parameters in sync and
+generating the thumbnails and variants of the covers.
+"""
+from django.db.models.signals import (post_save, post_delete)
+from django.dispatch import receiver
+from activities.models import (Activity, Item, Participant)
+from sportassociation import (thumbnails, variants)
+
+
+@receiver(post_delete, sender=Participant)
+def release_place(sender, instance, **kwargs):
+    #The item is gone when it is deleted along with its parameter.
+    item = Item.objects.filter(pk=instance.item_id).first()
+    if item is not None:
+        item.release()
+
+
+@receiver(post_save, sender=Activity)
+def pregenerate_cover(sender, instance, **kwargs):
+    thumbnails.pregenerate(instance)
+    variants.pregenerate(instance)
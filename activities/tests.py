@@ -1,3 +1,131 @@
-from django.test import TestCase
+from django.test import (TestCase, TransactionTestCase, skipUnlessDBFeature)
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.utils import timezone
+from threading import Thread
+from activities.export import csv_lines
+from activities.models import (Activity, Item, Parameter, Participant)
+from activities.registration import register
+from management.models import CASH
+from treasury.models import CashRegister
 
-#  Create your tests here.
+
+def create_item(item_places, parameter_places=None):
+    activity = Activity.objects.create(title='Ski', slug='ski', content='',
+        start_date=timezone.now(), end_date=timezone.now())
+    parameter = Parameter.objects.create(name='Séjour', activity=activity,
+        max_bought_items=parameter_places)
+    return Item.objects.create(name='Forfait', parameter=parameter,
+        max_bought_items=item_places)
+
+
+def participant(name, cash_register):
+    return Participant(unregistered_user=name, payment_mean=CASH,
+        cash_register=cash_register)
+
+
+class BoughtItemsTest(TestCase):
+
+    def setUp(self):
+        self.item = create_item(3, parameter_places=4)
+        self.cash_register = CashRegister.objects.create(name='Caisse')
+
+    def counters(self):
+        item = Item.objects.select_related('parameter').get(pk=self.item.pk)
+        return (item.bought_items, item.parameter.bought_items)
+
+    def test_participants_update_counters(self):
+        first = Participant.objects.create(item=self.item,
+            unregistered_user='Jean', payment_mean=CASH)
+        self.assertEqual(self.counters(), (1, 1))
+        first.save()
+        self.assertEqual(self.counters(), (1, 1))
+        first.delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_stale_instances_keep_counters(self):
+        stale = Item.objects.select_related('parameter').get(pk=self.item.pk)
+        Participant.objects.create(item=self.item, unregistered_user='Jean',
+            payment_mean=CASH)
+        stale.name = 'Forfait journée'
+        stale.save()
+        stale.parameter.save()
+        self.assertEqual(self.counters(), (1, 1))
+
+    def test_register_is_all_or_nothing(self):
+        register(self.item, [participant('Jean', self.cash_register),
+            participant('Marie', self.cash_register)])
+        self.assertEqual(self.counters(), (2, 2))
+        with self.assertRaises(ValidationError):
+            register(self.item, [participant('Paul', self.cash_register),
+                participant('Léa', self.cash_register)])
+        self.assertEqual(self.counters(), (2, 2))
+        self.assertEqual(Participant.objects.count(), 2)
+
+    def test_parameter_cap(self):
+        other = Item.objects.create(name='Location', parameter=self.item.parameter)
+        register(other, [participant('Jean', self.cash_register)])
+        register(self.item, [participant(name, self.cash_register)
+            for name in ('Paul', 'Léa', 'Marie')])
+        with self.assertRaises(ValidationError):
+            register(other, [participant('Luc', self.cash_register)])
+
+
+class ParticipantsExportTest(TestCase):
+
+    def setUp(self):
+        self.cash_register = CashRegister.objects.create(name='Caisse')
+        item = create_item(None)
+        self.activity = item.parameter.activity
+        level = Parameter.objects.create(name='Niveau',
+            parent_parameter=item.parameter)
+        beginner = Item.objects.create(name='Débutant', parameter=level)
+        for target, count in ((item, 300), (beginner, 200)):
+            register(target, [participant('Skieur %s' % index,
+                self.cash_register) for index in range(count)])
+
+    def test_query_count_does_not_grow_with_participants(self):
+        #Two levels of parameters, the empty third one and the participants.
+        with self.assertNumQueries(4):
+            lines = list(csv_lines(self.activity))
+        self.assertEqual(len(lines), 501)
+        self.assertTrue(lines[1].startswith('Séjour,Forfait,'))
+        self.assertTrue(lines[-1].startswith('Niveau,Débutant,'))
+
+    def test_export_is_reserved_to_staff(self):
+        url = reverse('activities:participants', kwargs={'pk':self.activity.pk})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+        response = self.client.get(url)
+        self.assertEqual(len(b''.join(response.streaming_content).\
+            splitlines()), 501)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class LastSeatTest(TransactionTestCase):
+
+    def test_one_thread_gets_the_last_seat(self):
+        item = create_item(1)
+        results = []
+
+        def buy(index):
+            try:
+                Participant.objects.create(item=item, payment_mean=CASH,
+                    unregistered_user='Buyer %s' % index)
+                results.append(True)
+            except ValidationError:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=buy, args=(index,)) for index in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Item.objects.get(pk=item.pk).bought_items, 1)
+        self.assertEqual(Participant.objects.count(), 1)
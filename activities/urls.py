@@ -1,5 +1,6 @@
 from django.conf.urls import include, url
-from .views import (OverviewView, DetailView, BigActivitiesView, ActivitiesView)
+from .views import (OverviewView, DetailView, BigActivitiesView, ActivitiesView,
+                    ParticipantsExportView)
 
 urlpatterns = [
     url(r'^activities/$', ActivitiesView.as_view(), name='activities'),
@@ -7,5 +8,7 @@ urlpatterns = [
     url(r'^(?P<pk>[0-9]+)/(?P<slug>[-\w]+)/$', DetailView.as_view(),
         name='activity'),
     url(r'^(?P<pk>[0-9]+)/$', DetailView.as_view(), name='activity'),
+    url(r'^(?P<pk>[0-9]+)/participants.csv$', ParticipantsExportView.as_view(),
+        name='participants'),
     url(r'^$', OverviewView.as_view(), name='overview'),
 ]
@@ -1,45 +1,53 @@
 from django.shortcuts import get_object_or_404, render
 from django.views.generic import (View, ListView)
+from django.contrib.auth.decorators import permission_required
+from django.utils.decorators import method_decorator
+from activities.export import csv_lines
 from activities.models import Activity
 from django.core.urlresolvers import reverse
+from sportassociation.pagination import (CursorPaginationMixin,
+                                        ESTIMATED_COUNT)
 from django.utils import timezone
 from django.http import (HttpResponseRedirect, HttpResponsePermanentRedirect,
-                        HttpResponse, Http404)
+                        HttpResponse, Http404, StreamingHttpResponse)
 
-class OverviewView(ListView):
+class OverviewView(CursorPaginationMixin, ListView):
     model = Activity
     paginate_by = 9
+    cursor_ordering = ('-publication_date', '-pk')
+    cursor_count_mode = ESTIMATED_COUNT
 
     def get_queryset(self):
         now = timezone.now()
         activities = Activity.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).\
-            order_by('-publication_date')
+            exclude(publication_date__isnull=True)
         return activities
 
 
-class BigActivitiesView(ListView):
+class BigActivitiesView(CursorPaginationMixin, ListView):
     model = Activity
     template_name = 'activities/activity_list.html'
     paginate_by = 9
+    cursor_ordering = ('-publication_date', '-pk')
+    cursor_count_mode = ESTIMATED_COUNT
 
     def get_queryset(self):
         now = timezone.now()
         activities = Activity.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).filter(is_big_activity=True).\
-            order_by('-publication_date')
+            exclude(publication_date__isnull=True).filter(is_big_activity=True)
         return activities
 
-class ActivitiesView(ListView):
+class ActivitiesView(CursorPaginationMixin, ListView):
     model = Activity
     template_name = 'activities/activity_list.html'
     paginate_by = 9
+    cursor_ordering = ('-publication_date', '-pk')
+    cursor_count_mode = ESTIMATED_COUNT
 
     def get_queryset(self):
         now = timezone.now()
         activities = Activity.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).filter(is_big_activity=False).\
-            order_by('-publication_date')
+            exclude(publication_date__isnull=True).filter(is_big_activity=False)
         return activities
 
 class DetailView(View):
@@ -59,3 +67,18 @@ class DetailView(View):
     def post(self, request):
         return HttpResponseRedirect(reverse('activities:activity',
             kwargs={'pk':pk, 'slug':activity.slug}))
+
+
+class ParticipantsExportView(View):
+
+    def get(self, request, pk):
+        activity = get_object_or_404(Activity, pk=pk)
+        response = StreamingHttpResponse(csv_lines(activity),
+            content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; ' \
+            'filename="participants-%s.csv"' % (activity.pk)
+        return response
+
+    @method_decorator(permission_required('activities.change_participant'))
+    def dispatch(self, *args, **kwargs):
+        return super(ParticipantsExportView, self).dispatch(*args, **kwargs)
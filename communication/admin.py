@@ -1,46 +1,71 @@
 from django.contrib import admin
 from django_admin_bootstrapped.admin.models import SortableInline
-from .models import (Weekmail, Paragraph, Article, Information)
+from .models import (Weekmail, Paragraph, Article, Information, DeliveryBatch)
 from management.admin import PublicFileInline
 from django.utils.translation import ugettext as _
 from django.template.loader import render_to_string
 from django.http import HttpResponse
-import html.parser
+from . import search
+
+class FullTextSearchMixin(object):
+    """Search the objects of a model admin with the full-text search of the
+    site on PostgreSQL, and with search_fields elsewhere.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or not search.is_postgresql():
+            return super(FullTextSearchMixin, self).get_search_results(request,
+                queryset, search_term)
+        return (queryset.filter(pk__in=search.matching_ids(self.model,
+            search_term)), False)
 
 class ParagraphSortable( SortableInline, admin.StackedInline):
     fields = ('title', 'index', 'content',)
     model = Paragraph
     extra = 0
 
+class DeliveryBatchInline(admin.TabularInline):
+    fields = ('index', 'status', 'attempts', 'next_attempt_date', 'sent_date',
+            'last_error',)
+    readonly_fields = fields
+    model = DeliveryBatch
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request):
+        return False
+
 @admin.register(Weekmail)
-class WeekmailAdmin(admin.ModelAdmin):
+class WeekmailAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('subject', 'sent_date', 'creation_date', 'modification_date',)
     search_fields = ('subject', 'introduction',)
     list_filter = ('sent_date', 'creation_date', 'modification_date',)
     date_hierarchy = 'sent_date'
     ordering = ('-sent_date',)
     fields = ('subject', 'introduction', 'conclusion',)
-    inlines = [ParagraphSortable, PublicFileInline,]
+    inlines = [ParagraphSortable, PublicFileInline, DeliveryBatchInline,]
     actions = ['send','display',]
 
+    def changeform_view(self, *args, **kwargs):
+        #The weekmail is indexed once, not once per saved paragraph.
+        with search.deferred():
+            return super(WeekmailAdmin, self).changeform_view(*args, **kwargs)
+
     def send(self, request, queryset):
-        failed_weekmails = []
-        for weekmail in queryset:
-            if not weekmail.send():
-                failed_weekmails.append(weekmail.subject)
-        if failed_weekmails:
-            message = _('Failed to send weekmails titled: "%s"') % \
-                ('", "'.join(failed_weekmails))
-        else:
-            message = _('All selected weekmails have been sent.')
+        #Weekmails are only queued, the send_weekmails command sends them.
+        skipped = [weekmail.subject for weekmail in queryset
+            if not weekmail.queue()]
+        message = _('All selected weekmails have been queued for sending.')
+        if skipped:
+            message = _('These weekmails were already queued or sent and have '
+                'not been queued again: %s.') % (', '.join(skipped))
         self.message_user(request, message)
 
     def display(self, request, queryset):
         response = HttpResponse()
-        html_parser = html.parser.HTMLParser()
         for weekmail in queryset:
             response.write(render_to_string('communication/display_weekmail.html',
-                {'weekmail': html_parser.unescape(weekmail)}))
+                {'weekmail': weekmail}))
         return response
 
     send.short_description = _("Send selected weekmails")
@@ -50,7 +75,7 @@ class WeekmailAdmin(admin.ModelAdmin):
         js = ('tinymce/tinymce.min.js', 'js/tinymce_4_config.js')
 
 @admin.register(Article)
-class ArticleAdmin(admin.ModelAdmin):
+class ArticleAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'publication_date', 'is_frontpage', 'summary',
             'creation_date', 'modification_date',)
     search_fields = ('title', 'summary')
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class CommunicationConfig(AppConfig):
+    name = 'communication'
+
+    def ready(self):
+        #Connect the receivers keeping cached pages up to date.
+        from . import signals
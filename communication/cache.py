@@ -0,0 +1,146 @@
+"""Cache of the blocks displayed on the home page.
+
+Each block of the home page is built from the database once, then stored in the
+cache until either a model it depends on is written (see signals) or the moment
+its content would change by itself (an article gets published, a match starts,
+the day changes...).
+
+This exports:
+    - CAROUSEL: name of the block with front page activities and articles.
+    - INFORMATIONS: name of the block with the important informations.
+    - SESSIONS: name of the block with the sessions of the next 3 days,
+        cancelled ones excepted.
+    - MATCH: name of the block with the next (or last) match.
+    - BLOCKS: tuple of all the names of the blocks.
+
+    - get_blocks: return the content of all blocks, building missing ones.
+    - invalidate: remove blocks from the cache.
+"""
+from django.core.cache import cache
+from django.db.models import Q, Min
+from django.utils import timezone
+from datetime import (datetime, time, timedelta)
+from activities.models import Activity
+from communication.models import (Article, Information)
+from sports import schedule
+from sports.models import Match
+
+CAROUSEL = 'carousel'
+INFORMATIONS = 'informations'
+SESSIONS = 'sessions'
+MATCH = 'match'
+
+BLOCKS = (CAROUSEL, INFORMATIONS, SESSIONS, MATCH)
+
+SESSION_DAYS = 3
+
+
+def _key(block):
+    return 'home:%s' % (block)
+
+
+def _earliest(*dates):
+    dates = [date for date in dates if date is not None]
+    return min(dates) if dates else None
+
+
+def _build_carousel(now):
+    activities = Activity.objects.exclude(publication_date__gt=now).\
+        exclude(end_date__lt=now).exclude(publication_date__isnull=True).\
+        filter(is_frontpage=True).order_by('-publication_date')
+    articles = Article.objects.exclude(publication_date__gt=now).\
+        exclude(publication_date__isnull=True).filter(is_frontpage=True).\
+        order_by('-publication_date')
+    activities = list(activities)
+    articles = list(articles)
+
+    #The carousel changes when an item gets published or an activity ends.
+    next_activity = Activity.objects.filter(is_frontpage=True,
+        publication_date__gt=now).aggregate(Min('publication_date'))
+    next_article = Article.objects.filter(is_frontpage=True,
+        publication_date__gt=now).aggregate(Min('publication_date'))
+    expires = _earliest(next_activity['publication_date__min'],
+        next_article['publication_date__min'],
+        *[activity.end_date for activity in activities])
+    return ({'activities': activities, 'articles': articles}, expires)
+
+
+def _build_informations(now):
+    important = Information.objects.filter(is_important=True, is_published=True)
+    informations = list(important.\
+        filter(Q(start_date__lt=now) | Q(start_date__isnull=True)).\
+        filter(Q(end_date__gt=now) | Q(end_date__isnull=True)).\
+        order_by('-end_date'))
+
+    next_information = important.filter(start_date__gte=now).\
+        aggregate(Min('start_date'))
+    expires = _earliest(next_information['start_date__min'],
+        *[information.end_date for information in informations])
+    return (informations, expires)
+
+
+def _build_sessions(now):
+    today = timezone.localtime(now).date()
+    days = [today + timedelta(offset) for offset in range(SESSION_DAYS)]
+    sessions_per_day = dict((day, []) for day in days)
+    for occurrence in schedule.occurrences(days[0], days[-1]):
+        sessions_per_day[occurrence.date].append(occurrence)
+
+    #The window of days moves at midnight.
+    expires = timezone.make_aware(datetime.combine(today + timedelta(1),
+        time()), timezone.get_current_timezone())
+    return ({'day': today, 'days_sessions': [(day, sessions_per_day[day])
+        for day in days]}, expires)
+
+
+def _build_match(now):
+    matches = Match.objects.select_related('sport')
+    match = matches.filter(date__gt=now).order_by('date').first()
+    if match:
+        #Once started, the match is not the next one anymore.
+        return ({'is_past': False, 'object': match}, match.date)
+    match = matches.filter(date__lt=now).order_by('-date').first()
+    return ({'is_past': True, 'object': match}, None)
+
+
+BUILDERS = {
+    CAROUSEL: _build_carousel,
+    INFORMATIONS: _build_informations,
+    SESSIONS: _build_sessions,
+    MATCH: _build_match,
+}
+
+
+def _is_valid(block, value, now):
+    if block == SESSIONS:
+        return value['day'] == timezone.localtime(now).date()
+    return True
+
+
+def get_blocks(now=None):
+    """Return a dictionary with the content of every block of the home page.
+
+    Cached blocks are returned without hitting the database, missing or
+    outdated ones are built and stored in the cache.
+    """
+
+    if now is None:
+        now = timezone.now()
+    cached = cache.get_many([_key(block) for block in BLOCKS])
+    blocks = {}
+    for block in BLOCKS:
+        value = cached.get(_key(block))
+        if value is None or not _is_valid(block, value, now):
+            value, expires = BUILDERS[block](now)
+            timeout = None
+            if expires is not None:
+                timeout = max(1, int((expires - now).total_seconds()) + 1)
+            cache.set(_key(block), value, timeout)
+        blocks[block] = value
+    return blocks
+
+
+def invalidate(*blocks):
+    """Remove the given blocks (or all blocks if none given) from the cache."""
+
+    cache.delete_many([_key(block) for block in (blocks or BLOCKS)])
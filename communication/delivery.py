@@ -0,0 +1,100 @@
+"""Delivery of queued weekmails.
+
+Weekmail.queue splits the recipients of a weekmail into DeliveryBatch rows.
+deliver_pending sends every batch which is due over a single SMTP connection,
+rendering each weekmail only once. A batch failing to be sent is tried again
+later, waiting twice as long after each failure (SMTP error as well as
+rendering error), until WEEKMAIL_MAX_ATTEMPTS is reached.
+
+Several workers can run at the same time: a batch is claimed by switching its
+status from PENDING to SENDING in a single UPDATE.
+
+This exports:
+    - deliver_pending: send every batch which is due.
+"""
+from django.core.mail import get_connection
+from django.utils import timezone
+from datetime import timedelta
+import copy
+from sportassociation import settings
+from communication.models import (Weekmail, DeliveryBatch, PENDING, SENDING,
+                                    SENT, FAILED)
+from communication import search
+
+
+def _release_stale_batches(now):
+    #Batches claimed by a worker which died are given back to the queue.
+    DeliveryBatch.objects.filter(status=SENDING, modification_date__lt=now -\
+        timedelta(seconds=settings.WEEKMAIL_SENDING_TIMEOUT)).\
+        update(status=PENDING, modification_date=now)
+
+
+def _claim(batch, now):
+    return DeliveryBatch.objects.filter(pk=batch.pk, status=PENDING).\
+        update(status=SENDING, modification_date=now) == 1
+
+
+def _fail(batch, error, now):
+    batch.attempts += 1
+    batch.last_error = str(error)
+    if batch.attempts >= settings.WEEKMAIL_MAX_ATTEMPTS:
+        batch.status = FAILED
+    else:
+        batch.status = PENDING
+        batch.next_attempt_date = now + timedelta(seconds=\
+            settings.WEEKMAIL_RETRY_DELAY * 2 ** (batch.attempts - 1))
+    batch.save()
+
+
+def _mark_sent(weekmail, now):
+    if not weekmail.delivery_batches.exclude(status=SENT).exists():
+        Weekmail.objects.filter(pk=weekmail.pk).update(sent_date=now)
+        search.mark_published(weekmail, now)
+
+
+def deliver_pending(weekmail=None, connection=None):
+    """Send every batch which is due, optionally only those of weekmail.
+
+    Return a tuple with the numbers of sent and failed batches.
+    """
+
+    now = timezone.now()
+    _release_stale_batches(now)
+    batches = DeliveryBatch.objects.filter(status=PENDING,
+        next_attempt_date__lte=now).select_related('weekmail').\
+        order_by('creation_date', 'index')
+    if weekmail is not None:
+        batches = batches.filter(weekmail=weekmail)
+
+    sent = failed = 0
+    messages = {}
+    connection = connection or get_connection()
+    try:
+        for batch in batches:
+            if not _claim(batch, now):
+                continue
+            try:
+                if batch.weekmail_id not in messages:
+                    messages[batch.weekmail_id] = batch.weekmail.build_message()
+                message = copy.copy(messages[batch.weekmail_id])
+                message.to = batch.recipient_list()
+                message.cc = [message.from_email,] if batch.index == 0 else []
+                #Open the connection once, it is kept for the next batches.
+                connection.open()
+                connection.send_messages([message])
+            except Exception as e:
+                #Rendering errors are counted as attempts too, so that the batch
+                #does not stay in SENDING. The connection may be broken, it is
+                #opened again if needed.
+                connection.close()
+                _fail(batch, e, timezone.now())
+                failed += 1
+                continue
+            batch.status = SENT
+            batch.sent_date = timezone.now()
+            batch.save()
+            sent += 1
+            _mark_sent(batch.weekmail, batch.sent_date)
+    finally:
+        connection.close()
+    return (sent, failed)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from sportassociation import (thumbnails, variants)
+
+
+class Command(BaseCommand):
+    help = 'Generate the missing thumbnails of the covers, protected images and \
+            identity photos, and the missing variants of the covers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False,
+            help='Only count the images missing thumbnails.')
+
+    def handle(self, *args, **options):
+        missing = thumbnails.backfill(dry_run=options['dry_run'])
+        missing_variants = variants.backfill(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write('%s image(s) missing thumbnails.' % missing)
+            self.stdout.write('%s image(s) missing variants.' % missing_variants)
+        else:
+            self.stdout.write('%s image(s) processed.' % missing)
+            self.stdout.write('%s variant manifest(s) built.' % missing_variants)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from communication import search
+
+
+class Command(BaseCommand):
+    help = 'Write the search entries of every article, activity and weekmail, \
+            and remove the entries of deleted objects.'
+
+    def handle(self, *args, **options):
+        count = search.rebuild()
+        self.stdout.write('%s object(s) indexed.' % count)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from communication.delivery import deliver_pending
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send the batches of queued weekmails which are due.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', default=False,
+            help='Keep running and look for due batches every interval.')
+        parser.add_argument('--interval', type=int, default=30,
+            help='Number of seconds to wait between two runs with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending()
+            if sent or failed:
+                self.stdout.write('%s batch(es) sent, %s failed.' % (sent,
+                    failed))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
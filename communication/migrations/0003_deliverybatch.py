@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0002_article_author'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryBatch',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('attempts', models.PositiveSmallIntegerField(verbose_name='attempts', default=0)),
+                ('creation_date', models.DateTimeField(verbose_name='creation date', auto_now_add=True)),
+                ('index', models.PositiveSmallIntegerField(verbose_name='index')),
+                ('last_error', models.TextField(verbose_name='last error', blank=True)),
+                ('modification_date', models.DateTimeField(verbose_name='modification date', auto_now=True)),
+                ('next_attempt_date', models.DateTimeField(verbose_name='next attempt date', default=django.utils.timezone.now)),
+                ('recipients', models.TextField(verbose_name='recipients')),
+                ('sent_date', models.DateTimeField(verbose_name='sent date', blank=True, null=True)),
+                ('status', models.CharField(verbose_name='status', max_length=7, default='pending', choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')])),
+            ],
+            options={
+                'verbose_name': 'delivery batch',
+                'verbose_name_plural': 'delivery batches',
+                'ordering': ['creation_date', 'index'],
+            },
+        ),
+        migrations.AddField(
+            model_name='deliverybatch',
+            name='weekmail',
+            field=models.ForeignKey(verbose_name='weekmail', related_name='delivery_batches', to='communication.Weekmail'),
+        ),
+        migrations.AlterIndexTogether(
+            name='deliverybatch',
+            index_together=set([('status', 'next_attempt_date')]),
+        ),
+    ]
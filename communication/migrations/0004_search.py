@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+CONFIGURATIONS = ('french', 'english')
+
+
+def _document(weight, column):
+    return ' || '.join("setweight(to_tsvector('%s', coalesce(NEW.%s, '')), '%s')"
+        % (configuration, column, weight) for configuration in CONFIGURATIONS)
+
+
+def add_document(apps, schema_editor):
+    #Other databases use the fallback search of communication.search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE communication_searchentry '
+        'ADD COLUMN document tsvector')
+    schema_editor.execute('CREATE FUNCTION communication_searchentry_document() '
+        'RETURNS trigger AS $$ BEGIN NEW.document := %s || %s; RETURN NEW; END '
+        '$$ LANGUAGE plpgsql' % (_document('A', 'title'), _document('B', 'text')))
+    schema_editor.execute('CREATE TRIGGER communication_searchentry_document '
+        'BEFORE INSERT OR UPDATE OF title, text ON communication_searchentry '
+        'FOR EACH ROW EXECUTE PROCEDURE communication_searchentry_document()')
+    schema_editor.execute('CREATE INDEX communication_searchentry_document_gin '
+        'ON communication_searchentry USING GIN (document)')
+
+
+def remove_document(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER communication_searchentry_document ON '
+        'communication_searchentry')
+    schema_editor.execute('DROP FUNCTION communication_searchentry_document()')
+    schema_editor.execute('ALTER TABLE communication_searchentry '
+        'DROP COLUMN document')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('communication', '0003_deliverybatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('object_id', models.PositiveIntegerField(verbose_name='object id')),
+                ('publication_date', models.DateTimeField(verbose_name='publication date', null=True, db_index=True)),
+                ('text', models.TextField(verbose_name='text')),
+                ('title', models.CharField(verbose_name='title', max_length=80)),
+                ('url', models.CharField(verbose_name='URL', max_length=200)),
+                ('content_type', models.ForeignKey(verbose_name='content type', to='contenttypes.ContentType')),
+            ],
+            options={
+                'verbose_name': 'search entry',
+                'verbose_name_plural': 'search entries',
+                'ordering': ['-publication_date'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchentry',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+        migrations.RunPython(add_document, remove_document),
+    ]
@@ -3,15 +3,28 @@ from sorl.thumbnail import ImageField
 from django.utils.translation import ugettext as _
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.fields import (GenericForeignKey,
+                                                GenericRelation)
+from django.contrib.contenttypes.models import ContentType
 from users.models import CustomUser
 from management.models import (PublicFile, ProtectedImage, ProtectedFile)
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from django.contrib import messages
-from smtplib import SMTPException
+from django.db import transaction
 from sportassociation import settings
-import html.parser
+import os
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+DELIVERY_STATUSES = (
+    (PENDING, _('Pending')),
+    (SENDING, _('Sending')),
+    (SENT, _('Sent')),
+    (FAILED, _('Failed'))
+)
 
 
 class Weekmail(models.Model):
@@ -31,8 +44,16 @@ class Weekmail(models.Model):
     Relationships with other models:
         - attached: several files destined to the public which will be attached
             to the weekmail.
+        - delivery_batches: several batches of recipients the weekmail is
+            sent to.
         - paragraphs: several paragraphs associated to this weekmail.
 
+    Methods:
+        - build_message: return the mail of the weekmail, without recipients.
+        - queue: split the recipients into batches waiting to be sent.
+        - render: return the plain text and HTML contents of the weekmail.
+        - send: queue the weekmail and send it right away.
+
     Ordering by DESCending sent_date
     """
 
@@ -55,35 +76,124 @@ class Weekmail(models.Model):
     def __str__(self):
         return '%s' % (self.subject)
 
-    def send(self):
-        #Create the weekmail content and send it.
-        html_parser = html.parser.HTMLParser()
-        content = {'weekmail': html_parser.unescape(self)}
-        mail_content_txt = render_to_string('communication/weekmail.txt',
-                                            content)
-        mail_content_html = render_to_string('communication/weekmail.html',
-                                            content)
+    def render(self):
+        """Return the plain text and HTML contents of the weekmail."""
+
+        content = {'weekmail': self}
+        return (render_to_string('communication/weekmail.txt', content),
+                render_to_string('communication/weekmail.html', content))
+
+    def build_message(self):
+        """Return the mail of the weekmail, without recipients.
+
+        The contents are rendered and the attached files are read only once so
+        that the message can be sent to every batch of recipients.
+        """
+
+        mail_content_txt, mail_content_html = self.render()
+        mail = EmailMultiAlternatives()
+        mail.subject = _('[Weekmail] %s') % (self.subject)
+        mail.body = mail_content_txt
+        mail.from_email = settings.DEFAULT_FROM_EMAIL
+        mail.attach_alternative(mail_content_html, "text/html")
+        for attachment in self.attached.all():
+            attachment.file.open('rb')
+            try:
+                mail.attach(os.path.basename(attachment.file.name),
+                    attachment.file.read())
+            finally:
+                attachment.file.close()
+        return mail
+
+    def queue(self, batch_size=None):
+        """Split the recipients into batches waiting to be sent.
+
+        The batches are sent by the send_weekmails management command. A
+        weekmail already queued or sent is not queued again: an empty list is
+        returned.
+        """
 
         #You can change the weekmail recipients here.
-        recipients = settings.WEEKMAIL_RECIPIENTS
-        sender = settings.DEFAULT_FROM_EMAIL
-        try:
-            mail = EmailMultiAlternatives()
-            mail.subject = _('[Weekmail] %s') % (self.subject)
-            mail.body = mail_content_txt
-            mail.from_email = sender
-            mail.to = recipients
-            mail.cc = [sender,]
-            mail.attach_alternative(mail_content_html, "text/html")
-            for attachment in self.attached.all():
-                mail.attach_file(attachment.file.path)
-            mail.send()
-            self.sent_date = timezone.now()
-            self.save()
-            return True
-        except SMTPException:
-            return False
-        return False
+        recipients = list(settings.WEEKMAIL_RECIPIENTS)
+        batch_size = batch_size or settings.WEEKMAIL_BATCH_SIZE
+        now = timezone.now()
+        with transaction.atomic():
+            #The row is locked so that two clicks cannot both queue it.
+            weekmail = Weekmail.objects.select_for_update().get(pk=self.pk)
+            if weekmail.sent_date is not None or \
+                    weekmail.delivery_batches.exists():
+                return []
+            return DeliveryBatch.objects.bulk_create([
+                DeliveryBatch(weekmail=self, index=index,
+                    recipients='\n'.join(recipients[start:start + batch_size]),
+                    next_attempt_date=now) for index, start in \
+                enumerate(range(0, max(len(recipients), 1), batch_size))])
+
+    def send(self):
+        """Queue the weekmail and send it right away.
+
+        Return True if all the batches have been sent.
+        """
+
+        from .delivery import deliver_pending
+        self.queue()
+        deliver_pending(weekmail=self)
+        return not self.delivery_batches.exclude(status=SENT).exists()
+
+
+class DeliveryBatch(models.Model):
+    """Batch of recipients of a weekmail.
+
+    A weekmail is sent to its recipients in several batches so that an SMTP
+    error only delays the concerned batch, which is tried again later.
+
+    Attributes:
+        - attempts: integer storing the number of failed attempts to send the
+            batch.
+        - creation_date: datetime of the creation of the batch. Not editable.
+        - index: integer indicating the index of the batch among all batches
+            of the weekmail.
+        - last_error: string storing the last error raised when sending the
+            batch.
+        - modification_date: datetime of the last modification of the batch.
+            Not editable.
+        - next_attempt_date: datetime after which the batch can be sent.
+        - recipients: string storing the email addresses of the batch, one per
+            line.
+        - sent_date: datetime of the moment the batch was sent. Can be None.
+        - status: value of DELIVERY_STATUSES enumeration.
+
+    Relationships with other models:
+        - weekmail: weekmail sent to this batch.
+
+    Ordering by ASCending creation_date then index.
+    """
+
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
+    index = models.PositiveSmallIntegerField(_('index'))
+    last_error = models.TextField(_('last error'), blank=True)
+    modification_date = models.DateTimeField(_('modification date'), auto_now=True)
+    next_attempt_date = models.DateTimeField(_('next attempt date'), default=timezone.now)
+    recipients = models.TextField(_('recipients'))
+    sent_date = models.DateTimeField(_('sent date'), null=True, blank=True)
+    status = models.CharField(_('status'), max_length=7, choices=DELIVERY_STATUSES,
+                default=PENDING)
+
+    weekmail = models.ForeignKey(Weekmail, related_name='delivery_batches',
+                verbose_name=_('weekmail'))
+
+    class Meta:
+        verbose_name = _('delivery batch')
+        verbose_name_plural = _('delivery batches')
+        ordering = ['creation_date', 'index']
+        index_together = [['status', 'next_attempt_date']]
+
+    def recipient_list(self):
+        return [recipient for recipient in self.recipients.split('\n') if recipient]
+
+    def __str__(self):
+        return '%s (%s)' % (self.weekmail.subject, self.index)
 
 
 class Paragraph(models.Model):
@@ -222,3 +332,48 @@ class Information(models.Model):
 
     def __str__(self):
         return '%s' % (self.title)
+
+
+class SearchEntry(models.Model):
+    """Model representing an object found by the search (see search).
+
+    Entries are written when articles, activities and weekmails (with their
+    paragraphs) are saved. On PostgreSQL the table also has a document column,
+    the tsvector of the title and the text maintained by a trigger and indexed
+    with GIN.
+
+    Attributes:
+        - publication_date: datetime of the publication of the object. None if
+            it is not published.
+        - text: string storing the text of the object without HTML.
+        - title: string storing the title of the object.
+        - url: string storing the URL of the object.
+
+    Relationships with other models:
+        - source: article, activity or weekmail of the entry.
+
+    Ordering by DESCending publication_date.
+    """
+
+    object_id = models.PositiveIntegerField(_('object id'))
+    publication_date = models.DateTimeField(_('publication date'), null=True,
+                        db_index=True)
+    text = models.TextField(_('text'))
+    title = models.CharField(_('title'), max_length=80)
+    url = models.CharField(_('URL'), max_length=200)
+
+    content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
+    source = GenericForeignKey('content_type', 'object_id')
+
+    class Meta:
+        verbose_name = _('search entry')
+        verbose_name_plural = _('search entries')
+        ordering = ['-publication_date']
+        unique_together = (('content_type', 'object_id'),)
+
+    @property
+    def kind(self):
+        return self.content_type.model_class()._meta.verbose_name
+
+    def __str__(self):
+        return '%s' % (self.title)
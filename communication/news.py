@@ -0,0 +1,130 @@
+"""Feed of published articles and weekmails merged by the database.
+
+The feed is a UNION of both tables on (date, type, id) sorted and limited by the
+database so only the rows of the requested page are fetched, whatever the size
+of the archive.
+
+This exports:
+    - NEWS_PER_PAGE: number of news displayed per page.
+
+    - NewsPage: class representing a page of the feed.
+    - news_page: return a page of the feed.
+"""
+from django.db import connection
+from django.utils import timezone
+from communication.models import (Article, Weekmail)
+
+NEWS_PER_PAGE = 9
+
+ARTICLE = 'article'
+WEEKMAIL = 'weekmail'
+
+
+class NewsPage(object):
+    """Page of the news feed.
+
+    It provides the subset of django.core.paginator.Page used by templates.
+
+    Attributes:
+        - number: integer storing the 1-based number of the page.
+        - object_list: list of articles and weekmails of the page, newest first.
+    """
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def __repr__(self):
+        return '<News page %s>' % (self.number)
+
+
+def _feed_sql():
+    qn = connection.ops.quote_name
+    return ('SELECT %%s AS news_type, %(article_id)s AS news_id, '
+        '%(publication_date)s AS news_date FROM %(article)s '
+        'WHERE %(publication_date)s IS NOT NULL AND %(publication_date)s <= %%s '
+        'UNION ALL '
+        'SELECT %%s, %(weekmail_id)s, %(sent_date)s FROM %(weekmail)s '
+        'WHERE %(sent_date)s IS NOT NULL AND %(sent_date)s <= %%s') % {
+        'article': qn(Article._meta.db_table),
+        'article_id': qn(Article._meta.pk.column),
+        'publication_date': qn(Article._meta.get_field('publication_date').column),
+        'weekmail': qn(Weekmail._meta.db_table),
+        'weekmail_id': qn(Weekmail._meta.pk.column),
+        'sent_date': qn(Weekmail._meta.get_field('sent_date').column),
+    }
+
+
+def _count(now):
+    return Article.objects.filter(publication_date__lte=now).count() + \
+        Weekmail.objects.filter(sent_date__lte=now).count()
+
+
+def _last_page(now, per_page):
+    return max(1, (_count(now) + per_page - 1) // per_page)
+
+
+def news_page(number, now=None, per_page=NEWS_PER_PAGE):
+    """Return the NewsPage numbered number of the feed.
+
+    As django.core.paginator.Paginator did, a number which is not an integer
+    returns the first page and a number out of range (too big, zero or
+    negative) returns the last page.
+    """
+
+    if now is None:
+        now = timezone.now()
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        number = 1
+    if number < 1:
+        number = _last_page(now, per_page)
+
+    sql = _feed_sql() + ' ORDER BY news_date DESC, news_type, news_id DESC ' + \
+        'LIMIT %s OFFSET %s'
+    with connection.cursor() as cursor:
+        #Fetch one more row to know if there is a next page.
+        cursor.execute(sql, [ARTICLE, now, WEEKMAIL, now, per_page + 1,
+            (number - 1) * per_page])
+        rows = cursor.fetchall()
+        if not rows and number > 1:
+            number = _last_page(now, per_page)
+            cursor.execute(sql, [ARTICLE, now, WEEKMAIL, now, per_page + 1,
+                (number - 1) * per_page])
+            rows = cursor.fetchall()
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    articles = Article.objects.in_bulk([pk for news_type, pk, date in rows
+        if news_type == ARTICLE])
+    weekmails = Weekmail.objects.prefetch_related('paragraphs').\
+        in_bulk([pk for news_type, pk, date in rows if news_type == WEEKMAIL])
+    objects = {ARTICLE: articles, WEEKMAIL: weekmails}
+    return NewsPage([objects[news_type][pk] for news_type, pk, date in rows],
+        number, has_next)
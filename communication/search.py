@@ -0,0 +1,340 @@
+"""Full-text search across articles, activities and weekmails.
+
+Each searchable object has a SearchEntry holding its title and its text without
+HTML (a weekmail includes its paragraphs), written when the object is saved
+(see signals). On PostgreSQL, a trigger of the search entries table keeps its
+document column, the French and English tsvectors of the title (weight A) and
+of the text (weight B), indexed with GIN: a search is a single ranked query on
+this index and only the snippets of the displayed results are highlighted.
+
+Other databases fall back to a case-insensitive search of the words of the
+query, newest first, which is enough for the tests and development.
+
+Saving a weekmail along with its paragraphs would index it once per object:
+within deferred(), as in the admin, each object is indexed once at the end.
+
+This exports:
+    - CONFIGURATIONS: tuple of the PostgreSQL text search configurations.
+    - RESULTS_PER_PAGE: number of results displayed per page.
+
+    - SearchResult: class representing an entry found by a search.
+    - deferred: context manager indexing the saved objects once, at its end.
+    - index: write the search entry of an object.
+    - unindex: remove the search entry of an object.
+    - mark_published: update the publication date of the entry of an object.
+    - rebuild: write the search entries of every object.
+    - is_postgresql: return True if the full-text search of PostgreSQL is used.
+    - search: return a page of the published entries matching a query.
+    - matching_ids: return the ids of the objects of a model matching a query.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import (escape, strip_tags)
+from django.utils.safestring import mark_safe
+from contextlib import contextmanager
+import html
+import re
+import threading
+from activities.models import Activity
+from communication.models import (Article, Weekmail, Paragraph, SearchEntry)
+from communication.news import NewsPage
+
+CONFIGURATIONS = ('french', 'english')
+
+RESULTS_PER_PAGE = 10
+
+#Size of the snippets, in words.
+SNIPPET_WORDS = 30
+
+#Private use characters delimiting the highlighted words in the snippets of
+#PostgreSQL, replaced by <mark> once the snippet is escaped.
+START_MARK = '\ue000'
+STOP_MARK = '\ue001'
+
+WHITESPACES_RE = re.compile(r'\s+')
+
+#Objects to index at the end of deferred(), per thread.
+_deferred = threading.local()
+
+
+def _plain(*contents):
+    text = ' '.join(html.unescape(strip_tags(content or ''))
+        for content in contents)
+    return WHITESPACES_RE.sub(' ', text).strip()
+
+
+def _article(article):
+    return {'title': article.title,
+        'text': _plain(article.summary, article.content),
+        'publication_date': article.publication_date,
+        'url': reverse('communication:article', kwargs={'pk': article.pk,
+            'slug': article.slug})}
+
+
+def _activity(activity):
+    return {'title': activity.title,
+        'text': _plain(activity.summary, activity.content),
+        'publication_date': activity.publication_date,
+        'url': reverse('activities:activity', kwargs={'pk': activity.pk,
+            'slug': activity.slug})}
+
+
+def _weekmail(weekmail):
+    contents = [weekmail.introduction]
+    for paragraph in weekmail.paragraphs.all():
+        contents.extend((paragraph.title, paragraph.content))
+    contents.append(weekmail.conclusion)
+    return {'title': weekmail.subject,
+        'text': _plain(*contents),
+        'publication_date': weekmail.sent_date,
+        'url': reverse('communication:weekmail', kwargs={'pk': weekmail.pk})}
+
+BUILDERS = {
+    Article: _article,
+    Activity: _activity,
+    Weekmail: _weekmail,
+}
+
+
+class SearchResult(object):
+    """Entry found by a search.
+
+    Attributes:
+        - entry: search entry found.
+        - rank: float storing the rank of the entry, None without PostgreSQL.
+        - snippet: safe HTML string of the text around the searched words,
+            which are highlighted with <mark>.
+    """
+
+    def __init__(self, entry, snippet, rank=None):
+        self.entry = entry
+        self.snippet = snippet
+        self.rank = rank
+
+    def __repr__(self):
+        return '<Search result %s>' % (self.entry)
+
+
+def _pending_key(instance):
+    if isinstance(instance, Paragraph):
+        return (Weekmail, instance.weekmail_id)
+    return (type(instance), instance.pk)
+
+
+@contextmanager
+def deferred():
+    """Index the objects saved in the with block once, when it is left
+    without exception.
+    """
+
+    if getattr(_deferred, 'pending', None) is not None:
+        yield
+        return
+    _deferred.pending = {}
+    try:
+        yield
+        pending = _deferred.pending
+    finally:
+        _deferred.pending = None
+    for (model, pk), instance in pending.items():
+        #Paragraphs only give the pk of their weekmail.
+        if instance is None:
+            instance = model.objects.filter(pk=pk).first()
+        if instance is not None:
+            index(instance)
+
+
+def index(instance):
+    """Write the search entry of instance, an article, an activity, a weekmail
+    or a paragraph (whose weekmail is indexed).
+
+    Return None within deferred(), the entry being written at its end.
+    """
+
+    pending = getattr(_deferred, 'pending', None)
+    if pending is not None:
+        key = _pending_key(instance)
+        if not isinstance(instance, Paragraph) or key not in pending:
+            pending[key] = None if isinstance(instance, Paragraph) else instance
+        return None
+    if isinstance(instance, Paragraph):
+        #The weekmail is gone when it is deleted along with its paragraphs.
+        instance = Weekmail.objects.filter(pk=instance.weekmail_id).first()
+        if instance is None:
+            return None
+    entry, created = SearchEntry.objects.update_or_create(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk, defaults=BUILDERS[type(instance)](instance))
+    return entry
+
+
+def unindex(instance):
+    """Remove the search entry of instance."""
+
+    pending = getattr(_deferred, 'pending', None)
+    if pending is not None:
+        pending.pop(_pending_key(instance), None)
+    SearchEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk).delete()
+
+
+def mark_published(instance, date):
+    """Update the publication date of the entry of instance, whose date was
+    updated without saving it.
+    """
+
+    SearchEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk).update(publication_date=date)
+
+
+def rebuild():
+    """Write the search entries of every object and remove the others.
+
+    Return the number of entries.
+    """
+
+    count = 0
+    for model in BUILDERS:
+        objects = model.objects.all()
+        if model is Weekmail:
+            objects = objects.prefetch_related('paragraphs')
+        for instance in objects:
+            index(instance)
+            count += 1
+        SearchEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(model)).\
+            exclude(object_id__in=model.objects.values('pk')).delete()
+    return count
+
+
+def is_postgresql():
+    """Return True if the database is PostgreSQL, whose full-text search is
+    used.
+    """
+
+    return connection.vendor == 'postgresql'
+
+
+def _terms(query):
+    return [term for term in WHITESPACES_RE.split(query.strip()) if term]
+
+
+def _tsquery():
+    #A document matches if the query matches in any configuration.
+    return ' || '.join("plainto_tsquery('%s', %%s)" % (configuration)
+        for configuration in CONFIGURATIONS)
+
+
+def _highlighted(snippet):
+    return mark_safe(escape(snippet).replace(START_MARK, '<mark>').\
+        replace(STOP_MARK, '</mark>'))
+
+
+def _search_sql():
+    qn = connection.ops.quote_name
+    table = qn(SearchEntry._meta.db_table)
+    #Only the rows of the page are highlighted, ts_headline being costly.
+    return ('SELECT found.id, found.rank, ts_headline(%(configuration)s, '
+        'entry.%(text)s, found.query, %%s) FROM (SELECT %(table)s.%(id)s AS id, '
+        'ts_rank_cd(document, query) AS rank, query, '
+        '%(table)s.%(publication_date)s AS publication_date '
+        'FROM %(table)s, (SELECT %(tsquery)s AS query) AS search '
+        'WHERE document @@ query AND %(table)s.%(publication_date)s <= %%s '
+        'ORDER BY rank DESC, %(table)s.%(publication_date)s DESC '
+        'LIMIT %%s OFFSET %%s) AS found '
+        'JOIN %(table)s AS entry ON entry.%(id)s = found.id '
+        'ORDER BY found.rank DESC, found.publication_date DESC') % {
+        'configuration': "'%s'" % (CONFIGURATIONS[0]),
+        'text': qn('text'),
+        'table': table,
+        'id': qn(SearchEntry._meta.pk.column),
+        'publication_date': qn('publication_date'),
+        'tsquery': _tsquery(),
+    }
+
+
+def _search_postgresql(query, now, limit, offset):
+    options = 'StartSel="%s", StopSel="%s", MaxWords=%s, MinWords=%s, ' \
+        'MaxFragments=2' % (START_MARK, STOP_MARK, SNIPPET_WORDS,
+        SNIPPET_WORDS // 3)
+    with connection.cursor() as cursor:
+        cursor.execute(_search_sql(), [options] + [query] * len(CONFIGURATIONS)
+            + [now, limit, offset])
+        rows = cursor.fetchall()
+    entries = SearchEntry.objects.select_related('content_type').\
+        in_bulk([pk for pk, rank, snippet in rows])
+    return [SearchResult(entries[pk], _highlighted(snippet), rank)
+        for pk, rank, snippet in rows]
+
+
+def _snippet(text, terms):
+    lowered = text.lower()
+    positions = [position for position in (lowered.find(term.lower())
+        for term in terms) if position >= 0]
+    #The snippet starts a few words before the first searched word.
+    start = len(text[:min(positions)].split(' ')) - 1 if positions else 0
+    words = text.split(' ')[max(0, start - SNIPPET_WORDS // 3):]
+    snippet = escape(' '.join(words[:SNIPPET_WORDS]))
+    for term in terms:
+        snippet = re.sub('(%s)' % (re.escape(escape(term))), r'<mark>\1</mark>',
+            snippet, flags=re.IGNORECASE)
+    return mark_safe(snippet)
+
+
+def _filtered(entries, terms):
+    for term in terms:
+        entries = entries.filter(Q(title__icontains=term) |
+            Q(text__icontains=term))
+    return entries
+
+
+def _search_fallback(query, now, limit, offset):
+    terms = _terms(query)
+    entries = SearchEntry.objects.select_related('content_type').\
+        filter(publication_date__lte=now)
+    entries = _filtered(entries, terms)[offset:offset + limit]
+    return [SearchResult(entry, _snippet(entry.text, terms))
+        for entry in entries]
+
+
+def search(query, number=1, now=None, per_page=RESULTS_PER_PAGE):
+    """Return the page numbered number of the published entries matching query,
+    best first, as a NewsPage of SearchResult.
+    """
+
+    if now is None:
+        now = timezone.now()
+    try:
+        number = max(1, int(number))
+    except (TypeError, ValueError):
+        number = 1
+    if not _terms(query):
+        return NewsPage([], 1, False)
+    function = _search_postgresql if is_postgresql() else _search_fallback
+    #Fetch one more result to know if there is a next page.
+    results = function(query, now, per_page + 1, (number - 1) * per_page)
+    return NewsPage(results[:per_page], number, len(results) > per_page)
+
+
+def matching_ids(model, query):
+    """Return the ids of the objects of model, published or not, matching
+    query.
+    """
+
+    content_type = ContentType.objects.get_for_model(model)
+    if not is_postgresql():
+        return list(_filtered(SearchEntry.objects.filter(
+            content_type=content_type), _terms(query)).\
+            values_list('object_id', flat=True))
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT %s FROM %s WHERE %s = %%s AND document @@ (%s)' %
+            (qn('object_id'), qn(SearchEntry._meta.db_table),
+            qn('content_type_id'), _tsquery()),
+            [content_type.pk] + [query] * len(CONFIGURATIONS))
+        return [row[0] for row in cursor.fetchall()]
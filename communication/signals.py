@@ -0,0 +1,51 @@
+"""Receivers keeping the cached blocks of the home page and the search entries
+up to date and generating the thumbnails and variants of the covers of articles.
+"""
+from django.db.models.signals import (post_save, post_delete)
+from django.dispatch import receiver
+from activities.models import Activity
+from communication.models import (Article, Information, Weekmail, Paragraph)
+from sports.models import (Sport, Session, CancelledSession, Match)
+from sportassociation import (thumbnails, variants)
+from . import (cache, search)
+
+HOME_BLOCKS = {
+    Activity: (cache.CAROUSEL,),
+    Article: (cache.CAROUSEL,),
+    Information: (cache.INFORMATIONS,),
+    Sport: (cache.SESSIONS, cache.MATCH,),
+    Session: (cache.SESSIONS,),
+    CancelledSession: (cache.SESSIONS,),
+    Match: (cache.MATCH,),
+}
+
+
+def invalidate_home(sender, **kwargs):
+    cache.invalidate(*HOME_BLOCKS[sender])
+
+for model in HOME_BLOCKS:
+    post_save.connect(invalidate_home, sender=model)
+    post_delete.connect(invalidate_home, sender=model)
+
+
+@receiver(post_save, sender=Article)
+def pregenerate_cover(sender, instance, **kwargs):
+    thumbnails.pregenerate(instance)
+    variants.pregenerate(instance)
+
+
+SEARCHED_MODELS = (Activity, Article, Weekmail)
+
+
+def update_search_entry(sender, instance, **kwargs):
+    search.index(instance)
+
+
+def remove_search_entry(sender, instance, **kwargs):
+    search.unindex(instance)
+
+for model in SEARCHED_MODELS:
+    post_save.connect(update_search_entry, sender=model)
+    post_delete.connect(remove_search_entry, sender=model)
+post_save.connect(update_search_entry, sender=Paragraph)
+post_delete.connect(update_search_entry, sender=Paragraph)
@@ -0,0 +1,39 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import (format_html, format_html_join)
+from sportassociation import (settings, thumbnails, variants)
+
+register = template.Library()
+
+@register.simple_tag
+def thumbnail_url(image, size):
+    return thumbnails.url(image, size)
+
+def _srcset(manifest, mime):
+    return ', '.join('%s %sw' % (default_storage.url(name), width)
+        for width, name in manifest['variants'].get(mime, []))
+
+@register.simple_tag
+def srcset(image, mime='image/webp'):
+    manifest = variants.manifest(image)
+    if manifest is None:
+        return ''
+    return _srcset(manifest, mime)
+
+@register.simple_tag
+def picture(image, size, alt, sizes='100vw'):
+    #The thumbnail at size is displayed while the variants are built.
+    manifest = variants.manifest(image)
+    if manifest is None:
+        if settings.THUMBNAIL_WORKERS:
+            variants.schedule(image)
+        return format_html('<img width="100%" src="{}" alt="{}">',
+            thumbnails.url(image, size), alt)
+    fallback = manifest['fallback']
+    sources = format_html_join('', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, _srcset(manifest, mime), sizes) for mime in \
+        manifest['variants'] if mime != fallback))
+    return format_html('<picture>{}<img width="100%" src="{}" srcset="{}" '
+        'sizes="{}" alt="{}"></picture>', sources, default_storage.url(\
+        manifest['variants'][fallback][-1][1]), _srcset(manifest, fallback),
+        sizes, alt)
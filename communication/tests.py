@@ -1,3 +1,467 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.template import (Context, Template)
+from django.utils import timezone
+from django.utils.functional import empty
+from sorl.thumbnail import default as thumbnail_default
+from PIL import (Image, features)
+from datetime import timedelta
+import base64
+from io import (BytesIO, StringIO)
+import shutil
+import tempfile
+from communication.delivery import deliver_pending
+from communication.models import (Article, Information, Weekmail, Paragraph,
+                                    SearchEntry, PENDING)
+from communication.news import news_page
+from communication import search
+from activities.models import Activity
+from sportassociation import (settings, thumbnails, variants)
+from sportassociation.instrumentation import (QueryBudgetMixin, measure)
+from smtplib import SMTPException
+from unittest import mock
+from users.models import CustomUser
 
-#  Create your tests here.
+
+class HomeViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_hit_runs_no_query(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_information_write_invalidates_banner(self):
+        self.client.get(reverse('home'))
+        Information.objects.create(title='Gymnase fermé', is_important=True,
+            is_published=True, start_date=timezone.now() - timedelta(1))
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'GYMNASE FERMÉ')
+
+
+class NewsViewTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        for day in range(12):
+            Article.objects.create(title='Article %s' % day, slug='article',
+                content='', publication_date=now - timedelta(2 * day))
+            Weekmail.objects.create(subject='Weekmail %s' % day,
+                introduction='', conclusion='',
+                sent_date=now - timedelta(2 * day + 1))
+        Article.objects.create(title='Draft', slug='draft', content='')
+
+    def test_pages_are_merged_by_date(self):
+        page = news_page(1)
+        self.assertEqual([str(news) for news in page][:4], ['Article 0',
+            'Weekmail 0', 'Article 1', 'Weekmail 1'])
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        last_page = news_page(3)
+        self.assertEqual(len(last_page), 6)
+        self.assertFalse(last_page.has_next())
+        self.assertEqual(news_page(42).number, 3)
+        self.assertEqual(news_page(-1).number, 3)
+        self.assertEqual(news_page('abc').number, 1)
+
+    def test_news_view_queries_do_not_grow_with_archive(self):
+        #Feed, articles, weekmails and their paragraphs.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('communication:news'))
+        self.assertContains(response, 'Weekmail 3')
+        self.assertNotContains(response, 'Weekmail 5')
+
+
+class ArticlesViewTest(TestCase):
+
+    def setUp(self):
+        #Articles sharing publication dates are ordered by pk.
+        date = timezone.now() - timedelta(1)
+        for index in range(20):
+            Article.objects.create(title='Article %s' % index, slug='article',
+                content='', publication_date=date - timedelta(index // 2))
+
+    def test_cursors_walk_through_pages(self):
+        response = self.client.get(reverse('communication:articles'))
+        first_page = response.context['page_obj']
+        self.assertEqual([article.title for article in first_page],
+            ['Article %s' % index for index in (1, 0, 3, 2, 5, 4, 7, 6, 9)])
+        self.assertFalse(first_page.has_previous())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('communication:articles'),
+                {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(second_page[0].title, 'Article 8')
+        self.assertTrue(second_page.has_next())
+
+        response = self.client.get(reverse('communication:articles'),
+            {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(first_page))
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('communication:articles'),
+            {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+        for payload in (b'{"a": 1}', b'[]', b'"a"'):
+            response = self.client.get(reverse('communication:articles'),
+                {'cursor': base64.urlsafe_b64encode(payload).decode('ascii')})
+            self.assertEqual(response.status_code, 404)
+
+    def test_numbered_pages_are_redirected(self):
+        url = reverse('communication:articles')
+        response = self.client.get(url, {'page': '2'})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.context['page_obj'][0].title, 'Article 8')
+        for number in ('1', 'last', '10'):
+            response = self.client.get(url, {'page': number})
+            self.assertRedirects(response, url, status_code=302)
+
+
+class WeekmailDeliveryTest(TestCase):
+
+    def setUp(self):
+        self.weekmail = Weekmail.objects.create(subject='Semaine 42',
+            introduction='Bonjour', conclusion='Sportivement')
+        self.recipients = ['member%s@example.com' % index for index in range(5)]
+
+    def test_batches_are_sent_over_one_connection(self):
+        with mock.patch.object(settings, 'WEEKMAIL_RECIPIENTS', self.recipients):
+            self.assertEqual(len(self.weekmail.queue(batch_size=2)), 3)
+        self.assertIsNone(Weekmail.objects.get(pk=self.weekmail.pk).sent_date)
+
+        self.assertEqual(deliver_pending(), (3, 0))
+        self.assertEqual([message.to for message in mail.outbox],
+            [self.recipients[0:2], self.recipients[2:4], self.recipients[4:]])
+        self.assertEqual(mail.outbox[0].subject, '[Weekmail] Semaine 42')
+        self.assertIsNotNone(Weekmail.objects.get(pk=self.weekmail.pk).sent_date)
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_failed_batch_is_retried_later(self):
+        with mock.patch.object(settings, 'WEEKMAIL_RECIPIENTS', self.recipients):
+            self.weekmail.queue(batch_size=5)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.'
+                'send_messages', side_effect=SMTPException('Timeout')):
+            self.assertEqual(deliver_pending(), (0, 1))
+        batch = self.weekmail.delivery_batches.get()
+        self.assertEqual((batch.status, batch.attempts), (PENDING, 1))
+        self.assertGreater(batch.next_attempt_date, timezone.now())
+        #The batch is not due yet.
+        self.assertEqual(deliver_pending(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_rendering_error_is_an_attempt(self):
+        self.weekmail.queue()
+        with mock.patch.object(Weekmail, 'build_message',
+                side_effect=UnicodeEncodeError('ascii', '', 0, 1, 'error')):
+            self.assertEqual(deliver_pending(), (0, 1))
+        batch = self.weekmail.delivery_batches.get()
+        self.assertEqual((batch.status, batch.attempts), (PENDING, 1))
+        self.assertIn('ascii', batch.last_error)
+
+    def test_weekmail_is_queued_once(self):
+        with mock.patch.object(settings, 'WEEKMAIL_RECIPIENTS', self.recipients):
+            self.assertEqual(len(self.weekmail.queue(batch_size=2)), 3)
+            self.assertEqual(self.weekmail.queue(batch_size=2), [])
+            self.assertEqual(deliver_pending(), (3, 0))
+            self.assertEqual(self.weekmail.queue(batch_size=2), [])
+        self.assertEqual(self.weekmail.delivery_batches.count(), 3)
+
+
+class MediaTestCase(TestCase):
+    #Media are written in a temporary directory, thumbnails generated inline.
+
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.media_root = self.settings(MEDIA_ROOT=self.media)
+        self.media_root.enable()
+        #sorl-thumbnail keeps its own storage.
+        thumbnail_default.storage._wrapped = empty
+        self.workers = mock.patch.object(settings, 'THUMBNAIL_WORKERS', 0)
+        self.workers.start()
+
+    def tearDown(self):
+        self.workers.stop()
+        self.media_root.disable()
+        thumbnail_default.storage._wrapped = empty
+        shutil.rmtree(self.media)
+
+    def image(self, name):
+        output = BytesIO()
+        Image.new('RGB', (1600, 900), 'red').save(output, 'PNG')
+        return default_storage.save(name, ContentFile(output.getvalue()))
+
+
+class ThumbnailTest(MediaTestCase):
+
+    def test_saving_generates_thumbnails(self):
+        article = Article.objects.create(title='Rentrée', slug='rentree',
+            content='', cover=self.image('public/covers/articles/rentree.png'))
+        self.assertEqual(thumbnails.lookup(article.cover, 'carousel').size,
+            [1140, 400])
+        self.assertEqual(thumbnails.lookup(article.cover, 'list').size,
+            [360, 240])
+        self.assertEqual(thumbnails.lookup(article.cover, 'detail').width, 750)
+
+    def test_template_never_generates(self):
+        article = Article.objects.create(title='Rentrée', slug='rentree',
+            content='')
+        Article.objects.filter(pk=article.pk).update(cover=\
+            self.image('public/covers/articles/rentree.png'))
+        article = Article.objects.get(pk=article.pk)
+        template = Template("{% load thumbnails %}"
+            "{% thumbnail_url article.cover 'list' %}")
+        self.assertEqual(template.render(Context({'article': article})),
+            article.cover.url)
+        self.assertIsNone(thumbnails.lookup(article.cover, 'list'))
+
+        output = StringIO()
+        call_command('generate_thumbnails', stdout=output)
+        self.assertIn('1 image(s) processed.', output.getvalue())
+        self.assertEqual(template.render(Context({'article': article})),
+            thumbnails.lookup(article.cover, 'list').url)
+        self.assertEqual(thumbnails.backfill(dry_run=True), 0)
+
+    def test_thumbnails_are_queued_once(self):
+        article = Article(cover='public/covers/articles/missing.png')
+        template = Template("{% load thumbnails %}"
+            "{% thumbnail_url article.cover 'list' %}")
+        with mock.patch.object(settings, 'THUMBNAIL_WORKERS', 2), \
+                mock.patch.object(thumbnails, 'run') as run, \
+                mock.patch.object(thumbnails, 'lookup') as lookup:
+            lookup.return_value = None
+            for index in range(3):
+                template.render(Context({'article': article}))
+        self.assertEqual((run.call_count, lookup.call_count), (1, 1))
+        #The image does not exist: it is not queued again until the mark
+        #expires.
+        thumbnails._release(*run.call_args[0][1:])
+        self.assertIsNone(thumbnails.schedule(article.cover, ('list',)))
+
+    def test_protected_thumbnails_stay_protected(self):
+        user = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo=self.image('protected/users/jdoe.png'))
+        self.assertTrue(thumbnails.lookup(user.id_photo, 'photo').name.\
+            startswith('protected/cache/'))
+
+
+class VariantTest(MediaTestCase):
+
+    def test_variants_of_each_width(self):
+        article = Article.objects.create(title='Rentrée', slug='rentree',
+            content='', cover=self.image('public/covers/articles/rentree.png'))
+        manifest = variants.manifest(article.cover)
+        self.assertEqual(manifest['fallback'], 'image/jpeg')
+        self.assertEqual(sorted(manifest['variants']), ['image/jpeg',
+            'image/webp'] if features.check('webp') else ['image/jpeg'])
+        self.assertEqual([width for width, name in \
+            manifest['variants']['image/jpeg']], list(variants.WIDTHS))
+        with default_storage.open(manifest['variants']['image/jpeg'][0][1]) \
+                as variant:
+            self.assertEqual(Image.open(variant).size, (320, 180))
+
+    def test_identical_sources_share_variants(self):
+        first = variants.build(self.image('public/covers/articles/a.png'))
+        second = variants.build(self.image('public/covers/articles/b.png'))
+        self.assertEqual(first['variants'], second['variants'])
+
+    def test_exif_orientation(self):
+        output = BytesIO()
+        exif = b'Exif\x00\x00MM\x00*\x00\x00\x00\x08\x00\x01\x01\x12\x00\x03' \
+            b'\x00\x00\x00\x01\x00\x06\x00\x00\x00\x00\x00\x00'
+        Image.new('RGB', (400, 200), 'red').save(output, 'JPEG', exif=exif)
+        manifest = variants.build(default_storage.save(
+            'public/covers/articles/portrait.jpg', ContentFile(output.getvalue())))
+        self.assertEqual((manifest['width'], manifest['height']), (200, 400))
+
+    def test_replaced_source_gets_new_variants(self):
+        name = self.image('public/covers/articles/rentree.png')
+        first = variants.build(name)
+        default_storage.delete(name)
+        output = BytesIO()
+        Image.new('RGB', (800, 800), 'blue').save(output, 'PNG')
+        default_storage.save(name, ContentFile(output.getvalue()))
+        self.assertIsNone(variants.manifest(name))
+        self.assertNotEqual(variants.build(name)['hash'], first['hash'])
+        self.assertEqual(variants.manifest(name)['height'], 800)
+
+    def test_small_image_is_not_upscaled(self):
+        output = BytesIO()
+        Image.new('RGBA', (400, 200)).save(output, 'PNG')
+        manifest = variants.build(default_storage.save(
+            'public/covers/articles/logo.png', ContentFile(output.getvalue())))
+        self.assertEqual(manifest['fallback'], 'image/png')
+        self.assertEqual([width for width, name in \
+            manifest['variants']['image/png']], [320, 400])
+
+    def test_variants_are_queued_once(self):
+        article = Article(cover=self.image('public/covers/articles/rentree.png'))
+        template = Template("{% load thumbnails %}"
+            "{% picture article.cover 'list' 'Rentrée' %}")
+        with mock.patch.object(settings, 'THUMBNAIL_WORKERS', 2), \
+                mock.patch.object(thumbnails, 'run') as run:
+            for index in range(3):
+                template.render(Context({'article': article}))
+        builds = [call[0][1:] for call in run.call_args_list
+            if call[0][2] is variants.build]
+        self.assertEqual(len(builds), 1)
+        thumbnails._release(*builds[0])
+        self.assertIsNone(cache.get(builds[0][0]))
+        self.assertIsNotNone(variants.manifest(article.cover))
+
+    def test_picture_tag(self):
+        article = Article.objects.create(title='Rentrée', slug='rentree',
+            content='')
+        Article.objects.filter(pk=article.pk).update(cover=\
+            self.image('public/covers/articles/rentree.png'))
+        article = Article.objects.get(pk=article.pk)
+        template = Template("{% load thumbnails %}"
+            "{% picture article.cover 'list' 'Rentrée' %}")
+        self.assertTrue(template.render(Context({'article': article})).\
+            startswith('<img'))
+
+        variants.build(article.cover)
+        #Manifests outlive the cache.
+        cache.clear()
+        html = template.render(Context({'article': article}))
+        self.assertTrue(html.startswith('<picture>'))
+        self.assertIn('%s 320w' % default_storage.url(variants.manifest(\
+            article.cover)['variants']['image/jpeg'][0][1]), html)
+
+
+class SearchTest(TestCase):
+    #The fallback search is used, the tests running on SQLite.
+
+    def setUp(self):
+        now = timezone.now()
+        self.article = Article.objects.create(title='Tournoi de rugby',
+            slug='tournoi', content='<p>Le tournoi &amp; la troisième '
+            'mi-temps.</p>', publication_date=now - timedelta(1))
+        Activity.objects.create(title='Sortie ski', slug='ski',
+            content='<p>Descente aux flambeaux après le tournoi.</p>',
+            start_date=now, end_date=now, publication_date=now - timedelta(2))
+        Article.objects.create(title='Brouillon', slug='brouillon',
+            content='Tournoi secret')
+        self.weekmail = Weekmail.objects.create(subject='Semaine 42',
+            introduction='Bonjour', conclusion='Sportivement',
+            sent_date=now - timedelta(3))
+
+    def test_entries_follow_saves(self):
+        entry = SearchEntry.objects.get(object_id=self.article.pk,
+            title='Tournoi de rugby')
+        self.assertEqual(entry.text, 'Le tournoi & la troisième mi-temps.')
+        self.assertEqual(entry.url, reverse('communication:article',
+            kwargs={'pk': self.article.pk, 'slug': 'tournoi'}))
+
+        Paragraph.objects.create(weekmail=self.weekmail, index=0,
+            title='Piscine', content='<b>Nouveaux</b> horaires')
+        self.assertIn('Piscine Nouveaux horaires', SearchEntry.objects.get(
+            title='Semaine 42').text)
+        self.weekmail.delete()
+        self.assertFalse(SearchEntry.objects.filter(title='Semaine 42').exists())
+
+        SearchEntry.objects.all().delete()
+        self.assertEqual(search.rebuild(), 3)
+        self.assertEqual(SearchEntry.objects.count(), 3)
+
+    def test_deferred_indexing(self):
+        builder = mock.Mock(wraps=search.BUILDERS[Weekmail])
+        with mock.patch.dict(search.BUILDERS, {Weekmail: builder}):
+            with search.deferred():
+                self.weekmail.save()
+                for index in range(3):
+                    Paragraph.objects.create(weekmail=self.weekmail,
+                        index=index, title='Paragraphe %s' % index, content='')
+                article = Article.objects.create(title='Brouillon 2',
+                    slug='brouillon', content='')
+                article.delete()
+                self.assertEqual(builder.call_count, 0)
+        self.assertEqual(builder.call_count, 1)
+        self.assertIn('Paragraphe 2', SearchEntry.objects.get(
+            title='Semaine 42').text)
+        self.assertFalse(SearchEntry.objects.filter(title='Brouillon 2').exists())
+
+    def test_only_published_entries_are_found(self):
+        page = search.search('TOURNOI')
+        self.assertEqual([result.entry.title for result in page],
+            ['Tournoi de rugby', 'Sortie ski'])
+        self.assertEqual(str(page[0].snippet), 'Le <mark>tournoi</mark> &amp; '
+            'la troisième mi-temps.')
+        self.assertEqual(len(search.search('tournoi rugby')), 1)
+        self.assertEqual(len(search.search('   ')), 0)
+        self.assertCountEqual(search.matching_ids(Article, 'tournoi'),
+            [self.article.pk, Article.objects.get(slug='brouillon').pk])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'flambeaux'})
+        self.assertContains(response, '<mark>flambeaux</mark>')
+        self.assertContains(response, 'Sortie ski')
+        self.assertNotContains(response, 'Tournoi de rugby')
+
+
+class InstrumentationTest(QueryBudgetMixin, TestCase):
+    query_budgets = {
+        'home': 12,
+        'communication:news': 4,
+        'communication:articles': 2,
+        'admin:sports_sport_changelist': 5,
+    }
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        for day in range(12):
+            Article.objects.create(title='Article %s' % day, slug='article',
+                content='', publication_date=now - timedelta(day))
+
+    def test_views_are_within_budget(self):
+        for name in ('home', 'communication:news', 'communication:articles'):
+            self.assertWithinBudget(self.client.get(reverse(name)))
+        User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.login(username='admin', password='secret')
+        measures = self.assertWithinBudget(self.client.get(
+            reverse('admin:sports_sport_changelist')))
+        self.assertEqual(measures.view_name,
+            'admin:sports_sport_changelist')
+
+    def test_duplicate_queries_are_counted(self):
+        with measure('loop') as measures:
+            for index in range(3):
+                Article.objects.filter(pk=1).exists()
+            Article.objects.count()
+        self.assertEqual((measures[0].query_count, measures[0].duplicates),
+            (4, 2))
+        self.assertEqual(measures[0].most_duplicated()[0][1], 3)
+
+    def test_headers_follow_setting(self):
+        response = self.client.get(reverse('communication:news'))
+        self.assertFalse(response.has_header('X-Query-Count'))
+        with mock.patch.object(settings, 'INSTRUMENTATION_HEADERS', True):
+            response = self.client.get(reverse('communication:news'))
+        self.assertEqual(response['X-Query-Count'],
+            str(response.measures.query_count))
+        self.assertEqual(response['X-Duplicate-Queries'], '0')
+        self.assertTrue(response['Server-Timing'].startswith('total;dur='))
+
+    def test_queries_follow_setting(self):
+        with mock.patch.object(settings, 'INSTRUMENTATION_QUERIES', False), \
+                mock.patch.object(settings, 'INSTRUMENTATION_HEADERS', True):
+            response = self.client.get(reverse('communication:news'))
+        self.assertFalse(response.measures.recorded)
+        self.assertGreater(response.measures.duration, 0)
+        self.assertNotIn('queries=', str(response.measures))
+        self.assertFalse(response.has_header('X-Query-Count'))
+        self.assertNotIn('db;dur', response['Server-Timing'])
@@ -3,54 +3,35 @@ from django.views.generic import (View, ListView)
 from django.utils.translation import ugettext as _
 from django.db.models import Q
 from .forms import ContactForm
-from activities.models import Activity
-from communication.models import (Article, Information, Weekmail)
-from sports.models import (Session, Match)
-from management.models import (Weekday, MembershipType, Location)
-from datetime import (datetime, timedelta)
+from . import cache as home_cache
+from .news import news_page
+from .search import search
+from communication.models import (Article, Weekmail)
+from management.models import (MembershipType, Location)
 from django.utils import timezone
 from django.http import (HttpResponseRedirect, HttpResponsePermanentRedirect,
                         HttpResponse, Http404)
 from django.core.urlresolvers import reverse
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from itertools import chain
 from smtplib import SMTPException
 from django.core.mail import send_mail
 from sportassociation import settings
+from sportassociation.pagination import (CursorPaginationMixin,
+                                        ESTIMATED_COUNT)
 from django.contrib import messages
 
 class HomeView(View):
     template_name = 'communication/home.html'
 
     def get(self, request):
-        now = datetime.now()
-        nowWeekday = Weekday.to_django_weekday(now.weekday())
-        activities = Activity.objects.exclude(publication_date__gt=now).\
-            exclude(end_date__lt=now).exclude(publication_date__isnull=True).\
-            filter(is_frontpage=True).order_by('-publication_date')
-        articles = Article.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).filter(is_frontpage=True).\
-            order_by('-publication_date')
-        sessions = Session.objects.filter(sport__is_open=True).\
-            filter(Q(weekday=nowWeekday) | Q(weekday=(nowWeekday+1)%7) | Q(weekday=(nowWeekday+2)%7) ).\
-            order_by('weekday').order_by('start_time')
-        informations = Information.objects.filter(is_important=True, is_published=True).\
-            filter(Q(start_date__lt=now) | Q(start_date__isnull=True)).\
-            filter(Q(end_date__gt=now) | Q(end_date__isnull=True)).\
-            order_by('-end_date')
-        is_past = False
-        match = Match.objects.filter(date__gt=now).order_by('date').first()
-        if not match:
-            match = Match.objects.filter(date__lt=now).order_by('-date').first()
-            is_past = True
-        days = [now,now+timedelta(1),now+timedelta(2)]
-        weekdays = [Weekday.to_django_weekday(day.weekday()) for day in days]
-        content = {'activities': activities, 'articles': articles,
-            'num_frontpage': range(activities.count() + articles.count()),
-            'days_sessionsPerDay': zip(days,
-                [sessions.filter(weekday=weekday) for weekday in weekdays]),
-            'match': {'is_past': is_past, 'object': match},
-            'informations': informations}
+        blocks = home_cache.get_blocks()
+        carousel = blocks[home_cache.CAROUSEL]
+        content = {'activities': carousel['activities'],
+            'articles': carousel['articles'],
+            'num_frontpage': range(len(carousel['activities']) +
+                len(carousel['articles'])),
+            'days_sessionsPerDay': blocks[home_cache.SESSIONS]['days_sessions'],
+            'match': blocks[home_cache.MATCH],
+            'informations': blocks[home_cache.INFORMATIONS]}
         return render(request, self.template_name, content)
 
     def post(self, request):
@@ -134,45 +115,35 @@ class MentionsLegalesView(View):
     def get(self, request):
         return render(request, self.template_name, None)
 
-def returnDate(instance):
-    if instance.__class__.__name__ == 'Weekmail':
-        return instance.sent_date
-    return instance.publication_date
-
 class NewsView(View):
     template_name = "communication/news.html"
 
     def get(self, request):
-        now = datetime.now()
-        articles_list = Article.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).order_by('-publication_date')
-        weekmails_list = Weekmail.objects.exclude(sent_date__gt=now).\
-            exclude(sent_date__isnull=True).order_by('-sent_date')
-        news_list = sorted(chain(articles_list, weekmails_list), key=returnDate, reverse=True)
-
-        paginator = Paginator(news_list, 9)
-        page = request.GET.get('page')
-
-        try:
-            news = paginator.page(page)
-        except PageNotAnInteger:
-            news = paginator.page(1)
-        except EmptyPage:
-            news = paginator.page(paginator.num_pages)
-
+        news = news_page(request.GET.get('page'))
         return render(request, self.template_name, {'news': news,})
 
     def post(self, request):
         return HttpResponseRedirect('communication:news')
 
-class ArticlesView(ListView):
+class SearchView(View):
+    template_name = "communication/search.html"
+
+    def get(self, request):
+        query = request.GET.get('q', '')[:200]
+        results = search(query, request.GET.get('page'))
+        return render(request, self.template_name, {'query': query,
+            'results': results,})
+
+class ArticlesView(CursorPaginationMixin, ListView):
     model = Article
     paginate_by = 9
+    cursor_ordering = ('-publication_date', '-pk')
+    cursor_count_mode = ESTIMATED_COUNT
 
     def get_queryset(self):
-        now = datetime.now()
+        now = timezone.now()
         return Article.objects.exclude(publication_date__gt=now).\
-            exclude(publication_date__isnull=True).order_by('-publication_date')
+            exclude(publication_date__isnull=True)
 
 class ArticleView(View):
     template_name = "communication/article.html"
@@ -191,14 +162,16 @@ class ArticleView(View):
     def post(self, request):
         return HttpResponseRedirect('communication:article')
 
-class WeekmailsView(ListView):
+class WeekmailsView(CursorPaginationMixin, ListView):
     model = Weekmail
     paginate_by = 9
+    cursor_ordering = ('-sent_date', '-pk')
+    cursor_count_mode = ESTIMATED_COUNT
 
     def get_queryset(self):
-        now = datetime.now()
+        now = timezone.now()
         return Weekmail.objects.exclude(sent_date__gt=now).\
-            exclude(sent_date__isnull=True).order_by('-sent_date')
+            exclude(sent_date__isnull=True).prefetch_related('paragraphs')
 
 class WeekmailView(View):
     template_name = "communication/weekmail_display.html"
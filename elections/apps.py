@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ElectionsConfig(AppConfig):
+    name = 'elections'
+
+    def ready(self):
+        #Connect the receivers removing outdated cached results.
+        from . import signals
@@ -0,0 +1,58 @@
+"""Casting of the votes of a member for an election.
+
+A ballot holds the chosen candidature of a member for any number of vacant
+positions of an election. It is cast in a single transaction: either every
+vote is saved or none is. The unique (voter, vacant_position) constraint of
+Vote rejects a second ballot even if both are submitted at the same time.
+
+This exports:
+    - cast_ballot: save the votes of a member for an election.
+"""
+from django.core.exceptions import ValidationError
+from django.db import (IntegrityError, transaction)
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+from elections.models import (Candidature, Vote)
+from users.models import CustomUser
+
+
+def cast_ballot(election, voter, candidatures, now=None):
+    """Save a vote of voter for each of candidatures (ids or instances).
+
+    Raise ValidationError if the election is not open, if voter is not a
+    member, if a candidature does not belong to election, if two candidatures
+    are for the same vacant position or if voter already voted for one of the
+    vacant positions. Return the list of the votes.
+    """
+
+    if now is None:
+        now = timezone.now()
+    if not election.is_published or not election.start_date <= now < \
+            election.end_date:
+        raise ValidationError(_('The election is not open.'))
+    if not CustomUser.objects.members(on=timezone.localtime(now).date()).\
+            filter(pk=voter.pk).exists():
+        raise ValidationError(_('User currently not a member. Not allowed to \
+                                vote.'))
+
+    ids = set(getattr(candidature, 'pk', candidature) for candidature in \
+        candidatures)
+    positions = dict(Candidature.objects.filter(pk__in=ids,
+        vacant_position__election=election).values_list('pk',
+        'vacant_position'))
+    if len(positions) != len(ids):
+        raise ValidationError(_('Invalid candidature.'))
+    if len(set(positions.values())) != len(positions):
+        raise ValidationError(_('Only one candidate can be chosen for each \
+                                position.'))
+
+    votes = [Vote(voter=voter, candidature_id=candidature,
+        vacant_position_id=vacant_position) for candidature, vacant_position \
+        in sorted(positions.items())]
+    try:
+        with transaction.atomic():
+            #bulk_create does not call save, vacant_position is set above.
+            Vote.objects.bulk_create(votes)
+    except IntegrityError:
+        raise ValidationError(_('The user already voted for this position.'))
+    return votes
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import (connection, transaction)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+import random
+import time
+from elections.models import (Election, VacantPosition, Candidature, Vote)
+from elections.results import tally
+from management.models import Position
+from users.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare counting votes per candidature with the GROUP BY tally on \
+            a synthetic election. Nothing is kept in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=5000,
+            help='Number of synthetic voters.')
+        parser.add_argument('--candidatures', type=int, default=50,
+            help='Number of synthetic candidatures.')
+        parser.add_argument('--positions', type=int, default=10,
+            help='Number of vacant positions sharing the candidatures.')
+
+    def measure(self, label, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            duration = time.perf_counter() - start
+        self.stdout.write('%-40s %8.3f s %6d queries' % (label, duration,
+            len(queries)))
+
+    def populate(self, voters, candidatures, positions):
+        now = timezone.now()
+        election = Election.objects.create(title='Benchmark', slug='benchmark',
+            description='', start_date=now - timedelta(2),
+            end_date=now - timedelta(1))
+        position = Position.objects.create(title='Benchmark', description='')
+        vacant_positions = [VacantPosition.objects.create(election=election,
+            position=position, elected_number=2) for index in range(positions)]
+
+        User.objects.bulk_create([User(username='benchmark-%s' % index,
+            email='benchmark-%s@example.com' % index) for index in range(voters)])
+        CustomUser.objects.bulk_create([CustomUser(user=user,
+            id_photo='protected/users/benchmark.jpg') for user in \
+            User.objects.filter(username__startswith='benchmark-')])
+        users = list(CustomUser.objects.filter(\
+            user__username__startswith='benchmark-'))
+
+        Candidature.objects.bulk_create([Candidature(candidate=users[index],
+            vacant_position=vacant_positions[index % positions])
+            for index in range(candidatures)])
+        per_position = {}
+        for candidature in Candidature.objects.filter(\
+                vacant_position__election=election):
+            per_position.setdefault(candidature.vacant_position_id, []).\
+                append(candidature)
+        #Every voter votes once for each position.
+        Vote.objects.bulk_create([Vote(voter=user, vacant_position_id=position,
+            candidature=random.choice(candidatures)) for user in users
+            for position, candidatures in per_position.items()])
+        return election
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                election = self.populate(options['voters'],
+                    options['candidatures'], options['positions'])
+                self.measure('votes.count() per candidature (before)',
+                    lambda: [[candidature.votes.count() for candidature in \
+                    vacant_position.candidatures.all()] for vacant_position \
+                    in election.vacant_positions.all()])
+                self.measure('tally, computed (after)',
+                    lambda: tally(election, now=election.end_date -\
+                    timedelta(1)))
+                tally(election)
+                self.measure('tally, cached (after)', lambda: tally(election))
+                raise Rollback()
+        except Rollback:
+            pass
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0002_auto_20150823_1739'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='vacant_position',
+            field=models.ForeignKey(verbose_name='vacant position', related_name='votes', to='elections.VacantPosition', editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_vacant_position(apps, schema_editor):
+    Vote = apps.get_model('elections', 'Vote')
+    seen = set()
+    for vote in Vote.objects.select_related('candidature').order_by('pk'):
+        key = (vote.voter_id, vote.candidature.vacant_position_id)
+        #Only the first vote of a voter for a vacant position was valid.
+        if key in seen:
+            vote.delete()
+            continue
+        seen.add(key)
+        Vote.objects.filter(pk=vote.pk).\
+            update(vacant_position=vote.candidature.vacant_position_id)
+
+
+class Migration(migrations.Migration):
+    #The votes are filled in their own migration: PostgreSQL cannot alter a
+    #table with pending trigger events in the same transaction.
+
+    dependencies = [
+        ('elections', '0003_vote_vacant_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_vacant_position, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0004_fill_vote_vacant_position'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vote',
+            name='vacant_position',
+            field=models.ForeignKey(verbose_name='vacant position', related_name='votes', to='elections.VacantPosition', editable=False),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together=set([('voter', 'vacant_position')]),
+        ),
+    ]
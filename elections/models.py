@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import (models, IntegrityError)
 from django.core.exceptions import ValidationError
 from django.utils.translation import ugettext as _
 from django.utils import timezone
@@ -100,6 +100,10 @@ class Candidature(models.Model):
         - candidate: member who posts this candidature.
         - vacant_position: vacant position associated to this candidature.
         - votes: several votes associated to this candidature.
+
+    Clean:
+        - a candidature which received votes cannot move to another vacant
+            position.
     """
     speech = models.TextField(_('speech'), blank=True)
 
@@ -112,6 +116,23 @@ class Candidature(models.Model):
         verbose_name = _('candidature')
         verbose_name_plural = _('candidatures')
 
+    def _moved_with_votes(self):
+        #The votes store the vacant position of their candidature: moving it
+        #would bypass the one vote per position constraint.
+        return not self._state.adding and Vote.objects.filter(candidature=\
+            self.pk).exclude(vacant_position=self.vacant_position_id).exists()
+
+    def clean(self):
+        if self._moved_with_votes():
+            raise ValidationError(_('The candidature already received votes, \
+                                    its vacant position cannot be changed.'))
+
+    def save(self, *args, **kwargs):
+        if self._moved_with_votes():
+            raise IntegrityError(_('The candidature already received votes, \
+                                    its vacant position cannot be changed.'))
+        super(Candidature, self).save(*args, **kwargs)
+
     def __str__(self):
         return '%s (%s)' % (self.candidate.user.get_full_name(),
             str(self.vacant_position))
@@ -121,13 +142,16 @@ class Vote(models.Model):
     """Vote associated to a candidature and a vacant position.
 
     Members only are allowed to vote in an election. One member can vote for
-    one candidate for one vacant position only once.
+    one candidate for one vacant position only once: the vacant position of the
+    candidature is copied in the vote so that the database enforces it with a
+    unique constraint, even for concurrent votes.
 
     Attributes:
         - creation_date: datetime of the creation of the vote. Not editable.
 
     Relationships with other models:
         - candidature: candidature associated to this vote.
+        - vacant_position: vacant position of the candidature. Set on save.
         - voter: member responsible of this vote.
 
     Clean:
@@ -139,21 +163,27 @@ class Vote(models.Model):
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
 
     candidature = models.ForeignKey(Candidature, related_name='votes', verbose_name=_('candidature'))
+    vacant_position = models.ForeignKey(VacantPosition, related_name='votes',
+                        editable=False, verbose_name=_('vacant position'))
     voter = models.ForeignKey(CustomUser, related_name='votes', verbose_name=_('voter'))
 
     class Meta:
         verbose_name = _('vote')
         verbose_name_plural = _('votes')
+        unique_together = ('voter', 'vacant_position')
 
     def clean(self):
-        if not self.voter.is_member():
+        if not CustomUser.objects.members().filter(pk=self.voter_id).exists():
             raise ValidationError(_('User currently not a member. Not allowed to \
                                     vote.'))
-        if Vote.objects.\
-                filter(candidature__vacant_position__candidatures__votes__voter=\
-                self.voter).exists():
+        if Vote.objects.filter(voter=self.voter_id, vacant_position=\
+                self.candidature.vacant_position_id).exclude(pk=self.pk).exists():
             raise ValidationError(_('The user already voted for this position.'))
 
+    def save(self, *args, **kwargs):
+        self.vacant_position_id = self.candidature.vacant_position_id
+        super(Vote, self).save(*args, **kwargs)
+
     def __str__(self):
         return '%s vote %s' % (self.voter.user.get_full_name(),
             self.candidature.candidate.user.get_full_name())
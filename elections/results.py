@@ -0,0 +1,99 @@
+"""Results of elections.
+
+The votes of every candidature of an election are counted by a single GROUP BY
+over the votes. Candidatures with the same number of votes are ranked by date of
+candidature (lowest id first) so results never depend on the database, ties
+crossing the number of elected candidates being reported.
+
+Once the election is over the results cannot change anymore: they are cached
+until a write to the election invalidates them (see signals).
+
+This exports:
+    - PositionResult: class representing the results of a vacant position.
+    - tally: return the results of an election.
+    - invalidate: remove the cached results of an election.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from elections.models import (Candidature, VacantPosition, Vote)
+
+
+class PositionResult(object):
+    """Results of a vacant position.
+
+    Attributes:
+        - candidatures: list of (candidature, number of votes) sorted by rank.
+        - elected: list of the elected candidatures, at most elected_number.
+        - staying_staff: list of the members keeping the position, elected
+            whatever the votes.
+        - ties: list of the candidatures with as many votes as the last elected
+            one, when some of them are not elected. Empty if there is no tie.
+        - vacant_position: vacant position of these results.
+    """
+
+    def __init__(self, vacant_position, candidatures):
+        self.vacant_position = vacant_position
+        self.staying_staff = list(vacant_position.staying_staff.all())
+        self.candidatures = sorted(candidatures,
+            key=lambda result: (-result[1], result[0].pk))
+
+        number = vacant_position.elected_number
+        self.elected = [candidature for candidature, votes in \
+            self.candidatures[:number]]
+        self.ties = []
+        if 0 < number < len(self.candidatures):
+            cutoff = self.candidatures[number - 1][1]
+            if self.candidatures[number][1] == cutoff:
+                self.ties = [candidature for candidature, votes in \
+                    self.candidatures if votes == cutoff]
+
+    @property
+    def votes(self):
+        return sum(votes for candidature, votes in self.candidatures)
+
+    def __repr__(self):
+        return '<Results of %s>' % (self.vacant_position)
+
+
+def _key(election_id):
+    return 'election:%s:results' % (election_id)
+
+
+def _tally(election):
+    vacant_positions = VacantPosition.objects.filter(election=election).\
+        select_related('position').prefetch_related('staying_staff__user').\
+        order_by('pk')
+    votes = dict(Vote.objects.filter(vacant_position__election=election).\
+        values_list('candidature').annotate(Count('pk')).order_by())
+    per_position = {}
+    for candidature in Candidature.objects.filter(\
+            vacant_position__election=election).select_related('candidate__user'):
+        per_position.setdefault(candidature.vacant_position_id, []).\
+            append((candidature, votes.get(candidature.pk, 0)))
+    return [PositionResult(vacant_position, per_position.get(vacant_position.pk,
+        [])) for vacant_position in vacant_positions]
+
+
+def tally(election, now=None):
+    """Return the list of the PositionResult of every vacant position of
+    election.
+
+    Results of an election which is over are cached.
+    """
+
+    if now is None:
+        now = timezone.now()
+    if election.end_date > now:
+        return _tally(election)
+    results = cache.get(_key(election.pk))
+    if results is None:
+        results = _tally(election)
+        cache.set(_key(election.pk), results, None)
+    return results
+
+
+def invalidate(election_id):
+    """Remove the cached results of the election with the id election_id."""
+
+    cache.delete(_key(election_id))
@@ -0,0 +1,43 @@
+"""Receivers removing the cached results of elections when they change."""
+from django.db.models.signals import (post_save, post_delete, m2m_changed)
+from django.dispatch import receiver
+from elections.models import (Election, VacantPosition, Candidature, Vote)
+from . import results
+
+
+@receiver(post_save, sender=Election)
+@receiver(post_delete, sender=Election)
+def invalidate_election(sender, instance, **kwargs):
+    results.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=VacantPosition)
+@receiver(post_delete, sender=VacantPosition)
+def invalidate_vacant_position(sender, instance, **kwargs):
+    results.invalidate(instance.election_id)
+
+
+@receiver(m2m_changed, sender=VacantPosition.staying_staff.through)
+def invalidate_staying_staff(sender, instance, **kwargs):
+    if isinstance(instance, VacantPosition):
+        results.invalidate(instance.election_id)
+    else:
+        for election_id in VacantPosition.objects.filter(pk__in=\
+                kwargs['pk_set'] or []).values_list('election', flat=True):
+            results.invalidate(election_id)
+
+
+@receiver(post_save, sender=Candidature)
+@receiver(post_delete, sender=Candidature)
+def invalidate_candidature(sender, instance, **kwargs):
+    for election_id in VacantPosition.objects.filter(pk=\
+            instance.vacant_position_id).values_list('election', flat=True):
+        results.invalidate(election_id)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def invalidate_vote(sender, instance, **kwargs):
+    for election_id in VacantPosition.objects.filter(pk=\
+            instance.vacant_position_id).values_list('election', flat=True):
+        results.invalidate(election_id)
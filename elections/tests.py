@@ -1,3 +1,109 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.utils import timezone
+from datetime import timedelta
+from elections.ballot import cast_ballot
+from elections.models import (Election, VacantPosition, Candidature, Vote)
+from elections.results import tally
+from management.models import Position
+from users.models import CustomUser
 
-#  Create your tests here.
+
+def create_user(username):
+    return CustomUser.objects.create(user=User.objects.create(
+        username=username, email='%s@example.com' % username),
+        id_photo='protected/users/%s.jpg' % username)
+
+
+class ResultsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.election = Election.objects.create(title='Bureau', slug='bureau',
+            description='', start_date=now - timedelta(2),
+            end_date=now - timedelta(1))
+        self.vacant_position = VacantPosition.objects.create(
+            election=self.election, elected_number=2,
+            position=Position.objects.create(title='Trésorier', description=''))
+        self.vacant_position.staying_staff.add(create_user('staff'))
+        self.candidatures = [Candidature.objects.create(
+            candidate=create_user('candidate%s' % index),
+            vacant_position=self.vacant_position) for index in range(4)]
+        #3, 1, 1 and 0 votes.
+        for index, candidature in enumerate([0, 0, 0, 1, 2]):
+            Vote.objects.create(candidature=self.candidatures[candidature],
+                voter=create_user('voter%s' % index))
+
+    def test_ties_are_ranked_by_candidature(self):
+        with self.assertNumQueries(5):
+            result, = tally(self.election)
+        first, second, third, fourth = self.candidatures
+        self.assertEqual(result.elected, [first, second])
+        self.assertEqual(result.ties, [second, third])
+        self.assertEqual([votes for candidature, votes in result.candidatures],
+            [3, 1, 1, 0])
+        self.assertEqual(len(result.staying_staff), 1)
+
+    def test_results_are_cached_until_a_vote_changes(self):
+        tally(self.election)
+        with self.assertNumQueries(0):
+            tally(self.election)
+        Vote.objects.create(candidature=self.candidatures[2],
+            voter=create_user('late'))
+        result, = tally(self.election)
+        self.assertEqual(result.elected, self.candidatures[0:3:2])
+        self.assertEqual(result.ties, [])
+
+
+class BallotTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.election = Election.objects.create(title='Bureau', slug='bureau',
+            description='', is_published=True, start_date=now - timedelta(1),
+            end_date=now + timedelta(1))
+        position = Position.objects.create(title='Bureau', description='')
+        self.candidatures = []
+        for title in ('president', 'treasurer'):
+            vacant_position = VacantPosition.objects.create(
+                election=self.election, position=position)
+            self.candidatures.append([Candidature.objects.create(
+                candidate=create_user('%s%s' % (title, index)),
+                vacant_position=vacant_position) for index in range(2)])
+        self.voter = create_user('voter')
+        CustomUser.objects.filter(pk=self.voter.pk).update(
+            membership_expiration=now.date() + timedelta(30))
+
+    def test_ballot_is_cast_once(self):
+        presidents, treasurers = self.candidatures
+        #Membership, candidatures and the insert within a savepoint.
+        with self.assertNumQueries(5):
+            cast_ballot(self.election, self.voter, [presidents[0],
+                treasurers[1]])
+        self.assertEqual(Vote.objects.filter(voter=self.voter).count(), 2)
+        with self.assertRaises(ValidationError):
+            cast_ballot(self.election, self.voter, [presidents[1]])
+        self.assertEqual(Vote.objects.filter(voter=self.voter).count(), 2)
+
+    def test_candidature_with_votes_cannot_move(self):
+        presidents, treasurers = self.candidatures
+        cast_ballot(self.election, self.voter, [presidents[0]])
+        presidents[0].vacant_position = treasurers[0].vacant_position
+        with self.assertRaises(ValidationError):
+            presidents[0].clean()
+        with self.assertRaises(IntegrityError):
+            presidents[0].save()
+        presidents[1].vacant_position = treasurers[0].vacant_position
+        presidents[1].save()
+
+    def test_invalid_ballots(self):
+        presidents, treasurers = self.candidatures
+        with self.assertRaises(ValidationError):
+            cast_ballot(self.election, self.voter, presidents)
+        with self.assertRaises(ValidationError):
+            cast_ballot(self.election, create_user('guest'), [presidents[0]])
+        self.assertFalse(Vote.objects.exists())
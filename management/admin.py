@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from .models import (Location, Permanence, Equipment, Lending, Position,
                     MembershipType, Membership, PublicFile, PublicImage,
-                    ProtectedFile, ProtectedImage, AdminFile, AdminImage)
+                    ProtectedFile, ProtectedImage, AdminFile, AdminImage, Blob)
 
 class AdminFileInline(GenericTabularInline):
     model = AdminFile
@@ -69,10 +69,11 @@ class PermanenceAdmin(admin.ModelAdmin):
 
 @admin.register(Equipment)
 class EquipmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'quantity',)
+    list_display = ('name', 'description', 'quantity', 'available',)
     search_fields = ('name', 'description',)
     ordering = ('name',)
-    fields = ('name', 'description', 'quantity',)
+    fields = ('name', 'description', 'quantity', 'available',)
+    readonly_fields = ('available',)
 
     class Media:
         js = ('tinymce/tinymce.min.js', 'js/tinymce_4_config.js')
@@ -92,3 +93,10 @@ admin.site.register(ProtectedFile)
 admin.site.register(ProtectedImage)
 admin.site.register(AdminFile)
 admin.site.register(AdminImage)
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'size', 'references', 'creation_date',)
+    search_fields = ('digest',)
+    ordering = ('-creation_date',)
+    readonly_fields = ('digest', 'size', 'references',)
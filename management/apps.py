@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ManagementConfig(AppConfig):
+    name = 'management'
+
+    def ready(self):
+        #Connect the receivers keeping the equipment stock in sync.
+        from . import signals
@@ -0,0 +1,119 @@
+"""Maintenance of the contents stored by the file models.
+
+This exports:
+    - adopt: move the files stored before the content-addressed storage into
+        it.
+    - recount: recompute the references of the blobs from the file models.
+    - collect: remove the contents which are not referenced anymore.
+"""
+from django.db import transaction
+from collections import Counter
+import os
+import shutil
+import time
+from management.models import (Blob, FILE_MODELS)
+from management.storage import (blob_storage, digest_of, BLOBS_DIRECTORY,
+                                ROOTS)
+
+
+def adopt(dry_run=False):
+    """Store the files of the file models which are not in blobs yet by
+    content and return their number. Blobs have to be recounted afterwards.
+    """
+
+    legacy = [(model, pk, name) for model in FILE_MODELS for pk, name in \
+        model.objects.values_list('pk', 'file') if name and \
+        digest_of(name) is None and blob_storage.exists(name)]
+    if dry_run:
+        return len(legacy)
+    adopted = set()
+    for model, pk, name in legacy:
+        with blob_storage.open(name) as legacy_file:
+            stored = blob_storage.save(name, legacy_file)
+        model.objects.filter(pk=pk).update(file=stored)
+        adopted.add(name)
+    #Several rows may have shared a legacy file.
+    still_used = set(name for model in FILE_MODELS for name in \
+        model.objects.filter(file__in=adopted).values_list('file', flat=True))
+    for name in adopted - still_used:
+        blob_storage.delete(name)
+    return len(legacy)
+
+
+def _references():
+    #Names and number of rows of the file models of each digest.
+    names = {}
+    counts = Counter()
+    for model in FILE_MODELS:
+        for name in model.objects.values_list('file', flat=True):
+            digest = digest_of(name)
+            if digest is not None:
+                names[digest] = name
+                counts[digest] += 1
+    return names, counts
+
+
+def recount(dry_run=False):
+    """Recompute the references of every blob from the file models.
+
+    Return a list of (digest, stored references, recomputed references) of the
+    blobs which drifted. They are repaired unless dry_run is True.
+    """
+
+    with transaction.atomic():
+        names, counts = _references()
+        stored = dict(Blob.objects.select_for_update().\
+            values_list('digest', 'references'))
+        drifted = [(digest, stored.get(digest), counts.get(digest, 0))
+            for digest in set(stored) | set(counts)
+            if stored.get(digest) != counts.get(digest, 0)]
+        if not dry_run:
+            for digest, references, count in drifted:
+                if references is None:
+                    Blob.objects.create(digest=digest, references=count,
+                        size=blob_storage.size(names[digest]))
+                else:
+                    Blob.objects.filter(digest=digest).update(references=count)
+    return drifted
+
+
+def _stored_digests():
+    for root in ROOTS:
+        directory = os.path.join(root, BLOBS_DIRECTORY)
+        if not blob_storage.exists(directory):
+            continue
+        for prefix in os.listdir(blob_storage.path(directory)):
+            for digest in os.listdir(blob_storage.path(os.path.join(directory,
+                    prefix))):
+                yield digest, os.path.join(directory, prefix, digest)
+
+
+def collect(grace=3600, dry_run=False):
+    """Remove the contents without reference and those without blob, unless
+    they were written less than grace seconds ago. The rows of the file models
+    are counted again, so a content still used is kept whatever the references
+    stored in its blob (see recount).
+
+    Return a tuple (number of contents, number of bytes) removed.
+    """
+
+    limit = time.time() - grace
+    with transaction.atomic():
+        referenced = set(_references()[1]) | set(Blob.objects.filter(
+            references__gt=0).values_list('digest', flat=True))
+        collected = set()
+        size = 0
+        for digest, directory in _stored_digests():
+            path = blob_storage.path(directory)
+            if digest in referenced or os.path.getmtime(path) > limit:
+                continue
+            #Every name of a content is a hard link to the same file.
+            names = os.listdir(path)
+            if digest not in collected and names:
+                size += os.path.getsize(os.path.join(path, names[0]))
+            collected.add(digest)
+            if not dry_run:
+                shutil.rmtree(path)
+        if not dry_run:
+            Blob.objects.filter(digest__in=collected, references=0).delete()
+    return (len(collected), size)
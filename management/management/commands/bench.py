@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+import json
+from sportassociation.benchmark import (run, compare)
+
+
+class Command(BaseCommand):
+    help = 'Time the public views and key functions, write the results as \
+            JSON and compare them with the results of another commit.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5,
+            help='Number of measures of each view and function.')
+        parser.add_argument('--output', default=None,
+            help='JSON file to write the results to.')
+        parser.add_argument('--compare', default=None,
+            help='JSON file of previous results to compare with.')
+
+    def handle(self, *args, **options):
+        results = run(options['repeat'])
+        for kind in ('views', 'functions'):
+            for name, result in sorted(results[kind].items()):
+                self.stdout.write('%-40s %8.1f ms %6d queries %4d duplicates' % (
+                    name, result['median'] * 1000, result['queries'],
+                    result['duplicates']))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if options['compare']:
+            with open(options['compare']) as previous:
+                differences = compare(json.load(previous), results)
+            self.stdout.write('')
+            for kind, name, before, after, ratio, old_queries, new_queries in \
+                    differences:
+                self.stdout.write('%-40s %8.1f -> %8.1f ms (%s) %4d -> %4d '
+                    'queries' % (name, before * 1000, after * 1000,
+                    'x%.2f' % ratio if ratio is not None else '-', old_queries,
+                    new_queries))
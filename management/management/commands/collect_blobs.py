@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from management import blobs
+
+
+class Command(BaseCommand):
+    help = 'Remove the contents of the file models which are not referenced \
+            anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False,
+            help='Only report what would be removed or repaired.')
+        parser.add_argument('--grace', type=int, default=3600,
+            help='Keep the contents written less than GRACE seconds ago.')
+        parser.add_argument('--adopt', action='store_true', default=False,
+            help='First move the files stored before the content-addressed \
+                  storage into it.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['adopt']:
+            self.stdout.write('%s file(s) adopted.' % blobs.adopt(dry_run))
+        drifted = blobs.recount(dry_run)
+        for digest, references, count in drifted:
+            self.stdout.write('%s: %s reference(s) instead of %s.' % (digest,
+                count, references or 0))
+        self.stdout.write('%s blob(s) repaired.' % len(drifted))
+        number, size = blobs.collect(options['grace'], dry_run)
+        self.stdout.write('%s content(s) removed, %s bytes freed.' % (number,
+            size))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from management.models import Equipment
+
+
+class Command(BaseCommand):
+    help = 'Recompute the available stock of equipments from the lendings.'
+
+    def handle(self, *args, **options):
+        drifted = [equipment for equipment in Equipment.objects.all()
+            if equipment.reconcile()]
+        for equipment in drifted:
+            self.stdout.write('%s: %s available.' % (equipment,
+                equipment.available))
+        self.stdout.write('%s equipment(s) repaired.' % len(drifted))
@@ -0,0 +1,21 @@
+from django.core.management.base import (BaseCommand, CommandError)
+from sportassociation.benchmark import (seed, AlreadySeeded)
+
+
+class Command(BaseCommand):
+    help = 'Fill an empty database with the synthetic data of an association \
+            for the bench command.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1,
+            help='Multiplier of the volumes (1 for 10000 users).')
+        parser.add_argument('--seed', type=int, default=0,
+            help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        try:
+            counts = seed(options['scale'], options['seed'])
+        except AlreadySeeded:
+            raise CommandError('The database already holds synthetic data.')
+        for model, count in sorted(counts.items()):
+            self.stdout.write('%-30s %8d' % (model, count))
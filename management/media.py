@@ -0,0 +1,192 @@
+"""Serving of the protected media.
+
+Files stored under the directories of MEDIA_SCOPES are only served to users
+whose scope (see users.models.SCOPES) is at least the scope of the directory.
+The scope of a user costs one query, then is cached in the session for
+PROTECTED_MEDIA_SCOPE_TIMEOUT seconds so that a page showing many protected
+images does not check the memberships again for each of them.
+
+Once allowed, the transfer of the bytes is handed to the front server:
+    - 'nginx': an X-Accel-Redirect header to PROTECTED_MEDIA_INTERNAL_URL,
+        which has to be an internal location aliased to MEDIA_ROOT.
+    - 'sendfile': an X-Sendfile header with the path of the file, for Apache
+        (mod_xsendfile) and lighttpd.
+    - None: the file is streamed by Django, honouring single byte ranges.
+
+This exports:
+    - MEDIA_SCOPES: tuple of (directory, scope) of the protected directories,
+        most specific first.
+
+    - clean_name: return the normalized name of a media.
+    - required_scope: return the scope needed to read a media.
+    - user_scope: return the scope of the user of a request.
+    - serve: return the response transferring a media.
+"""
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from django.http import (Http404, HttpResponse, FileResponse,
+                         StreamingHttpResponse)
+from django.utils.http import urlquote
+from datetime import date
+import mimetypes
+import os
+import posixpath
+import re
+import time
+from sportassociation import settings
+from users.models import (CustomUser, SCOPE_REGISTERED, SCOPE_MEMBER,
+                        SCOPE_MANAGER, SCOPE_STAFF)
+
+MEDIA_SCOPES = (
+    ('admin/', SCOPE_STAFF),
+    ('protected/', SCOPE_REGISTERED),
+)
+
+#Scope of anonymous users, below every scope of SCOPES.
+SCOPE_ANONYMOUS = 0
+
+SESSION_KEY = '_media_scope'
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+#Compressed files are downloaded as they are stored, never decompressed by the
+#browser: they are sent with the type of their compression.
+COMPRESSED_TYPES = {
+    'bzip2': 'application/x-bzip2',
+    'gzip': 'application/gzip',
+    'xz': 'application/x-xz',
+}
+
+
+def clean_name(name):
+    """Return the normalized name of a media, raise Http404 if it leaves
+    MEDIA_ROOT.
+    """
+
+    name = posixpath.normpath(name).lstrip('/')
+    if name == '..' or name.startswith('../'):
+        raise Http404()
+    return name
+
+
+def required_scope(name):
+    """Return the scope needed to read the media name, None if it is public.
+    name has to be cleaned first (see clean_name).
+    """
+
+    for directory, scope in MEDIA_SCOPES:
+        if name.startswith(directory):
+            return scope
+    return None
+
+
+def _scope(user):
+    if not user.is_authenticated():
+        return SCOPE_ANONYMOUS
+    if user.is_staff:
+        return SCOPE_STAFF
+    custom_user = CustomUser.objects.filter(user=user).\
+        annotate(managed=Count('managed_sports')).\
+        values('membership_expiration', 'managed').first()
+    if custom_user is None:
+        return SCOPE_REGISTERED
+    if custom_user['managed']:
+        return SCOPE_MANAGER
+    expiration = custom_user['membership_expiration']
+    if expiration is not None and expiration >= date.today():
+        return SCOPE_MEMBER
+    return SCOPE_REGISTERED
+
+
+def user_scope(request):
+    """Return the scope of the user of request, cached in the session."""
+
+    cached = request.session.get(SESSION_KEY)
+    if cached is not None:
+        user_id, scope, expiration = cached
+        if user_id == request.user.pk and expiration > time.time():
+            return scope
+    scope = _scope(request.user)
+    if request.user.is_authenticated():
+        request.session[SESSION_KEY] = (request.user.pk, scope,
+            time.time() + settings.PROTECTED_MEDIA_SCOPE_TIMEOUT)
+    return scope
+
+
+def _ranged(path, size, header):
+    #Only a single range is honoured, other requests get the whole file.
+    match = RANGE_RE.match(header.strip())
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%s' % (size)
+        return response
+
+    def content():
+        with open(path, 'rb') as media:
+            media.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = media.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    response = StreamingHttpResponse(content(), status=206)
+    response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+def serve(request, name):
+    """Return the response transferring the media name, cleaned and whose
+    scope has been checked.
+    """
+
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation:
+        raise Http404()
+    if not os.path.isfile(path):
+        raise Http404()
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding:
+        content_type = COMPRESSED_TYPES.get(encoding)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.PROTECTED_MEDIA_SERVER == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        #nginx decodes the URI, names may hold spaces, % or non-ASCII
+        #characters.
+        response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_INTERNAL_URL + \
+            urlquote(name)
+    elif settings.PROTECTED_MEDIA_SERVER == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        size = os.path.getsize(path)
+        response = None
+        if 'HTTP_RANGE' in request.META:
+            response = _ranged(path, size, request.META['HTTP_RANGE'])
+        if response is None:
+            response = FileResponse(open(path, 'rb'))
+            response['Content-Length'] = size
+        if response.status_code != 416:
+            response['Content-Type'] = content_type
+        response['Accept-Ranges'] = 'bytes'
+        response['Last-Modified'] = time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+            time.gmtime(os.path.getmtime(path)))
+    #Browsers and proxies must not share protected media between users.
+    response['Cache-Control'] = 'private'
+    return response
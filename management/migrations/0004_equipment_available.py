@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_available(apps, schema_editor):
+    Equipment = apps.get_model('management', 'Equipment')
+    for equipment in Equipment.objects.all():
+        lent = equipment.lendings.filter(returned=False).\
+            aggregate(models.Sum('quantity'))['quantity__sum'] or 0
+        Equipment.objects.filter(pk=equipment.pk).\
+            update(available=equipment.quantity - lent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0003_auto_20151026_2012'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipment',
+            name='available',
+            field=models.SmallIntegerField(verbose_name='available quantity', default=0, editable=False),
+        ),
+        migrations.RunPython(fill_available, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import management.storage
+import management.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0004_equipment_available'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('creation_date', models.DateTimeField(verbose_name='creation date', auto_now_add=True)),
+                ('digest', models.CharField(verbose_name='digest', max_length=64, unique=True)),
+                ('references', models.PositiveIntegerField(verbose_name='references', default=0, editable=False)),
+                ('size', models.BigIntegerField(verbose_name='size')),
+            ],
+            options={
+                'verbose_name': 'blob',
+                'verbose_name_plural': 'blobs',
+                'ordering': ['-creation_date'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='adminfile',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.AdminFile.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+        migrations.AlterField(
+            model_name='adminimage',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.AdminImage.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+        migrations.AlterField(
+            model_name='protectedfile',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.ProtectedFile.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+        migrations.AlterField(
+            model_name='protectedimage',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.ProtectedImage.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+        migrations.AlterField(
+            model_name='publicfile',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.PublicFile.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+        migrations.AlterField(
+            model_name='publicimage',
+            name='file',
+            field=models.FileField(verbose_name='file', upload_to=management.models.PublicImage.custom_path, storage=management.storage.ContentAddressedStorage()),
+        ),
+    ]
@@ -24,8 +24,11 @@ This exports:
     - ProtectedImage: class representing a file accessible to register members.
     - AdminFile: class representing a file accessible to admin users (~ staff).
     - AdminImage: class representing a file accessible to admin users (~ staff).
+    - Blob: class representing a content stored once for the file models.
+    - FILE_MODELS: tuple of the file models stored by content.
+    - OutOfStock: exception raised when saving a lending exceeding the stock.
 """
-from django.db import models
+from django.db import (models, transaction, IntegrityError)
 from sorl.thumbnail import ImageField
 from django.core.exceptions import ValidationError
 from django.core.validators import (MaxValueValidator, MinValueValidator)
@@ -36,6 +39,7 @@ from django.contrib.contenttypes.models import ContentType
 from datetime import (timedelta, date)
 from users.models import CustomUser
 from treasury.models import CashRegister
+from management.storage import blob_storage
 
 
 class Weekday(object):
@@ -202,10 +206,22 @@ class Permanence(models.Model):
             self.get_weekday_display())
 
 
+class OutOfStock(IntegrityError):
+    """Raised when a lending is saved while the stock of its equipment was
+    taken since it was cleaned.
+    """
+    pass
+
+
 class Equipment(models.Model):
     """Model representing an equipment.
 
+    The stock currently available is stored in available and updated in the
+    same transaction as the lendings, so checking the stock reads a single row.
+
     Attributes:
+        - available: integer representing the quantity not currently lent.
+            Maintained by Lending, it cannot be edited.
         - description: string storing the description of the equipment. Can be
             None.
         - name: string storing the name of the equipment.
@@ -215,8 +231,14 @@ class Equipment(models.Model):
         - lendings: several lendings associated to this equipment.
 
     Ordering by ASCending name.
+
+    Methods:
+        - availability: return the quantity which can be lent between two dates.
+        - reconcile: recompute available from the lendings.
     """
 
+    available = models.SmallIntegerField(_('available quantity'), default=0,
+                    editable=False)
     description = models.TextField(_('description'), blank=True)
     name = models.CharField(_('name'), max_length=30, db_index=True)
     quantity = models.PositiveSmallIntegerField(_('quantity'), validators=[MinValueValidator(1),])
@@ -226,6 +248,59 @@ class Equipment(models.Model):
         verbose_name_plural = _('equipments')
         ordering = ['name']
 
+    def save(self, *args, **kwargs):
+        #An equipment created with an explicit pk is new too.
+        if self._state.adding:
+            self.available = self.quantity
+            return super(Equipment, self).save(*args, **kwargs)
+        with transaction.atomic():
+            #Apply the change of quantity to the stock without overwriting the
+            #lendings saved since this instance was read.
+            Equipment.objects.filter(pk=self.pk).update(available=\
+                models.F('available') + self.quantity - models.F('quantity'))
+            kwargs.setdefault('update_fields', [field.name for field in \
+                self._meta.concrete_fields if not field.primary_key and \
+                field.name != 'available'])
+            super(Equipment, self).save(*args, **kwargs)
+            self.available = Equipment.objects.filter(pk=self.pk).\
+                values_list('available', flat=True).get()
+
+    def availability(self, start_date, end_date):
+        """Return the quantity which can be lent from start_date to end_date.
+
+        Lendings not returned yet are considered lent until today at least.
+        """
+
+        today = date.today()
+        events = []
+        for start, end, quantity in self.lendings.filter(returned=False,
+                start_date__lte=end_date).values_list('start_date', 'end_date',
+                'quantity'):
+            end = max(end, today)
+            if end < start_date:
+                continue
+            events.append((max(start, start_date), quantity))
+            events.append((end + timedelta(1), -quantity))
+        #Sweep the lendings by date, returns coming before departures.
+        lent = peak = 0
+        for day, quantity in sorted(events):
+            lent += quantity
+            peak = max(peak, lent)
+        return self.quantity - peak
+
+    def reconcile(self):
+        """Recompute available from the lendings, return True if it drifted."""
+
+        with transaction.atomic():
+            equipment = Equipment.objects.select_for_update().get(pk=self.pk)
+            lent = equipment.lendings.filter(returned=False).\
+                aggregate(models.Sum('quantity'))['quantity__sum'] or 0
+            self.available = equipment.quantity - lent
+            if self.available == equipment.available:
+                return False
+            Equipment.objects.filter(pk=self.pk).update(available=self.available)
+            return True
+
     def __str__(self):
         return '%s' % (self.name)
 
@@ -235,6 +310,11 @@ class Lending(models.Model):
 
     A lending is accepted only to registered users.
 
+    Saving a lending takes the lent quantity from the available stock of the
+    equipment with a conditional UPDATE, so concurrent lendings cannot overbook
+    it: OutOfStock is raised if the stock checked by clean() was taken in the
+    meantime. Returning or deleting the lending gives the quantity back.
+
     Attributes:
         - deposit: integer representing the value of the deposit for this lending.
         - end_date: date of the supposed end of the lending.
@@ -267,20 +347,41 @@ class Lending(models.Model):
         verbose_name_plural = _('lendings')
         ordering = ['-start_date']
 
+    def _lent(self):
+        #Quantity of equipment currently taken by the saved version of self.
+        if self._state.adding:
+            return {}
+        previous = Lending.objects.filter(pk=self.pk, returned=False).\
+            values_list('equipment', 'quantity').first()
+        return dict([previous]) if previous else {}
+
     def clean(self):
         if self.start_date >= self.end_date:
             raise ValidationError(_('Start date cannot be after end date.'))
-        number_current_lendings = Lending.objects.filter(equipment=self.equipment,\
-                                    returned=False).exclude(id__exact=self.id)\
-                                    .aggregate(models.Sum('quantity'))\
-                                    ['quantity__sum']
-        if (number_current_lendings is not None and\
-                number_current_lendings >= self.equipment.\
-                quantity - self.quantity) or (number_current_lendings is None and\
-                self.quantity > self.equipment.quantity):
+        if self.returned or self.equipment_id is None:
+            return
+        available = Equipment.objects.filter(pk=self.equipment_id).\
+            values_list('available', flat=True).get()
+        if self.quantity > available + self._lent().get(self.equipment_id, 0):
             raise ValidationError(_('Lending impossible, not enough equipment \
                                     in stock.'))
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if not self._state.adding:
+                #Lock the saved lending so it is given back only once.
+                list(Lending.objects.select_for_update().filter(pk=self.pk))
+            for equipment, quantity in self._lent().items():
+                Equipment.objects.filter(pk=equipment).update(available=\
+                    models.F('available') + quantity)
+            if not self.returned and Equipment.objects.filter(\
+                    pk=self.equipment_id, available__gte=self.quantity).\
+                    update(available=models.F('available') - self.quantity) != 1:
+                #clean() checked the stock: it was taken in the meantime.
+                raise OutOfStock(_('Lending impossible, not enough equipment \
+                                    in stock.'))
+            super(Lending, self).save(*args, **kwargs)
+
     def __str__(self):
         return '%s (%s)' % (self.borrower.user.get_full_name(),
             str(self.equipment))
@@ -426,6 +527,9 @@ class Membership(models.Model):
 # TODO: Migrate to generic many-to-many relation?
 # http://stackoverflow.com/questions/933092/generic-many-to-many-relationships
 
+#The file models below are stored by content (see management.storage): custom_path
+#only gives the root directory (public, protected or admin) and the file name.
+
 class PublicFile(models.Model):
     """File accesible to unregistered users.
 
@@ -449,7 +553,8 @@ class PublicFile(models.Model):
         return 'public/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -481,7 +586,8 @@ class PublicImage(models.Model):
         return 'public/images/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -519,7 +625,8 @@ class ProtectedFile(models.Model):
         return 'protected/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -560,7 +667,8 @@ class ProtectedImage(models.Model):
         return 'protected/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -598,7 +706,8 @@ class AdminFile(models.Model):
         return 'admin/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -630,7 +739,8 @@ class AdminImage(models.Model):
         return 'admin/%s%s' % (directory, filename)
 
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
-    file = models.FileField(_('file'), upload_to=custom_path)
+    file = models.FileField(_('file'), upload_to=custom_path,
+                storage=blob_storage)
 
     content_type = models.ForeignKey(ContentType, verbose_name=_('content type'))
     object_id = models.PositiveIntegerField(verbose_name=_('object id'))
@@ -640,3 +750,39 @@ class AdminImage(models.Model):
         verbose_name = _('admin image')
         verbose_name_plural = _('admin images')
         ordering = ['-creation_date']
+
+
+FILE_MODELS = (PublicFile, PublicImage, ProtectedFile, ProtectedImage, AdminFile,
+                AdminImage)
+
+
+class Blob(models.Model):
+    """Model representing a content stored once for the file models.
+
+    The content is stored as [root]/blobs/[xx]/[digest]/[filename], every name
+    holding it being a hard link to the same file (see management.storage).
+
+    Attributes:
+        - creation_date: datetime of the creation of the blob. Not editable.
+        - digest: string storing the SHA-256 of the content. Unique.
+        - references: integer storing the number of file models (see
+            FILE_MODELS) linking to the content. Not editable, kept up to date
+            by signals.
+        - size: integer storing the size of the content in bytes.
+
+    Ordering by DESCending creation_date.
+    """
+
+    creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
+    digest = models.CharField(_('digest'), max_length=64, unique=True)
+    references = models.PositiveIntegerField(_('references'), default=0,
+                    editable=False)
+    size = models.BigIntegerField(_('size'))
+
+    class Meta:
+        verbose_name = _('blob')
+        verbose_name_plural = _('blobs')
+        ordering = ['-creation_date']
+
+    def __str__(self):
+        return '%s (%s)' % (self.digest, self.references)
@@ -0,0 +1,59 @@
+"""Receivers keeping the available stock of equipments and the references of
+blobs in sync and generating the thumbnails of protected images.
+"""
+from django.db.models import F
+from django.db.models.signals import (post_init, post_save, post_delete)
+from django.dispatch import receiver
+from management.models import (Equipment, Lending, ProtectedImage, Blob,
+                                FILE_MODELS)
+from management.storage import (blob_storage, digest_of)
+from sportassociation import thumbnails
+
+
+@receiver(post_delete, sender=Lending)
+def give_back_lending(sender, instance, **kwargs):
+    if not instance.returned:
+        Equipment.objects.filter(pk=instance.equipment_id).\
+            update(available=F('available') + instance.quantity)
+
+
+@receiver(post_save, sender=ProtectedImage)
+def pregenerate_image(sender, instance, **kwargs):
+    thumbnails.pregenerate(instance)
+
+
+def _count(name, references):
+    digest = digest_of(name)
+    if digest is None:
+        return
+    if references > 0:
+        Blob.objects.get_or_create(digest=digest,
+            defaults={'size': blob_storage.size(name)})
+        Blob.objects.filter(digest=digest).\
+            update(references=F('references') + references)
+    else:
+        Blob.objects.filter(digest=digest, references__gt=0).\
+            update(references=F('references') + references)
+
+
+def remember_blob(sender, instance, **kwargs):
+    instance._blob_name = instance.file.name
+
+
+def link_blob(sender, instance, created, **kwargs):
+    #A row created with the name of a stored content references it as well.
+    if created:
+        _count(instance.file.name, 1)
+    elif instance.file.name != instance._blob_name:
+        _count(instance.file.name, 1)
+        _count(instance._blob_name, -1)
+    instance._blob_name = instance.file.name
+
+
+def unlink_blob(sender, instance, **kwargs):
+    _count(instance.file.name, -1)
+
+for model in FILE_MODELS:
+    post_init.connect(remember_blob, sender=model)
+    post_save.connect(link_blob, sender=model)
+    post_delete.connect(unlink_blob, sender=model)
@@ -0,0 +1,120 @@
+"""Content-addressed storage of the generic file models.
+
+An upload is hashed (SHA-256) while it is streamed to a temporary file, then
+stored as [root]/blobs/[xx]/[digest]/[filename] where root is the first
+directory given by custom_path (public, protected or admin, which keeps the
+permissions of management.media) and xx the first characters of the digest.
+
+The content of a digest is written once: an upload whose content is already
+stored, under any root or name, becomes a hard link to the stored file. The
+links from the generic models to each content are counted by Blob (see
+signals) and unreferenced contents are removed by the collect_blobs command.
+
+This exports:
+    - BLOBS_DIRECTORY: name of the directory of the contents in each root.
+    - ROOTS: tuple of the roots of the generic file models.
+
+    - digest_of: return the digest of a stored name, None if not in blobs.
+    - ContentAddressedStorage: class of the storage.
+    - blob_storage: lazy instance of ContentAddressedStorage used by the
+        models.
+"""
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import (LazyObject, empty)
+import errno
+import hashlib
+import os
+import tempfile
+
+BLOBS_DIRECTORY = 'blobs'
+ROOTS = ('public', 'protected', 'admin')
+
+#Temporary files are written in MEDIA_ROOT, hence on the same filesystem.
+TEMPORARY_DIRECTORY = '.blobs-tmp'
+
+
+def digest_of(name):
+    """Return the digest of the content stored as name, None if name is not
+    stored in a blobs directory.
+    """
+
+    parts = (name or '').split('/')
+    if len(parts) == 5 and parts[1] == BLOBS_DIRECTORY:
+        return parts[3]
+    return None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage writing each distinct content once.
+
+    Methods:
+        - content_directories: return the directories of a digest in every
+            root.
+    """
+
+    def content_directories(self, digest):
+        return [os.path.join(root, BLOBS_DIRECTORY, digest[:2], digest)
+            for root in ROOTS]
+
+    def get_available_name(self, name, max_length=None):
+        #Names depend on the content, a name in use holds the same content.
+        return name
+
+    def _link(self, digest, target):
+        #Hard link target to a file holding the content of digest, if any.
+        for directory in self.content_directories(digest):
+            if not self.exists(directory):
+                continue
+            for filename in os.listdir(self.path(directory)):
+                try:
+                    os.link(self.path(os.path.join(directory, filename)),
+                        self.path(target))
+                    return True
+                except OSError as error:
+                    if error.errno == errno.EEXIST:
+                        return True
+        return False
+
+    def _save(self, name, content):
+        root, filename = name.split('/', 1)[0], os.path.basename(name)
+        temporary_directory = self.path(TEMPORARY_DIRECTORY)
+        os.makedirs(temporary_directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=temporary_directory)
+        sha = hashlib.sha256()
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in content.chunks():
+                    sha.update(chunk)
+                    output.write(chunk)
+            digest = sha.hexdigest()
+            directory = os.path.join(root, BLOBS_DIRECTORY, digest[:2], digest)
+            stored = os.path.join(directory, filename)
+            os.makedirs(self.path(directory), exist_ok=True)
+            #Reused contents are not collected during the grace period.
+            os.utime(self.path(directory))
+            if not self.exists(stored) and not self._link(digest, stored):
+                os.rename(temporary, self.path(stored))
+                if self.file_permissions_mode is not None:
+                    os.chmod(self.path(stored), self.file_permissions_mode)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return stored.replace('\\', '/')
+
+
+class BlobStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = ContentAddressedStorage()
+
+blob_storage = BlobStorage()
+
+
+@receiver(setting_changed)
+def reset_blob_storage(setting, **kwargs):
+    #Same as the default storage when MEDIA_ROOT is overridden.
+    if setting in ('MEDIA_ROOT', 'MEDIA_URL'):
+        blob_storage._wrapped = empty
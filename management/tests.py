@@ -1,3 +1,263 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from datetime import (date, timedelta)
+from io import StringIO
+from unittest import mock
+import os
+import shutil
+import tempfile
+from management import blobs
+from activities.models import Item
+from management.models import (Equipment, Lending, OutOfStock, Blob, PublicFile,
+                                ProtectedFile, AdminFile, Membership)
+from sportassociation import (benchmark, settings)
+from users.models import CustomUser
 
-#  Create your tests here.
+
+class EquipmentStockTest(TestCase):
+
+    def setUp(self):
+        self.borrower = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        self.equipment = Equipment.objects.create(name='Raquette', quantity=5)
+
+    def lend(self, quantity, start=0, end=7):
+        return Lending.objects.create(borrower=self.borrower,
+            equipment=self.equipment, quantity=quantity, deposit=10,
+            start_date=date.today() + timedelta(start),
+            end_date=date.today() + timedelta(end))
+
+    def available(self):
+        return Equipment.objects.get(pk=self.equipment.pk).available
+
+    def test_lendings_update_available_stock(self):
+        lending = self.lend(3)
+        self.assertEqual(self.available(), 2)
+        with self.assertRaises(OutOfStock):
+            self.lend(3)
+        self.assertEqual(self.available(), 2)
+        with self.assertRaises(ValidationError):
+            Lending(borrower=self.borrower, equipment=self.equipment,
+                quantity=3, deposit=10, start_date=date.today(),
+                end_date=date.today() + timedelta(7)).clean()
+        lending.returned = True
+        lending.save()
+        self.assertEqual(self.available(), 5)
+        self.lend(5).delete()
+        self.assertEqual(self.available(), 5)
+
+    def test_quantity_change_keeps_lendings(self):
+        self.lend(2)
+        self.equipment.quantity = 4
+        self.equipment.save()
+        self.assertEqual(self.equipment.available, 2)
+
+    def test_equipment_created_with_pk(self):
+        equipment = Equipment(pk=42, name='Volant', quantity=3)
+        equipment.save()
+        self.assertEqual(Equipment.objects.get(pk=42).available, 3)
+
+    def test_availability_between_dates(self):
+        self.lend(2, 10, 15)
+        self.lend(2, 14, 20)
+        self.assertEqual(self.equipment.availability(date.today() +
+            timedelta(12), date.today() + timedelta(14)), 1)
+        self.assertEqual(self.equipment.availability(date.today() +
+            timedelta(16), date.today() + timedelta(30)), 3)
+
+    def test_reconcile_command(self):
+        self.lend(2)
+        Equipment.objects.update(available=5)
+        output = StringIO()
+        call_command('reconcile_stock', stdout=output)
+        self.assertIn('1 equipment(s) repaired', output.getvalue())
+        self.assertEqual(self.available(), 3)
+
+
+class ProtectedMediaTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.media_root = self.settings(MEDIA_ROOT=self.media)
+        self.media_root.enable()
+        default_storage.save('protected/files/rules.txt',
+            ContentFile(b'0123456789'))
+        default_storage.save('admin/finances/bill.txt', ContentFile(b'bill'))
+        self.user = User.objects.create_user('jdoe', 'jdoe@example.com', 'pwd')
+        CustomUser.objects.create(user=self.user,
+            id_photo='protected/users/jdoe.jpg')
+
+    def tearDown(self):
+        self.media_root.disable()
+        shutil.rmtree(self.media)
+
+    def test_anonymous_users_are_redirected(self):
+        response = self.client.get('/media/protected/files/rules.txt')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+
+    def test_scope_is_checked(self):
+        self.client.login(username='jdoe', password='pwd')
+        response = self.client.get('/media/protected/files/rules.txt')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Cache-Control'], 'private')
+        response = self.client.get('/media/admin/finances/bill.txt')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(\
+            '/media/protected/../admin/finances/bill.txt').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.logout()
+        self.client.login(username='jdoe', password='pwd')
+        response = self.client.get('/media/admin/finances/bill.txt')
+        self.assertEqual(b''.join(response.streaming_content), b'bill')
+
+    def test_scope_is_cached_in_session(self):
+        self.client.login(username='jdoe', password='pwd')
+        self.client.get('/media/protected/files/rules.txt')
+        #Session, user and the update of the session.
+        with self.assertNumQueries(2):
+            self.client.get('/media/protected/files/rules.txt')
+
+    def test_compressed_files_are_not_decoded(self):
+        default_storage.save('protected/files/results.csv.gz',
+            ContentFile(b'\x1f\x8b'))
+        self.client.login(username='jdoe', password='pwd')
+        response = self.client.get('/media/protected/files/results.csv.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_ranges(self):
+        self.client.login(username='jdoe', password='pwd')
+        response = self.client.get('/media/protected/files/rules.txt',
+            HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response = self.client.get('/media/protected/files/rules.txt',
+            HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get('/media/protected/files/rules.txt',
+            HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_front_server_headers(self):
+        self.client.login(username='jdoe', password='pwd')
+        with mock.patch.object(settings, 'PROTECTED_MEDIA_SERVER', 'nginx'):
+            response = self.client.get('/media/protected/files/rules.txt')
+        self.assertEqual(response['X-Accel-Redirect'],
+            '/internal-media/protected/files/rules.txt')
+        self.assertEqual(response.content, b'')
+        name = default_storage.save('protected/files/rules 100%.txt',
+            ContentFile(b'rules'))
+        with mock.patch.object(settings, 'PROTECTED_MEDIA_SERVER', 'nginx'):
+            response = self.client.get(default_storage.url(name))
+        self.assertEqual(response['X-Accel-Redirect'],
+            '/internal-media/protected/files/rules%20100%25.txt')
+        with mock.patch.object(settings, 'PROTECTED_MEDIA_SERVER', 'sendfile'):
+            response = self.client.get('/media/protected/files/rules.txt')
+        self.assertEqual(response['X-Sendfile'],
+            default_storage.path('protected/files/rules.txt'))
+
+
+class BlobTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.media_root = self.settings(MEDIA_ROOT=self.media)
+        self.media_root.enable()
+        self.attached = {'content_type': ContentType.objects.\
+            get_for_model(Equipment), 'object_id': 1}
+
+    def tearDown(self):
+        self.media_root.disable()
+        shutil.rmtree(self.media)
+
+    def upload(self, model, name, content=b'poster'):
+        attached = model(**self.attached)
+        attached.file.save(name, ContentFile(content))
+        return attached
+
+    def test_contents_are_stored_once(self):
+        public = self.upload(PublicFile, 'poster.pdf')
+        protected = self.upload(ProtectedFile, 'affiche.pdf')
+        self.assertTrue(public.file.name.startswith('public/blobs/'))
+        self.assertTrue(protected.file.name.startswith('protected/blobs/'))
+        self.assertTrue(protected.file.name.endswith('/affiche.pdf'))
+        self.assertEqual(os.stat(public.file.path).st_ino,
+            os.stat(protected.file.path).st_ino)
+        self.assertEqual(Blob.objects.get().references, 2)
+
+        self.upload(PublicFile, 'other.pdf', b'other')
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_collect_unreferenced_contents(self):
+        public = self.upload(PublicFile, 'poster.pdf')
+        protected = self.upload(ProtectedFile, 'poster.pdf')
+        public.delete()
+        self.assertEqual(blobs.collect(grace=0), (0, 0))
+        protected.delete()
+        self.assertEqual(Blob.objects.get().references, 0)
+        self.assertEqual(blobs.collect(grace=3600), (0, 0))
+        self.assertEqual(blobs.collect(grace=0), (1, 6))
+        self.assertFalse(os.path.exists(protected.file.path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_row_created_with_a_stored_name(self):
+        public = self.upload(PublicFile, 'poster.pdf')
+        copy = PublicFile.objects.create(file=public.file.name, **self.attached)
+        self.assertEqual(Blob.objects.get().references, 2)
+        public.delete()
+        self.assertEqual(blobs.collect(grace=0), (0, 0))
+        self.assertTrue(os.path.exists(copy.file.path))
+        #A drifted counter does not remove a content in use either.
+        Blob.objects.update(references=0)
+        self.assertEqual(blobs.collect(grace=0), (0, 0))
+        self.assertTrue(os.path.exists(copy.file.path))
+
+    def test_recount_and_adopt(self):
+        self.upload(AdminFile, 'bill.pdf', b'bill')
+        Blob.objects.update(references=5)
+        default_storage.save('admin/finances/1/old.pdf', ContentFile(b'bill'))
+        AdminFile.objects.create(file='admin/finances/1/old.pdf',
+            **self.attached)
+
+        output = StringIO()
+        call_command('collect_blobs', adopt=True, stdout=output)
+        self.assertIn('1 file(s) adopted.', output.getvalue())
+        self.assertIn('1 blob(s) repaired.', output.getvalue())
+        self.assertEqual(Blob.objects.get().references, 2)
+        self.assertFalse(default_storage.exists('admin/finances/1/old.pdf'))
+        self.assertEqual(AdminFile.objects.filter(file__contains='/blobs/').\
+            count(), 2)
+
+
+class BenchmarkTest(TestCase):
+
+    def test_seed_and_run(self):
+        counts = benchmark.seed(scale=0.01)
+        self.assertEqual(counts['users.CustomUser'], 100)
+        self.assertEqual(counts['activities.Participant'], 40)
+        #Denormalized fields are filled although bulk_create sends no signal.
+        self.assertEqual(CustomUser.objects.members().count(),
+            Membership.objects.filter(expiration_date__gte=date.today()).\
+            values('member').distinct().count())
+        self.assertEqual(sum(Item.objects.values_list('bought_items',
+            flat=True)), 40)
+        with self.assertRaises(benchmark.AlreadySeeded):
+            benchmark.seed(scale=0.01)
+
+        results = benchmark.run(repeat=1)
+        self.assertEqual(set(result['status'] for result in \
+            results['views'].values()), {200})
+        self.assertEqual(results['views']['home (cached)']['queries'], 0)
+        differences = benchmark.compare(results, results)
+        self.assertEqual(len(differences), len(results['views']) +
+            len(results['functions']))
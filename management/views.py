@@ -1,3 +1,20 @@
-from django.shortcuts import render
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.views.generic import View
+from management import media
 
-#  Create your views here.
+
+class ProtectedMediaView(View):
+    """Serve the media of protected directories to users with the required
+    scope (see management.media).
+    """
+
+    def get(self, request, path):
+        #protected/../admin/ is checked as admin/.
+        path = media.clean_name(path)
+        scope = media.required_scope(path)
+        if scope is not None and media.user_scope(request) < scope:
+            if not request.user.is_authenticated():
+                return redirect_to_login(request.get_full_path())
+            raise PermissionDenied
+        return media.serve(request, path)
@@ -0,0 +1,340 @@
+"""Reproducible benchmark of the site.
+
+seed fills an empty database with the synthetic data of an association whose
+volumes are those of VOLUMES multiplied by a scale: users with their
+memberships, sports with their sessions and matches, years of articles and
+weekmails, and activities with their parameters, items and participants. Rows
+are written with bulk_create in batches of BATCH_SIZE, and the denormalized
+fields signals would have kept up to date (expiration of the memberships,
+bought items, ledger, search entries) are filled afterwards. Values are drawn
+from a seeded generator, so the same scale and seed give the same data.
+
+run times the public views with the test client and key functions, repeating
+each measure, and returns results which can be dumped as JSON and compared
+between commits with compare.
+
+This exports:
+    - VOLUMES: dict of the number of rows of each kind at scale 1.
+    - BATCH_SIZE: number of rows written by each bulk_create.
+    - SEED_PREFIX: prefix of the usernames of the synthetic users.
+
+    - seed: fill the database with synthetic data.
+    - run: time the views and functions.
+    - compare: return the differences between two results.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import (connection, transaction)
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from datetime import (date, time, timedelta)
+from decimal import Decimal
+import random
+import statistics
+from activities.models import (Activity, Parameter, Item, Participant)
+from communication import search
+from communication.models import (Article, Weekmail, Paragraph)
+from communication.news import news_page
+from management.models import (Location, MembershipType, Membership, CASH,
+                                CHEQUE)
+from sports.models import (Sport, Session, Match)
+from sportassociation import settings
+from sportassociation.instrumentation import measure
+from treasury import (ledger, reports)
+from treasury.models import CashRegister
+from users.models import CustomUser
+
+VOLUMES = {
+    'users': 10000,
+    'sports': 100,
+    'sessions_per_sport': 3,
+    'matches_per_sport': 10,
+    'years': 5,
+    'activities': 200,
+    'participants_per_activity': 20,
+}
+
+BATCH_SIZE = 500
+
+SEED_PREFIX = 'seed-'
+
+WORDS = ('match', 'tournoi', 'entraînement', 'sortie', 'gala', 'course',
+    'équipe', 'victoire', 'saison', 'piscine', 'gymnase', 'ski', 'rugby',
+    'basket', 'escalade', 'inscription', 'week-end', 'soirée', 'finale',
+    'championnat')
+
+
+class AlreadySeeded(Exception):
+    pass
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for index in range(words))
+
+
+def _scaled(name, scale):
+    return max(1, int(VOLUMES[name] * scale))
+
+
+def _create(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def _seed_users(rng, scale, today, cash_registers):
+    number = _scaled('users', scale)
+    _create(User, [User(username='%s%s' % (SEED_PREFIX, index),
+        first_name=rng.choice(('Camille', 'Louis', 'Emma', 'Hugo', 'Léa')),
+        last_name='Seed %s' % (index), email='%s%s@example.com' % (SEED_PREFIX,
+        index)) for index in range(number)])
+    membership_types = [MembershipType.objects.create(title=title,
+        description='', semester_fee=Decimal(semester), year_fee=Decimal(year))
+        for title, semester, year in (('Étudiant', '20', '35'),
+        ('Extérieur', '40', '70'))]
+
+    #Up to 3 yearly memberships per user, the last one possibly expired.
+    histories = [[today + timedelta(days=rng.randint(-400, 300) - 365 * year)
+        for year in range(rng.randint(0, 3))] for index in range(number)]
+    users = User.objects.filter(username__startswith=SEED_PREFIX).\
+        order_by('pk')
+    _create(CustomUser, [CustomUser(user=user, id_photo='protected/users/seed.jpg',
+        gender=rng.choice('MF'), birthdate=today - timedelta(days=rng.randint(
+        18 * 365, 30 * 365)), membership_expiration=max(history, default=None))
+        for user, history in zip(users.iterator(), histories)])
+    members = list(CustomUser.objects.filter(user__username__startswith=\
+        SEED_PREFIX).order_by('user').values_list('pk', flat=True))
+    _create(Membership, [Membership(member_id=member, expiration_date=expiration,
+        certificate_date=expiration - timedelta(weeks=40),
+        membership_copy='admin/memberships/seed.jpg',
+        payment_mean=rng.choice((CASH, CHEQUE)), cheque_bank='Banque',
+        membership_type=rng.choice(membership_types),
+        cash_register=rng.choice(cash_registers))
+        for member, history in zip(members, histories)
+        for expiration in history])
+    return members
+
+
+def _seed_sports(rng, scale, today, members, locations):
+    Sport.objects.bulk_create([Sport(name='Sport %s' % (index),
+        slug='sport-%s' % (index), description=_text(rng, 30))
+        for index in range(_scaled('sports', scale))])
+    sports = list(Sport.objects.filter(slug__startswith='sport-').\
+        values_list('pk', flat=True))
+    managers = rng.sample(members, min(len(members), 2 * len(sports)))
+    through = Sport.managers.through
+    _create(through, [through(sport_id=sport, customuser_id=manager)
+        for sport, manager in zip(sports * 2, managers)])
+    #Every user practices one or two sports.
+    through = Sport.participants.through
+    _create(through, [through(sport_id=sport, customuser_id=member)
+        for member in members
+        for sport in rng.sample(sports, min(len(sports), rng.randint(1, 2)))])
+    through = Sport.competitors.through
+    _create(through, [through(sport_id=rng.choice(sports), customuser_id=member)
+        for member in members[::5]])
+
+    _create(Session, [Session(sport_id=sport, weekday=rng.randint(0, 6),
+        start_time=time(rng.randint(8, 20)), end_time=time(21, 30),
+        location=rng.choice(locations), manager_id=rng.choice(managers))
+        for sport in sports for index in range(VOLUMES['sessions_per_sport'])])
+    now = timezone.now()
+    _create(Match, [Match(sport_id=sport, name='Match %s' % (index),
+        description=_text(rng, 20), opponent='Équipe %s' % rng.randint(1, 50),
+        location=rng.choice(locations),
+        date=now + timedelta(days=rng.randint(-365, 60), hours=rng.randint(0, 12)))
+        for sport in sports for index in range(VOLUMES['matches_per_sport'])])
+    return sports
+
+
+def _seed_news(rng, scale, now):
+    #Two articles and one weekmail per week.
+    weeks = max(1, int(52 * VOLUMES['years'] * scale))
+    _create(Article, [Article(title='Article %s' % (index), slug='article',
+        summary=_text(rng, 12), content='<p>%s</p>' % _text(rng, 150),
+        is_frontpage=index < 3,
+        publication_date=now - timedelta(days=3.5 * index + 1))
+        for index in range(2 * weeks)])
+    _create(Weekmail, [Weekmail(subject='Weekmail %s' % (index),
+        introduction=_text(rng, 40), conclusion=_text(rng, 20),
+        sent_date=now - timedelta(weeks=index, days=1))
+        for index in range(weeks)])
+    _create(Paragraph, [Paragraph(weekmail_id=weekmail, index=index,
+        title=_text(rng, 3)[:50], content='<p>%s</p>' % _text(rng, 80))
+        for weekmail in Weekmail.objects.values_list('pk', flat=True)
+        for index in range(rng.randint(3, 6))])
+
+
+def _seed_activities(rng, scale, now, members, locations, cash_registers):
+    number = _scaled('activities', scale)
+    _create(Activity, [Activity(title='Activité %s' % (index),
+        slug='activite', summary=_text(rng, 12),
+        content='<p>%s</p>' % _text(rng, 120), location=rng.choice(locations),
+        is_big_activity=index % 10 == 0, is_frontpage=index < 2,
+        start_date=now + timedelta(days=30 - 7 * index),
+        end_date=now + timedelta(days=31 - 7 * index),
+        publication_date=now - timedelta(days=7 * index + 1))
+        for index in range(number)])
+    activities = list(Activity.objects.values_list('pk', flat=True))
+    _create(Parameter, [Parameter(activity_id=activity, name=name,
+        is_published=True, is_mandatory=name == 'Transport')
+        for activity in activities for name in ('Transport', 'Hébergement')])
+
+    parameters = list(Parameter.objects.values_list('pk', 'activity_id'))
+    _create(Item, [Item(parameter_id=parameter, name='Option %s' % (index),
+        default_price=Decimal(rng.randint(10, 60)),
+        member_price=Decimal(rng.randint(5, 40)), max_bought_items=None)
+        for parameter, activity in parameters for index in range(3)])
+
+    items = {}
+    for item, parameter, activity in Item.objects.values_list('pk',
+            'parameter', 'parameter__activity'):
+        items.setdefault(activity, []).append((item, parameter))
+    participants = [(rng.choice(items[activity]), rng.choice(members))
+        for activity in activities
+        for index in range(VOLUMES['participants_per_activity'])]
+    _create(Participant, [Participant(item_id=item, registered_user_id=member,
+        payment_mean=CASH, cash_register=rng.choice(cash_registers))
+        for (item, parameter), member in participants])
+    #bulk_create sends no signal, fill the bought items by hand.
+    bought = {}
+    for (item, parameter), member in participants:
+        bought[(Item, item)] = bought.get((Item, item), 0) + 1
+        bought[(Parameter, parameter)] = bought.get((Parameter, parameter), 0) + 1
+    for (model, pk), count in bought.items():
+        model.objects.filter(pk=pk).update(bought_items=count)
+
+
+def seed(scale=1, seed=0):
+    """Fill the database with synthetic data at scale and return a dict of
+    the number of rows of each model.
+
+    Raise AlreadySeeded if synthetic users are already there.
+    """
+
+    if User.objects.filter(username__startswith=SEED_PREFIX).exists():
+        raise AlreadySeeded()
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = date.today()
+    with transaction.atomic():
+        locations = [Location.objects.create(name='Gymnase %s' % (index),
+            city='Belfort') for index in range(10)]
+        cash_registers = [CashRegister.objects.create(name=name)
+            for name in ('Caisse', 'Banque')]
+        members = _seed_users(rng, scale, today, cash_registers)
+        _seed_sports(rng, scale, today, members, locations)
+        _seed_news(rng, scale, now)
+        _seed_activities(rng, scale, now, members, locations, cash_registers)
+        ledger.reconcile()
+        search.rebuild()
+    cache.clear()
+    return dict(('%s.%s' % (model._meta.app_label, model._meta.object_name),
+        model.objects.count()) for model in
+        (CustomUser, Membership, Sport, Session, Match, Article, Weekmail,
+        Paragraph, Activity, Parameter, Item, Participant))
+
+
+def _statistics(durations):
+    return {'min': min(durations), 'median': statistics.median(durations),
+        'mean': statistics.mean(durations)}
+
+
+def _time_view(client, url, repeat, cold=False):
+    durations = []
+    for index in range(repeat):
+        if cold:
+            cache.clear()
+        response = client.get(url)
+        durations.append(response.measures.duration)
+    measures = response.measures
+    result = {'url': url, 'status': response.status_code,
+        'queries': measures.query_count, 'duplicates': measures.duplicates,
+        'db': measures.db_duration}
+    result.update(_statistics(durations))
+    return result
+
+
+def _time_function(function, repeat):
+    durations = []
+    for index in range(repeat):
+        with measure() as measures:
+            function()
+        durations.append(measures[0].duration)
+    result = {'queries': measures[0].query_count,
+        'duplicates': measures[0].duplicates, 'db': measures[0].db_duration}
+    result.update(_statistics(durations))
+    return result
+
+
+def _views():
+    sport = Sport.objects.order_by('pk').first()
+    activity = Activity.objects.exclude(publication_date=None).\
+        order_by('-publication_date').first()
+    article = Article.objects.exclude(publication_date=None).\
+        order_by('-publication_date').first()
+    views = [('home', reverse('home'), True), ('home (cached)', reverse('home'),
+        False)]
+    views += [(name, reverse(name), False) for name in ('communication:news',
+        'communication:articles', 'communication:weekmails',
+        'activities:activities', 'sports:overview')]
+    if sport is not None:
+        views.append(('sports:sport', reverse('sports:sport',
+            kwargs={'pk': sport.pk, 'slug': sport.slug}), False))
+    if activity is not None:
+        views.append(('activities:activity', reverse('activities:activity',
+            kwargs={'pk': activity.pk, 'slug': activity.slug}), False))
+    if article is not None:
+        views.append(('communication:article', reverse('communication:article',
+            kwargs={'pk': article.pk, 'slug': article.slug}), False))
+    views.append(('search', reverse('search') + '?q=tournoi', False))
+    return views
+
+
+FUNCTIONS = (
+    ('CustomUser.objects.members', lambda: CustomUser.objects.members().count()),
+    ('news_page', lambda: news_page(3)),
+    ('search', lambda: search.search('finale équipe')),
+    ('activity_reports', lambda: reports.activity_reports(date.today() -
+        timedelta(365), date.today())),
+    ('membership_income', lambda: reports.membership_income(date.today())),
+)
+
+
+def run(repeat=5):
+    """Time the public views and key functions repeat times each.
+
+    Return a dict with the database vendor, the date of the run and, for each
+    view and function, its durations (min, median and mean in seconds) with
+    its queries, duplicate queries and database time of the last repetition.
+    """
+
+    results = {'vendor': connection.vendor,
+        'date': timezone.now().isoformat(), 'views': {}, 'functions': {}}
+    client = Client()
+    queries_setting = settings.INSTRUMENTATION_QUERIES
+    settings.INSTRUMENTATION_QUERIES = True
+    try:
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url, cold in _views():
+                results['views'][name] = _time_view(client, url, repeat, cold)
+    finally:
+        settings.INSTRUMENTATION_QUERIES = queries_setting
+    for name, function in FUNCTIONS:
+        results['functions'][name] = _time_function(function, repeat)
+    return results
+
+
+def compare(old, new):
+    """Return a list of (kind, name, old median, new median, ratio, old queries,
+    new queries) for the views and functions measured by both results.
+    """
+
+    differences = []
+    for kind in ('views', 'functions'):
+        for name in sorted(set(old.get(kind, {})) & set(new.get(kind, {}))):
+            before, after = old[kind][name], new[kind][name]
+            differences.append((kind, name, before['median'], after['median'],
+                after['median'] / before['median'] if before['median'] else None,
+                before['queries'], after['queries']))
+    return differences
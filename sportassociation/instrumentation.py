@@ -0,0 +1,205 @@
+"""Instrumentation of the views.
+
+InstrumentationMiddleware measures each request and records, under the name of
+the resolved URL (home, communication:news, sports:sport...), its wall time,
+the time spent in the database, the number of queries and the number of
+duplicate queries (identical SQL and parameters run again, the mark of an N+1
+pattern). The measures are logged on the sportassociation.instrumentation
+logger and, when INSTRUMENTATION_HEADERS is True (or None in DEBUG), returned
+in a Server-Timing header and X-Query-Count and X-Duplicate-Queries headers.
+
+Queries are recorded by the debug cursor of Django, which formats and keeps the
+SQL of every query, only when INSTRUMENTATION_QUERIES is True (or None in
+DEBUG): otherwise only the wall time is measured, logged and sent. QueryBudgetMixin and the
+bench command turn it on.
+
+Queries run while a StreamingHttpResponse is consumed, after the middleware
+returned it (CSV exports, calendars), are not counted.
+
+This exports:
+    - ViewMeasures: class storing the measures of a request.
+    - InstrumentationMiddleware: middleware measuring the requests.
+    - measure: context manager measuring the queries of a block.
+    - QueryBudgetMixin: mixin for test cases checking the query budgets of the
+        views.
+"""
+from django.db import connection
+from collections import Counter
+from contextlib import contextmanager
+import logging
+import time
+from sportassociation import settings
+
+logger = logging.getLogger(__name__)
+
+#Name recorded for the requests which did not resolve to a view.
+UNRESOLVED = '<unresolved>'
+
+
+class ViewMeasures(object):
+    """Measures of a request or of a block of code.
+
+    Attributes:
+        - db_duration: float storing the time spent in queries, in seconds.
+        - duplicates: integer storing the number of queries run again with the
+            same SQL and parameters.
+        - duration: float storing the wall time, in seconds.
+        - queries: list of the SQL of the queries, in order.
+        - query_count: integer storing the number of queries.
+        - recorded: boolean telling whether the queries were recorded. If not,
+            only duration is measured.
+        - view_name: string storing the name of the resolved URL.
+
+    Methods:
+        - most_duplicated: return the most duplicated queries.
+    """
+
+    def __init__(self, view_name, duration, queries=None):
+        self.view_name = view_name
+        self.duration = duration
+        self.recorded = queries is not None
+        queries = queries or []
+        self.queries = [query['sql'] for query in queries]
+        self.db_duration = sum(float(query['time']) for query in queries)
+        self.duplicates = len(self.queries) - len(set(self.queries))
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    def most_duplicated(self, number=3):
+        """Return a list of (SQL, count) of the number queries run the most
+        times, if they were run more than once.
+        """
+
+        return [(sql, count) for sql, count in \
+            Counter(self.queries).most_common(number) if count > 1]
+
+    def __str__(self):
+        if not self.recorded:
+            return '%s %.1fms' % (self.view_name, self.duration * 1000)
+        return '%s %.1fms db=%.1fms queries=%s duplicates=%s' % (self.view_name,
+            self.duration * 1000, self.db_duration * 1000, self.query_count,
+            self.duplicates)
+
+
+def _queries_enabled():
+    if settings.INSTRUMENTATION_QUERIES is None:
+        return settings.DEBUG
+    return settings.INSTRUMENTATION_QUERIES
+
+
+def _headers_enabled():
+    if settings.INSTRUMENTATION_HEADERS is None:
+        return settings.DEBUG
+    return settings.INSTRUMENTATION_HEADERS
+
+
+class InstrumentationMiddleware(object):
+    """Middleware measuring the requests. It has to be the first middleware so
+    that the others are measured too.
+
+    The measures of a request are stored in the measures attribute of its
+    response.
+    """
+
+    def process_request(self, request):
+        recorded = _queries_enabled()
+        request._instrumentation = (time.time(), len(connection.queries_log),
+            connection.force_debug_cursor, recorded)
+        if recorded:
+            connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_instrumentation'):
+            return response
+        start, first_query, force_debug_cursor, recorded = \
+            request._instrumentation
+        connection.force_debug_cursor = force_debug_cursor
+        match = getattr(request, 'resolver_match', None)
+        queries = list(connection.queries_log)[first_query:] if recorded \
+            else None
+        measures = ViewMeasures(match.view_name if match else UNRESOLVED,
+            time.time() - start, queries)
+        response.measures = measures
+
+        logger.info('%s %s %s', request.method, response.status_code, measures)
+        if measures.duplicates:
+            logger.debug('Duplicate queries of %s: %s', measures.view_name,
+                measures.most_duplicated())
+        if _headers_enabled():
+            response['Server-Timing'] = 'total;dur=%.1f' % (
+                measures.duration * 1000)
+            #Queries which were not recorded are not reported as none.
+            if measures.recorded:
+                response['Server-Timing'] += ', db;dur=%.1f' % (
+                    measures.db_duration * 1000)
+                response['X-Query-Count'] = measures.query_count
+                response['X-Duplicate-Queries'] = measures.duplicates
+        return response
+
+
+@contextmanager
+def measure(name=UNRESOLVED):
+    """Measure the queries run in the with block. The ViewMeasures are
+    available once the block is left:
+
+        with measure('report') as measures:
+            ...
+        measures[0].query_count
+    """
+
+    result = []
+    first_query = len(connection.queries_log)
+    force_debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    start = time.time()
+    try:
+        yield result
+    finally:
+        connection.force_debug_cursor = force_debug_cursor
+        result.append(ViewMeasures(name, time.time() - start,
+            list(connection.queries_log)[first_query:]))
+
+
+class QueryBudgetMixin(object):
+    """Mixin for test cases checking the queries of the views.
+
+    query_budgets maps the names of the resolved URLs to the maximum number of
+    queries of a request. A view without budget is not checked. The queries of
+    the requests are recorded during the tests of the class.
+
+    Methods:
+        - assertWithinBudget: check the measures of a response.
+    """
+
+    query_budgets = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super(QueryBudgetMixin, cls).setUpClass()
+        cls._queries_setting = settings.INSTRUMENTATION_QUERIES
+        settings.INSTRUMENTATION_QUERIES = True
+
+    @classmethod
+    def tearDownClass(cls):
+        settings.INSTRUMENTATION_QUERIES = cls._queries_setting
+        super(QueryBudgetMixin, cls).tearDownClass()
+
+    def assertWithinBudget(self, response, budget=None, duplicates=0):
+        """Fail if the request of response ran more queries than the budget of
+        its view or more than duplicates duplicate queries.
+        """
+
+        measures = response.measures
+        if budget is None:
+            budget = self.query_budgets.get(measures.view_name)
+        if budget is not None and measures.query_count > budget:
+            self.fail('%s ran %s queries, over its budget of %s:\n%s' % (
+                measures.view_name, measures.query_count, budget,
+                '\n'.join(measures.queries)))
+        if measures.duplicates > duplicates:
+            self.fail('%s ran %s duplicate queries:\n%s' % (measures.view_name,
+                measures.duplicates, '\n'.join('%s x %s' % (count, sql)
+                for sql, count in measures.most_duplicated())))
+        return measures
@@ -0,0 +1,267 @@
+"""Keyset (cursor) pagination for list views.
+
+Offset pagination runs a COUNT(*) on every page and gets slower as the page
+number grows. Keyset pagination filters on the values of the last displayed row
+instead, so every page costs the same single indexed query.
+
+This exports:
+    - ESTIMATED_COUNT: count mode using the planner estimate on PostgreSQL.
+    - EXACT_COUNT: count mode running a COUNT(*).
+
+    - CursorPage: class representing a page of results.
+    - CursorPaginator: class paginating a queryset with opaque cursors.
+    - CursorPaginationMixin: mixin for ListView using a CursorPaginator.
+"""
+from django.core.exceptions import (FieldDoesNotExist, ValidationError)
+from django.db import connections
+from django.db.models import Q
+from django.http import (Http404, HttpResponseRedirect)
+from django.utils.translation import ugettext as _
+import base64
+import json
+
+ESTIMATED_COUNT = 'estimated'
+EXACT_COUNT = 'exact'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage(object):
+    """Page of results of a CursorPaginator.
+
+    Attributes:
+        - object_list: list of the objects of the page.
+        - paginator: paginator which created the page.
+        - next_cursor: opaque string to give back to fetch the next page. None
+            if this is the last page.
+        - previous_cursor: opaque string to give back to fetch the previous
+            page. None if this is the first page.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % (len(self.object_list))
+
+
+class CursorPaginator(object):
+    """Paginate a queryset with keyset conditions on its ordering fields.
+
+    The ordering has to be total (typically ending with the primary key) and
+    its fields cannot be NULL.
+
+    Attributes:
+        - count_mode: None, ESTIMATED_COUNT or EXACT_COUNT. Tells how count is
+            computed, if ever used.
+        - ordering: tuple of the ordering fields ('-publication_date', '-pk').
+        - per_page: integer storing the number of objects per page.
+        - queryset: queryset to paginate.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count_mode=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+        self.count_mode = count_mode
+        self.fields = [(field.lstrip('-'), field.startswith('-'))
+            for field in ordering]
+
+    def _model_field(self, lookup):
+        model = self.queryset.model
+        parts = lookup.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        if parts[-1] == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(parts[-1])
+
+    def _value(self, obj, lookup):
+        for part in lookup.split('__'):
+            obj = getattr(obj, part)
+        if hasattr(obj, 'isoformat'):
+            return obj.isoformat()
+        return obj
+
+    def encode(self, obj, backwards=False):
+        """Return the opaque cursor pointing after (or before) obj."""
+
+        data = json.dumps([1 if backwards else 0] + [self._value(obj, lookup)
+            for lookup, descending in self.fields])
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode(self, cursor):
+        """Return (backwards, values) read from the opaque cursor."""
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).\
+                decode('utf-8'))
+            #A cursor is a list, whatever JSON a user may craft.
+            if not isinstance(data, list) or not data:
+                raise InvalidCursor()
+            backwards, values = bool(data[0]), data[1:]
+            if len(values) != len(self.fields):
+                raise InvalidCursor()
+            return backwards, [self._model_field(lookup).to_python(value)
+                for (lookup, descending), value in zip(self.fields, values)]
+        except (ValueError, TypeError, IndexError, AttributeError,
+                FieldDoesNotExist, ValidationError) as e:
+            raise InvalidCursor(e)
+
+    def _after(self, values, backwards):
+        """Return the Q object selecting rows following values."""
+
+        condition = Q()
+        for index, (lookup, descending) in enumerate(self.fields):
+            operator = 'lt' if descending != backwards else 'gt'
+            clause = Q(**{'%s__%s' % (lookup, operator): values[index]})
+            for equal_index, (equal_lookup, equal_descending) in \
+                    enumerate(self.fields[:index]):
+                clause &= Q(**{equal_lookup: values[equal_index]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """Return the CursorPage designated by cursor (first page if None)."""
+
+        backwards = False
+        queryset = self.queryset
+        if cursor:
+            backwards, values = self.decode(cursor)
+            queryset = queryset.filter(self._after(values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+
+        #Fetch one more object to know if there is a page after this one.
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+
+        next_cursor = previous_cursor = None
+        if objects:
+            if has_more or backwards:
+                next_cursor = self.encode(objects[-1])
+            if cursor and (has_more or not backwards):
+                previous_cursor = self.encode(objects[0], backwards=True)
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+    def cursor_at(self, index):
+        """Return the cursor of the page starting at the object numbered
+        index (from 0), None for the first page or if there is no such object.
+        """
+
+        if index <= 0:
+            return None
+        obj = self.queryset[index - 1:index].first()
+        return self.encode(obj) if obj is not None else None
+
+    @property
+    def count(self):
+        """Return the number of objects, estimated if count_mode says so."""
+
+        if not hasattr(self, '_count'):
+            if self.count_mode == ESTIMATED_COUNT:
+                self._count = self.estimated_count()
+            else:
+                self._count = self.queryset.count()
+        return self._count
+
+    def estimated_count(self):
+        """Return the row estimate of the query planner.
+
+        Only available on PostgreSQL, other databases fall back on COUNT(*).
+        """
+
+        connection = connections[self.queryset.db]
+        if connection.vendor != 'postgresql':
+            return self.queryset.count()
+        sql, params = self.queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+
+
+class CursorPaginationMixin(object):
+    """Mixin paginating a ListView with a CursorPaginator.
+
+    The page is selected with the `cursor` GET parameter. The context contains
+    the same page_obj, paginator, is_paginated and object_list as with
+    paginate_by, page_obj having next_cursor and previous_cursor instead of
+    page numbers. Links to numbered pages (`page` GET parameter) are
+    redirected to the cursor of the same page, temporarily since the cursor
+    depends on the current rows.
+
+    Attributes:
+        - cursor_ordering: tuple of the ordering fields.
+        - cursor_count_mode: None, ESTIMATED_COUNT or EXACT_COUNT.
+        - paginate_by: integer storing the number of objects per page.
+    """
+
+    cursor_ordering = ('-pk',)
+    cursor_count_mode = None
+    cursor_kwarg = 'cursor'
+
+    def get(self, request, *args, **kwargs):
+        if self.page_kwarg in request.GET and \
+                self.cursor_kwarg not in request.GET:
+            return self.redirect_numbered_page()
+        return super(CursorPaginationMixin, self).get(request, *args, **kwargs)
+
+    def redirect_numbered_page(self):
+        """Return a temporary redirection from a numbered page to its cursor,
+        or to the first page if the number is invalid or too big.
+        """
+
+        parameters = self.request.GET.copy()
+        number = parameters.pop(self.page_kwarg)[-1]
+        try:
+            number = int(number)
+        except ValueError:
+            number = 1
+        queryset = self.get_queryset()
+        paginator = CursorPaginator(queryset,
+            self.get_paginate_by(queryset), self.cursor_ordering)
+        cursor = paginator.cursor_at((number - 1) * paginator.per_page)
+        if cursor is not None:
+            parameters[self.cursor_kwarg] = cursor
+        url = self.request.path
+        if parameters:
+            url += '?' + parameters.urlencode()
+        return HttpResponseRedirect(url)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering,
+            count_mode=self.cursor_count_mode)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404(_('Invalid page.'))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -30,6 +30,55 @@ DATABASE_USER = ''
 DATABASE_PWD = ''
 DATABASE_HOST = ''
 
+# Blocks of the home page, schedule, election results, thumbnail manifests and
+# sport pages are cached and invalidated by signals in the process handling the
+# write: in production, the cache has to be shared by every process of the
+# server, see localsettings.template. The default cache is private to the
+# process, which suits the development server and the tests.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Weekmails are sent by batches of WEEKMAIL_BATCH_SIZE recipients. A failed batch
+# is tried again after WEEKMAIL_RETRY_DELAY seconds, doubled after each failure,
+# until WEEKMAIL_MAX_ATTEMPTS is reached. A batch claimed by a worker for more
+# than WEEKMAIL_SENDING_TIMEOUT seconds is given back to the queue.
+WEEKMAIL_BATCH_SIZE = 50
+WEEKMAIL_MAX_ATTEMPTS = 5
+WEEKMAIL_RETRY_DELAY = 60
+WEEKMAIL_SENDING_TIMEOUT = 600
+
+# Number of processes rendering member cards (None for the number of CPUs).
+MEMBER_CARD_PROCESSES = None
+
+# Month of the beginning of the fiscal year, which is split in two semesters.
+FISCAL_YEAR_START_MONTH = 9
+
+# Thumbnails are generated by THUMBNAIL_WORKERS threads when images are saved
+# (0 to generate them while saving), see sportassociation/thumbnails.py.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_BACKEND = 'sportassociation.thumbnails.ThumbnailBackend'
+
+# Media of protected/ and admin/ are checked by ProtectedMediaView, then
+# transferred by the front server: 'nginx' (X-Accel-Redirect to the internal
+# location PROTECTED_MEDIA_INTERNAL_URL aliased to MEDIA_ROOT), 'sendfile'
+# (X-Sendfile) or Django itself if None. The scope of a user is cached in its
+# session for PROTECTED_MEDIA_SCOPE_TIMEOUT seconds.
+PROTECTED_MEDIA_SERVER = None
+PROTECTED_MEDIA_INTERNAL_URL = '/internal-media/'
+PROTECTED_MEDIA_SCOPE_TIMEOUT = 300
+
+# The wall time, database time and queries of each view are logged on the
+# sportassociation.instrumentation logger, and returned in the Server-Timing,
+# X-Query-Count and X-Duplicate-Queries headers if INSTRUMENTATION_HEADERS is
+# True (None to follow DEBUG), see sportassociation/instrumentation.py. The
+# queries are only recorded if INSTRUMENTATION_QUERIES is True (None to follow
+# DEBUG), which costs the formatting of the SQL of every query.
+INSTRUMENTATION_HEADERS = None
+INSTRUMENTATION_QUERIES = None
+
 from .localsettings import *
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -61,6 +110,7 @@ INSTALLED_APPS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'sportassociation.instrumentation.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -0,0 +1,255 @@
+"""Thumbnails generated ahead of the requests.
+
+The thumbnails of the sizes listed in SIZES are generated by a pool of threads
+as soon as an image listed in IMAGES is saved (see signals) and recorded in the
+key value store of sorl-thumbnail. Templates only read the key value store (see
+the thumbnail_url template tag): a thumbnail which does not exist yet is queued
+and the original image is served meanwhile, so a request never waits for an
+image to be resized. A queued generation is marked in the cache so that it is
+neither queued again nor looked up until it is done, or for QUEUED_TIMEOUT
+seconds if the image does not exist.
+
+Thumbnails of the images stored in protected/ and admin/ are stored in the same
+directory so that they are served with the same permissions.
+
+This exports:
+    - SIZES: dict of the geometry and options of each named size.
+    - IMAGES: tuple of (model, image field, sizes) to generate thumbnails for.
+
+    - ThumbnailBackend: class of the sorl-thumbnail backend.
+    - lookup: return a thumbnail if it has already been generated.
+    - url: return the URL of a thumbnail, or of the image while it is queued.
+    - generate: generate the thumbnails of an image.
+    - run: call a function in the pool of threads.
+    - run_once: call a function in the pool unless the same call is queued.
+    - schedule: generate the thumbnails of an image in the pool.
+    - pregenerate: generate the thumbnails of the images of an instance.
+    - backfill: generate the thumbnails of every image.
+"""
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import (settings as thumbnail_settings,
+                                defaults as default_settings)
+from sorl.thumbnail.images import ImageFile
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+from sportassociation import settings
+
+logger = logging.getLogger(__name__)
+
+SIZES = {
+    'carousel': ('1140x400', {'crop': 'center'}),
+    'list': ('360x240', {'crop': 'center'}),
+    'detail': ('750', {}),
+    'photo': ('300x300', {'crop': 'center'}),
+}
+
+IMAGES = (
+    ('activities.Activity', 'cover', ('carousel', 'list', 'detail')),
+    ('communication.Article', 'cover', ('carousel', 'list', 'detail')),
+    ('management.ProtectedImage', 'file', ('list', 'detail')),
+    ('users.CustomUser', 'id_photo', ('photo',)),
+)
+
+#Thumbnails of these directories are not stored in the public cache.
+PRIVATE_DIRECTORIES = ('protected', 'admin')
+
+QUEUED_TIMEOUT = 600
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Backend of sorl-thumbnail able to look a thumbnail up without generating
+    it.
+
+    Methods:
+        - lookup: return the thumbnail of a file if it is in the key value
+            store, None otherwise.
+    """
+
+    def _options(self, source, options):
+        #Same options as get_thumbnail so that both agree on the file names.
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        name = super(ThumbnailBackend, self)._get_thumbnail_filename(source,
+            geometry_string, options)
+        directory = source.name.split('/', 1)[0]
+        if directory in PRIVATE_DIRECTORIES:
+            return os.path.join(directory, name)
+        return name
+
+    def lookup(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(source, geometry_string,
+            self._options(source, options))
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+_backend = ThumbnailBackend()
+_executor = None
+
+
+def _name(file_):
+    return getattr(file_, 'name', file_)
+
+
+def lookup(file_, size):
+    """Return the ImageFile of the thumbnail of file_ at size (a key of SIZES)
+    if it has been generated, None otherwise. Nothing is generated.
+    """
+
+    if not file_:
+        return None
+    geometry, options = SIZES[size]
+    return _backend.lookup(_name(file_), geometry, **options)
+
+
+def _queued_key(name, sizes):
+    return 'thumbnails-queued:%s' % (hashlib.md5(('%s:%s' % (name,
+        ','.join(sizes))).encode('utf-8')).hexdigest())
+
+
+def url(file_, size):
+    """Return the URL of the thumbnail of file_ at size if it has been
+    generated. Otherwise the thumbnail is queued (unless THUMBNAIL_WORKERS is 0,
+    see backfill) and the URL of file_ is returned.
+    """
+
+    if not file_:
+        return ''
+    if cache.get(_queued_key(_name(file_), (size,))) is not None:
+        return file_.url
+    thumbnail = lookup(file_, size)
+    if thumbnail is not None:
+        return thumbnail.url
+    if settings.THUMBNAIL_WORKERS:
+        schedule(file_, (size,))
+    return file_.url
+
+
+def generate(file_, sizes):
+    """Generate the thumbnails of file_ at each of sizes, keys of SIZES.
+
+    Thumbnails already in the key value store are not generated again. Return
+    the list of the thumbnails, None if file_ does not exist.
+    """
+
+    if not default.storage.exists(_name(file_)):
+        return None
+    thumbnails = []
+    for size in sizes:
+        geometry, options = SIZES[size]
+        thumbnails.append(_backend.get_thumbnail(_name(file_), geometry,
+            **dict(options)))
+    return thumbnails
+
+
+def _run(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('%s%s failed.', function.__name__, args)
+    finally:
+        #Each thread of the pool has its own connection.
+        connection.close()
+
+
+def run(function, *args):
+    """Call function with args in the pool of THUMBNAIL_WORKERS threads, or
+    right away if THUMBNAIL_WORKERS is 0.
+
+    Return the future of the call, None if it was not queued.
+    """
+
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        function(*args)
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _executor.submit(_run, function, *args)
+
+
+def _release(key, function, *args):
+    #The key of a call returning None, whose image does not exist, is kept
+    #until it expires.
+    if function(*args) is not None:
+        cache.delete(key)
+
+
+def run_once(key, function, *args):
+    """Call function with args in the pool (see run) unless a call marked with
+    key is already queued. The mark is removed once function returned anything
+    but None, or after QUEUED_TIMEOUT seconds.
+
+    Return the future of the call, None if it was not queued.
+    """
+
+    if not cache.add(key, True, QUEUED_TIMEOUT):
+        return None
+    return run(_release, key, function, *args)
+
+
+def schedule(file_, sizes):
+    """Generate the thumbnails of file_ at each of sizes in the pool (see
+    run_once), unless they are already queued.
+
+    Return the future of the generation, None if it was not queued.
+    """
+
+    if not file_:
+        return None
+    sizes = tuple(sizes)
+    return run_once(_queued_key(_name(file_), sizes), generate, _name(file_),
+        sizes)
+
+
+def _images():
+    for label, field, sizes in IMAGES:
+        yield apps.get_model(label), field, sizes
+
+
+def pregenerate(instance):
+    """Schedule the thumbnails of the images of instance listed in IMAGES."""
+
+    for model, field, sizes in _images():
+        if isinstance(instance, model):
+            schedule(getattr(instance, field), sizes)
+
+
+def backfill(dry_run=False):
+    """Generate the missing thumbnails of every image listed in IMAGES, in a
+    pool of THUMBNAIL_WORKERS threads if it is not 0.
+
+    Return the number of images which missed at least one thumbnail.
+    """
+
+    missing = []
+    for model, field, sizes in _images():
+        for name in model.objects.exclude(**{field: ''}).\
+                exclude(**{'%s__isnull' % field: True}).\
+                values_list(field, flat=True).iterator():
+            if any(lookup(name, size) is None for size in sizes):
+                missing.append((name, sizes))
+    if not dry_run and settings.THUMBNAIL_WORKERS:
+        with ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS) as \
+                executor:
+            for name, sizes in missing:
+                executor.submit(_run, generate, name, sizes)
+    elif not dry_run:
+        for name, sizes in missing:
+            generate(name, sizes)
+    return len(missing)
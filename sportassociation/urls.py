@@ -14,11 +14,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include(blog_urls))
 """
 from django.conf.urls import include, url
+import re
 from django.contrib import admin
 from communication.views import (HomeView, AssociationView, InscriptionView,
-        ContactView, SponsorsView, ForumView, MentionsLegalesView)
+        ContactView, SponsorsView, ForumView, MentionsLegalesView, SearchView)
 
 from . import settings
+from management.media import MEDIA_SCOPES
+from management.views import ProtectedMediaView
 from users.views import AdminUserCreateView
 
 urlpatterns = [
@@ -32,13 +35,17 @@ urlpatterns = [
     url(r'^contact$', ContactView.as_view(), name='contact'),
     url(r'^sponsors$', SponsorsView.as_view(), name='sponsors'),
     url(r'^mentions-legales$', MentionsLegalesView.as_view(), name='mentions-legales'),
+    url(r'^search$', SearchView.as_view(), name='search'),
     url(r'^users/', include('users.urls', namespace='users')),
     url(r'^', include('django.contrib.auth.urls')),
     url(r'^communication/', include('communication.urls', namespace='communication')),
     url(r'^activities/', include('activities.urls', namespace='activities')),
     url(r'^sports/', include('sports.urls', namespace='sports')),
     url(r'^captcha/', include('captcha.urls')),
-
+    #Before the media served in DEBUG, so that protected ones are checked too.
+    url(r'^%s(?P<path>(?:%s).+)$' % (re.escape(settings.MEDIA_URL.lstrip('/')),
+        '|'.join(re.escape(directory) for directory, scope in MEDIA_SCOPES)),
+        ProtectedMediaView.as_view(), name='protected-media'),
 ]
 
 if settings.DEBUG:
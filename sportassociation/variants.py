@@ -0,0 +1,253 @@
+"""Responsive variants of the covers.
+
+The covers of the listings are resized with Pillow to each width of WIDTHS
+(never upscaled) in WebP, when Pillow is built with it, and in a fallback format
+(JPEG, or PNG for images with transparency) so that browsers pick the smallest
+file fitting the layout (see the picture and srcset template tags).
+
+Variants are stored by hash of the content of their source: a source is resized
+once whatever its name and identical images share their variants. The manifest
+of a source (its hash and its variants) is stored as JSON in variants/manifests/
+and cached under the name, size and modification time of the source, so that a
+file replaced under the same name gets new variants. Templates only read
+manifests, missing ones being built once in the pool of thumbnails (see
+thumbnails.run_once).
+
+Variants of the images stored in protected/ and admin/ are stored in the same
+directory so that they are served with the same permissions.
+
+This exports:
+    - WIDTHS: tuple of the widths of the variants, in pixels.
+    - SOURCES: tuple of (model, image field) to build variants for.
+
+    - formats: return the formats of the variants.
+    - manifest: return the manifest of an image if it has been built.
+    - build: build the variants and the manifest of an image.
+    - schedule: build the variants of an image in the pool.
+    - pregenerate: build the variants of the images of an instance.
+    - backfill: build the variants of every image.
+"""
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import (Image, features)
+from io import BytesIO
+import hashlib
+import json
+import os
+from sportassociation import thumbnails
+
+WIDTHS = (320, 480, 640, 960, 1280)
+
+SOURCES = (
+    ('activities.Activity', 'cover'),
+    ('communication.Article', 'cover'),
+)
+
+WEBP = ('WEBP', 'image/webp', 'webp', {'quality': 75, 'method': 4})
+JPEG = ('JPEG', 'image/jpeg', 'jpg', {'quality': 80, 'optimize': True,
+    'progressive': True})
+PNG = ('PNG', 'image/png', 'png', {'optimize': True})
+
+VARIANTS_DIRECTORY = 'variants'
+
+#Transpositions applied for each value of the EXIF orientation tag.
+ORIENTATION_TAG = 0x0112
+ORIENTATIONS = {
+    2: (Image.FLIP_LEFT_RIGHT,),
+    3: (Image.ROTATE_180,),
+    4: (Image.FLIP_TOP_BOTTOM,),
+    5: (Image.TRANSPOSE,),
+    6: (Image.ROTATE_270,),
+    7: (Image.ROTATE_90, Image.FLIP_LEFT_RIGHT),
+    8: (Image.ROTATE_90,),
+}
+
+
+def formats(transparent=False):
+    """Return the formats of the variants of an image, preferred first, as
+    tuples (Pillow format, MIME type, extension, save options).
+    """
+
+    fallback = PNG if transparent else JPEG
+    if features.check('webp'):
+        return (WEBP, fallback)
+    return (fallback,)
+
+
+def _name(file_):
+    return getattr(file_, 'name', file_)
+
+
+def _prefix(name):
+    directory = name.split('/', 1)[0]
+    if directory in thumbnails.PRIVATE_DIRECTORIES:
+        return '%s/%s/' % (directory, VARIANTS_DIRECTORY)
+    return '%s/' % (VARIANTS_DIRECTORY)
+
+
+def _fingerprint(name):
+    #A file replaced under the same name changes of size or modification time.
+    try:
+        stamp = '%s:%s:%s' % (name, default_storage.size(name),
+            default_storage.modified_time(name).isoformat())
+    except (IOError, OSError, NotImplementedError):
+        return None
+    return hashlib.md5(stamp.encode('utf-8')).hexdigest()
+
+
+def _manifest_name(name, fingerprint):
+    return '%smanifests/%s.json' % (_prefix(name), fingerprint)
+
+
+def _key(fingerprint):
+    return 'variants:%s' % (fingerprint)
+
+
+def manifest(file_):
+    """Return the manifest of file_ if its variants have been built, None
+    otherwise. Nothing is built.
+
+    A manifest is a dict with the hash, width and height of the source, the MIME
+    type of the fallback format and the variants of each MIME type as a list of
+    [width, name], narrowest first.
+    """
+
+    if not file_:
+        return None
+    name = _name(file_)
+    fingerprint = _fingerprint(name)
+    if fingerprint is None:
+        return None
+    content = cache.get(_key(fingerprint))
+    if content is None:
+        try:
+            with default_storage.open(_manifest_name(name, fingerprint)) as \
+                    stored:
+                content = json.loads(stored.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+        cache.set(_key(fingerprint), content, None)
+    return content
+
+
+def _orient(image):
+    #Pillow < 6 has no ImageOps.exif_transpose: the orientation tag is read
+    #from the EXIF of JPEG files, other images are left as they are.
+    try:
+        exif = image._getexif() or {}
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError,
+            SyntaxError):
+        return image
+    for method in ORIENTATIONS.get(exif.get(ORIENTATION_TAG), ()):
+        image = image.transpose(method)
+    return image
+
+
+def _resize(image, width):
+    if width == image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _save(image, variant_format, name):
+    pillow_format, mime, extension, options = variant_format
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, pillow_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(output.getvalue()))
+
+
+def build(file_):
+    """Build the missing variants and the manifest of file_ and return the
+    manifest, None if file_ does not exist.
+    """
+
+    name = _name(file_)
+    if not name or not default_storage.exists(name):
+        return None
+    fingerprint = _fingerprint(name)
+    with default_storage.open(name) as source:
+        data = source.read()
+    digest = hashlib.sha1(data).hexdigest()
+    directory = '%s%s/%s/' % (_prefix(name), digest[:2], digest)
+
+    image = Image.open(BytesIO(data))
+    image.load()
+    image = _orient(image)
+    transparent = image.mode in ('RGBA', 'LA') or \
+        (image.mode == 'P' and 'transparency' in image.info)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if transparent else 'RGB')
+
+    widths = sorted(set(min(width, image.width) for width in WIDTHS))
+    variants = {}
+    for variant_format in formats(transparent):
+        extension = variant_format[2]
+        for width in widths:
+            variant = os.path.join(directory, '%s.%s' % (width, extension))
+            #Identical sources share their variants.
+            if not default_storage.exists(variant):
+                variant = _save(_resize(image, width), variant_format, variant)
+            variants.setdefault(variant_format[1], []).append([width, variant])
+
+    content = {'hash': digest, 'width': image.width, 'height': image.height,
+        'fallback': formats(transparent)[-1][1], 'variants': variants}
+    manifest_name = _manifest_name(name, fingerprint)
+    if default_storage.exists(manifest_name):
+        default_storage.delete(manifest_name)
+    default_storage.save(manifest_name, ContentFile(json.dumps(content).\
+        encode('utf-8')))
+    cache.set(_key(fingerprint), content, None)
+    return content
+
+
+def schedule(file_):
+    """Build the variants of file_ in the pool of thumbnails unless they are
+    already queued (see thumbnails.run_once).
+
+    Return the future of the build, None if it was not queued.
+    """
+
+    if not file_:
+        return None
+    name = _name(file_)
+    return thumbnails.run_once('variants-queued:%s' % (hashlib.md5(\
+        name.encode('utf-8')).hexdigest()), build, name)
+
+
+def _sources():
+    for label, field in SOURCES:
+        yield apps.get_model(label), field
+
+
+def pregenerate(instance):
+    """Schedule the variants of the images of instance listed in SOURCES."""
+
+    for model, field in _sources():
+        if isinstance(instance, model):
+            schedule(getattr(instance, field))
+
+
+def backfill(dry_run=False):
+    """Build the variants of every image listed in SOURCES without manifest.
+
+    Return the number of images without manifest.
+    """
+
+    missing = []
+    for model, field in _sources():
+        for name in model.objects.exclude(**{field: ''}).\
+                exclude(**{'%s__isnull' % field: True}).\
+                values_list(field, flat=True).iterator():
+            if manifest(name) is None:
+                missing.append(name)
+    if not dry_run:
+        for name in missing:
+            build(name)
+    return len(missing)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SportsConfig(AppConfig):
+    name = 'sports'
+
+    def ready(self):
+        #Connect the receivers invalidating the cached schedule.
+        from . import signals
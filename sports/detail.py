@@ -0,0 +1,76 @@
+"""Cached context of the sport pages.
+
+The context of a sport page (the sport, its managers, its sessions and its
+upcoming matches) is loaded with a single prefetch plan, then cached until a
+write to the sport, its sessions, its cancelled sessions or its matches (see
+signals), or until its next match starts. The occurrences of the sessions are
+cached by the schedule.
+
+This exports:
+    - UPCOMING_MATCHES: number of upcoming matches displayed.
+
+    - get_context: return the context of a sport page.
+    - invalidate: remove the context of sports from the cache.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+from sports.models import (Sport, Session, Match)
+from users.models import CustomUser
+
+UPCOMING_MATCHES = 5
+
+#Names and photos of the managers are not watched, they are refreshed hourly.
+CONTEXT_TIMEOUT = 3600
+
+
+def _key(pk):
+    return 'sport:%s' % (pk)
+
+
+def _load(pk, now):
+    #Sport, managers with their users, sessions with their locations and
+    #managers, upcoming matches: 4 queries whatever the size of the sport.
+    sport = Sport.objects.filter(pk=pk).prefetch_related(
+        Prefetch('managers', queryset=CustomUser.objects.\
+            select_related('user')),
+        Prefetch('sessions', queryset=Session.objects.\
+            select_related('location', 'manager__user').\
+            order_by('weekday', 'date', 'start_time', 'pk')),
+        Prefetch('matches', queryset=Match.objects.filter(date__gt=now).\
+            select_related('location').order_by('date'),
+            to_attr='upcoming_matches')).first()
+    if sport is None:
+        return None
+    return {'sport': sport,
+        'managers': list(sport.managers.all()),
+        'sessions': list(sport.sessions.all()),
+        'matches': sport.upcoming_matches[:UPCOMING_MATCHES]}
+
+
+def get_context(pk, now=None):
+    """Return a dictionary with the sport pk, its managers, its sessions and
+    its upcoming matches, None if the sport does not exist.
+    """
+
+    if now is None:
+        now = timezone.now()
+    context = cache.get(_key(pk))
+    #Once started, a match is not an upcoming one anymore.
+    if context is None or any(match.date <= now for match in \
+            context['matches']):
+        context = _load(pk, now)
+        if context is None:
+            return None
+        timeout = CONTEXT_TIMEOUT
+        if context['matches']:
+            timeout = min(timeout, max(1, int((context['matches'][0].date -
+                now).total_seconds()) + 1))
+        cache.set(_key(pk), context, timeout)
+    return context
+
+
+def invalidate(*pks):
+    """Remove the context of the sports pks from the cache."""
+
+    cache.delete_many([_key(pk) for pk in pks if pk is not None])
@@ -0,0 +1,257 @@
+"""iCalendar feeds of the sessions, matches and activities.
+
+A weekly session is written as a single event repeated with a RRULE, its
+cancellations being EXDATE, so the size of a feed does not grow with time. The
+lines of a feed are generated one event at a time to be streamed.
+
+The state of a feed (latest modification date and number of objects, so that
+deletions are noticed too) is computed with one aggregate query per model and
+gives the ETag and Last-Modified headers of the feed.
+
+This exports:
+    - PRODID: product identifier written in the feeds.
+
+    - feed_state: return the last modification date and the ETag of a feed.
+    - calendar_lines: yield the lines of a feed.
+"""
+from django.db.models import (Count, Max)
+from django.utils import timezone
+from datetime import (date, datetime, timedelta)
+import calendar
+import hashlib
+from activities.models import Activity
+from management.models import Weekday
+from sports.models import (Session, CancelledSession, Match)
+from sportassociation import settings
+
+PRODID = '-//sportassociation//calendar//FR'
+
+#Matches only have a start date.
+MATCH_DURATION = timedelta(hours=2)
+
+ICAL_WEEKDAYS = {1: 'SU', 2: 'MO', 3: 'TU', 4: 'WE', 5: 'TH', 6: 'FR', 7: 'SA'}
+
+#Days of the week of Python, from Monday.
+ICAL_DAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+#VTIMEZONE components per time zone and year.
+_timezones = {}
+
+
+def _querysets(sport=None):
+    now = timezone.now()
+    sessions = Session.objects.filter(sport__is_open=True)
+    cancellations = CancelledSession.objects.filter(\
+        cancelled_session__sport__is_open=True)
+    matches = Match.objects.all()
+    activities = Activity.objects.filter(publication_date__lte=now)
+    if sport is not None:
+        sessions = sessions.filter(sport=sport)
+        cancellations = cancellations.filter(cancelled_session__sport=sport)
+        matches = matches.filter(sport=sport)
+        activities = activities.none()
+    return (sessions, cancellations, matches, activities)
+
+
+def feed_state(sport=None):
+    """Return a tuple (last_modified, etag) of the feed of sport, or of the
+    global feed if sport is None.
+    """
+
+    dates = []
+    counts = []
+    for queryset in _querysets(sport):
+        state = queryset.order_by().aggregate(Max('modification_date'),
+            Count('pk'))
+        dates.append(state['modification_date__max'])
+        counts.append(state['pk__count'])
+    if sport is not None:
+        dates.append(sport.modification_date)
+    last_modified = max([date for date in dates if date is not None] or [None])
+    etag = hashlib.md5(repr((sport.pk if sport else None, dates, counts)).\
+        encode('utf-8')).hexdigest()
+    return (last_modified, etag)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').\
+        replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    #Lines are folded at 75 octets without cutting a character.
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        size = 75 if not parts else 74
+        while len(encoded) > size and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _local(day, time):
+    return datetime.combine(day, time).strftime('%Y%m%dT%H%M%S')
+
+
+def _offset(value):
+    minutes = int(value.total_seconds()) // 60
+    return '%s%02d%02d' % ('-' if minutes < 0 else '+', abs(minutes) // 60,
+        abs(minutes) % 60)
+
+
+def _transitions(tz, year):
+    #Changes of offset of tz during year, searched hour by hour.
+    instant = datetime(year, 1, 1, tzinfo=timezone.utc)
+    previous = timezone.localtime(instant, tz).utcoffset()
+    transitions = []
+    while instant.year == year:
+        instant += timedelta(hours=1)
+        offset = timezone.localtime(instant, tz).utcoffset()
+        if offset != previous:
+            transitions.append((instant, previous, offset))
+            previous = offset
+    return (previous, transitions)
+
+
+def _nth_weekday(year, month, number, weekday):
+    #number-th weekday of the month, counted from its end if negative.
+    days = calendar.monthrange(year, month)[1]
+    if number < 0:
+        day = date(year, month, days)
+        return day - timedelta((day.weekday() - weekday) % 7)
+    day = date(year, month, 1)
+    return day + timedelta((weekday - day.weekday()) % 7 + 7 * (number - 1))
+
+
+def _observance(instant, before, after):
+    #The transition happens each year on the same weekday of the same week of
+    #the month, which is how nearly every zone defines daylight saving time.
+    wall = (instant + before).replace(tzinfo=None)
+    number = -1 if wall.day + 7 > calendar.monthrange(wall.year,
+        wall.month)[1] else (wall.day - 1) // 7 + 1
+    first = datetime.combine(_nth_weekday(1970, wall.month, number,
+        wall.weekday()), wall.time())
+    name = 'DAYLIGHT' if after > before else 'STANDARD'
+    return ['BEGIN:%s' % name, 'DTSTART:%s' % first.strftime('%Y%m%dT%H%M%S'),
+        'RRULE:FREQ=YEARLY;BYMONTH=%s;BYDAY=%s%s' % (wall.month, number,
+        ICAL_DAYS[wall.weekday()]), 'TZOFFSETFROM:%s' % _offset(before),
+        'TZOFFSETTO:%s' % _offset(after), 'END:%s' % name]
+
+
+def _timezone():
+    #Weekly sessions happen at the same local time all year long: the rules of
+    #the zone are computed from its transitions of the current year.
+    year = timezone.now().year
+    key = (settings.TIME_ZONE, year)
+    if key not in _timezones:
+        offset, transitions = _transitions(timezone.get_default_timezone(),
+            year)
+        lines = ['BEGIN:VTIMEZONE', 'TZID:%s' % settings.TIME_ZONE]
+        for instant, before, after in transitions:
+            lines += _observance(instant, before, after)
+        if not transitions:
+            lines += ['BEGIN:STANDARD', 'DTSTART:19700101T000000',
+                'TZOFFSETFROM:%s' % _offset(offset),
+                'TZOFFSETTO:%s' % _offset(offset), 'END:STANDARD']
+        _timezones[key] = lines + ['END:VTIMEZONE']
+    return _timezones[key]
+
+
+def _first_day(session):
+    #A weekly session starts on its weekday following its creation.
+    day = timezone.localtime(session.creation_date).date()
+    weekday = Weekday.to_date_weekday(session.weekday)
+    return day + timedelta((weekday - day.weekday()) % 7)
+
+
+def _session_event(session, cancellations, domain):
+    tzid = settings.TIME_ZONE
+    lines = ['BEGIN:VEVENT', 'UID:session-%s@%s' % (session.pk, domain),
+        'DTSTAMP:%s' % _utc(session.modification_date),
+        'SUMMARY:%s' % _escape(session.sport.name)]
+    if session.location is not None:
+        lines.append('LOCATION:%s' % _escape(' '.join(part for part in (
+            session.location.name, session.location.address,
+            session.location.city) if part)))
+    if session.weekday is not None:
+        start = _first_day(session)
+        lines += ['DTSTART;TZID=%s:%s' % (tzid, _local(start,
+            session.start_time)), 'DTEND;TZID=%s:%s' % (tzid, _local(start,
+            session.end_time)), 'RRULE:FREQ=WEEKLY;BYDAY=%s' % \
+            ICAL_WEEKDAYS[session.weekday]]
+        exdates = [_local(cancellation.cancellation_date, session.start_time)
+            for cancellation in cancellations if cancellation.cancellation_date\
+            >= start]
+        if exdates:
+            lines.append('EXDATE;TZID=%s:%s' % (tzid, ','.join(exdates)))
+    else:
+        status = 'CANCELLED' if cancellations else 'CONFIRMED'
+        lines += ['DTSTART;TZID=%s:%s' % (tzid, _local(session.date,
+            session.start_time)), 'DTEND;TZID=%s:%s' % (tzid, _local(\
+            session.date, session.end_time)), 'STATUS:%s' % status]
+    return lines + ['END:VEVENT']
+
+
+def _match_event(match, domain):
+    summary = match.name
+    if match.opponent:
+        summary = '%s - %s' % (summary, match.opponent)
+    lines = ['BEGIN:VEVENT', 'UID:match-%s@%s' % (match.pk, domain),
+        'DTSTAMP:%s' % _utc(match.modification_date),
+        'DTSTART:%s' % _utc(match.date),
+        'DTEND:%s' % _utc(match.date + MATCH_DURATION),
+        'SUMMARY:%s' % _escape(summary)]
+    if match.location is not None:
+        lines.append('LOCATION:%s' % _escape(match.location.name))
+    return lines + ['END:VEVENT']
+
+
+def _activity_event(activity, domain):
+    lines = ['BEGIN:VEVENT', 'UID:activity-%s@%s' % (activity.pk, domain),
+        'DTSTAMP:%s' % _utc(activity.modification_date),
+        'DTSTART:%s' % _utc(activity.start_date),
+        'DTEND:%s' % _utc(activity.end_date),
+        'SUMMARY:%s' % _escape(activity.title)]
+    if activity.summary:
+        lines.append('DESCRIPTION:%s' % _escape(activity.summary))
+    if activity.location is not None:
+        lines.append('LOCATION:%s' % _escape(activity.location.name))
+    return lines + ['END:VEVENT']
+
+
+def calendar_lines(domain, sport=None, name=None):
+    """Yield the folded lines of the feed of sport, or of the global feed if
+    sport is None. domain is used to build the UIDs of the events.
+    """
+
+    sessions, cancellations, matches, activities = _querysets(sport)
+    per_session = {}
+    for cancellation in cancellations.order_by('cancellation_date'):
+        per_session.setdefault(cancellation.cancelled_session_id, []).\
+            append(cancellation)
+
+    header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:%s' % PRODID,
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH']
+    if name:
+        header.append('X-WR-CALNAME:%s' % _escape(name))
+    for line in header + _timezone():
+        yield _fold(line)
+    for session in sessions.select_related('sport', 'location').iterator():
+        for line in _session_event(session, per_session.get(session.pk, []),
+                domain):
+            yield _fold(line)
+    for match in matches.select_related('location').iterator():
+        for line in _match_event(match, domain):
+            yield _fold(line)
+    for activity in activities.select_related('location').iterator():
+        for line in _activity_event(activity, domain):
+            yield _fold(line)
+    yield _fold('END:VCALENDAR')
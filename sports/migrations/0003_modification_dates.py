@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sports', '0002_sport_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cancelledsession',
+            name='modification_date',
+            field=models.DateTimeField(verbose_name='modification date', auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='modification_date',
+            field=models.DateTimeField(verbose_name='modification date', auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='modification_date',
+            field=models.DateTimeField(verbose_name='modification date', auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
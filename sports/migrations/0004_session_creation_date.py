@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sports', '0003_modification_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='creation_date',
+            field=models.DateTimeField(verbose_name='creation date', auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
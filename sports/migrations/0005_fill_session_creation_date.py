@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_creation_date(apps, schema_editor):
+    #Weekly sessions were repeated from their last modification: keep the same
+    #first occurrence in the calendars of the subscribers.
+    Session = apps.get_model('sports', 'Session')
+    Session.objects.update(creation_date=models.F('modification_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sports', '0004_session_creation_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_creation_date, migrations.RunPython.noop),
+    ]
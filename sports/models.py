@@ -67,6 +67,8 @@ class Match(models.Model):
         - date: datetime of the beginning of the match.
         - description: string storing the description of the match (Typically
             trip tips, teaser, context of the match...).
+        - modification_date: datetime of the last modification of the match.
+            Not editable.
         - name: string storing the "name" of the match.
         - opponent: string storing the name of the opposing player/team.
         - result: string storing the result of the match.
@@ -83,6 +85,7 @@ class Match(models.Model):
 
     date = models.DateTimeField(_('date'))
     description = models.TextField(_('description'))
+    modification_date = models.DateTimeField(_('modification date'), auto_now=True)
     name = models.CharField(_('name'), max_length=50)
     opponent = models.CharField(_('opponent'), max_length=30, blank=True)
     result = models.CharField(_('result'), max_length=50, blank=True)
@@ -111,8 +114,12 @@ class Session(models.Model):
     A session can be organised weekly but also occasionally.
 
     Attributes:
+        - creation_date: datetime of the creation of the session, from which a
+            weekly session is repeated. Not editable.
         - date: date of the occasional session.
         - end_time: time of the end of the session.
+        - modification_date: datetime of the last modification of the session.
+            Not editable.
         - start_time: time of the beginning of the session.
         - weekday: day of the week of the weekly session.
 
@@ -131,8 +138,10 @@ class Session(models.Model):
         - only a member registered as a manager of the sport can manage the session.
     """
 
+    creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
     date = models.DateField(_('date'), default=None, null=True, blank=True)
     end_time = models.TimeField(_('end time'))
+    modification_date = models.DateTimeField(_('modification date'), auto_now=True)
     start_time = models.TimeField(_('start time'))
     weekday = models.PositiveSmallIntegerField(_('weekday'), choices=Weekday.WEEKDAYS, null=True,
                 blank=True)
@@ -177,6 +186,8 @@ class CancelledSession(models.Model):
         - cancellation_date: date of the cancelled session.
         - description: string storing the description of the cancelled session.
             Typically the reason of the cancellation. Can be None.
+        - modification_date: datetime of the last modification of the cancelled
+            session. Not editable.
         - title: string storing the title of the cancelled session. Typically a
             short description of the reason of cancellation.
 
@@ -192,6 +203,7 @@ class CancelledSession(models.Model):
 
     cancellation_date = models.DateField(_('cancellation date'), default=timezone.now)
     description = models.TextField(_('description'), blank=True)
+    modification_date = models.DateTimeField(_('modification date'), auto_now=True)
     title = models.CharField(_('title'), max_length=50)
 
     cancelled_session = models.ForeignKey(Session,
@@ -0,0 +1,136 @@
+"""Schedule of the sessions of open sports.
+
+Weekly sessions (weekday) and occasional ones (date) are expanded into the
+occurrences of each day, cancelled occurrences being flagged. The occurrences
+of an ISO week are computed with two queries then cached. Writes to sports,
+sessions and cancelled sessions bump a generation number which is part of the
+cache keys, so every cached week is invalidated at once (see signals).
+
+This exports:
+    - Occurrence: named tuple representing a session on a given day.
+    - week_occurrences: return every occurrence of an ISO week.
+    - occurrences: return the occurrences between two dates.
+    - invalidate: invalidate every cached week.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+from collections import namedtuple
+from datetime import (date, timedelta)
+import time
+from management.models import Weekday
+from sports.models import (Session, CancelledSession)
+
+GENERATION_KEY = 'schedule:generation'
+
+#One week of sessions barely changes, writes invalidate it anyway.
+WEEK_TIMEOUT = 7 * 24 * 3600
+
+
+class Occurrence(namedtuple('Occurrence', ['date', 'start_time', 'end_time',
+        'session', 'cancellation'])):
+    """Session taking place on date.
+
+    cancellation is the CancelledSession of this day, None if the session is
+    not cancelled.
+    """
+
+    __slots__ = ()
+
+    @property
+    def sport(self):
+        return self.session.sport
+
+    @property
+    def location(self):
+        return self.session.location
+
+    @property
+    def is_cancelled(self):
+        return self.cancellation is not None
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        #Start from the current time so the weeks cached before the number was
+        #evicted are not used again.
+        cache.add(GENERATION_KEY, int(time.time()), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _monday(year, week):
+    #January 4th is always in the first ISO week.
+    january_4th = date(year, 1, 4)
+    return january_4th + timedelta(weeks=week - 1, days=-january_4th.weekday())
+
+
+def _build_week(monday):
+    sunday = monday + timedelta(6)
+    sessions = Session.objects.filter(sport__is_open=True).\
+        filter(Q(weekday__isnull=False) | Q(date__range=(monday, sunday))).\
+        select_related('sport', 'location').order_by('start_time', 'pk')
+    cancellations = dict(((cancellation.cancelled_session_id,
+        cancellation.cancellation_date), cancellation) for cancellation in \
+        CancelledSession.objects.filter(cancellation_date__range=(monday,
+        sunday)))
+
+    per_weekday = {}
+    per_date = {}
+    for session in sessions:
+        if session.weekday is not None:
+            per_weekday.setdefault(session.weekday, []).append(session)
+        else:
+            per_date.setdefault(session.date, []).append(session)
+
+    week = []
+    for day in (monday + timedelta(offset) for offset in range(7)):
+        day_sessions = per_weekday.get(Weekday.to_django_weekday(day.weekday()),
+            []) + per_date.get(day, [])
+        day_sessions.sort(key=lambda session: (session.start_time, session.pk))
+        week.extend(Occurrence(day, session.start_time, session.end_time,
+            session, cancellations.get((session.pk, day)))
+            for session in day_sessions)
+    return week
+
+
+def week_occurrences(year, week):
+    """Return the list of the occurrences of the ISO week, cancelled ones
+    included, sorted by date and start time.
+    """
+
+    key = 'schedule:%s:%s-W%s' % (_generation(), year, week)
+    occurrences = cache.get(key)
+    if occurrences is None:
+        occurrences = _build_week(_monday(year, week))
+        cache.set(key, occurrences, WEEK_TIMEOUT)
+    return occurrences
+
+
+def occurrences(start_date, end_date, sport=None, cancelled=False):
+    """Return the occurrences from start_date to end_date (both included).
+
+    Only the occurrences of sport are returned if it is given. Cancelled
+    occurrences are left out unless cancelled is True.
+    """
+
+    result = []
+    day = start_date
+    while day <= end_date:
+        year, week, weekday = day.isocalendar()
+        for occurrence in week_occurrences(year, week):
+            if start_date <= occurrence.date <= end_date and \
+                    (cancelled or not occurrence.is_cancelled) and \
+                    (sport is None or occurrence.session.sport_id == sport.pk):
+                result.append(occurrence)
+        day += timedelta(8 - weekday)
+    return result
+
+
+def invalidate():
+    """Invalidate every cached week by bumping the generation number."""
+
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, int(time.time()), None)
@@ -0,0 +1,52 @@
+"""Receivers invalidating the cached schedule of the sessions and the cached
+context of the sport pages.
+"""
+from django.db.models.signals import (post_init, post_save, post_delete,
+                                      m2m_changed)
+from django.dispatch import receiver
+from sports.models import (Sport, Session, CancelledSession, Match)
+from . import (detail, schedule)
+
+
+def invalidate_schedule(sender, **kwargs):
+    schedule.invalidate()
+
+for model in (Sport, Session, CancelledSession):
+    post_save.connect(invalidate_schedule, sender=model)
+    post_delete.connect(invalidate_schedule, sender=model)
+
+
+def _sport_id(instance):
+    if isinstance(instance, Sport):
+        return instance.pk
+    if isinstance(instance, CancelledSession):
+        return Session.objects.filter(pk=instance.cancelled_session_id).\
+            values_list('sport', flat=True).first()
+    return instance.sport_id
+
+
+@receiver(post_init, sender=Session)
+@receiver(post_init, sender=Match)
+def remember_sport(sender, instance, **kwargs):
+    #A session or a match moved to another sport leaves the previous one.
+    instance._loaded_sport_id = instance.sport_id
+
+
+def invalidate_sport(sender, instance, **kwargs):
+    detail.invalidate(_sport_id(instance),
+        getattr(instance, '_loaded_sport_id', None))
+
+for model in (Sport, Session, CancelledSession, Match):
+    post_save.connect(invalidate_sport, sender=model)
+    post_delete.connect(invalidate_sport, sender=model)
+
+
+@receiver(m2m_changed, sender=Sport.managers.through)
+def invalidate_managers(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            detail.invalidate(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        detail.invalidate(*pk_set)
+    elif action == 'pre_clear':
+        detail.invalidate(*instance.managed_sports.values_list('pk', flat=True))
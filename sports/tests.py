@@ -1,3 +1,162 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+from datetime import (date, datetime, time, timedelta)
+from sports import (ical, schedule)
+from management.models import Location
+from sports import detail
+from sports.models import (Sport, Session, CancelledSession, Match)
+from sportassociation.instrumentation import QueryBudgetMixin
+from users.models import CustomUser
 
-#  Create your tests here.
+
+class ScheduleTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.sport = Sport.objects.create(name='Escalade', slug='escalade')
+        #Mondays, in Django weekday format.
+        self.weekly = Session.objects.create(sport=self.sport, weekday=2,
+            start_time=time(18), end_time=time(20))
+        Session.objects.create(sport=self.sport, date=date(2015, 11, 4),
+            start_time=time(14), end_time=time(16))
+        Session.objects.create(sport=Sport.objects.create(name='Judo',
+            slug='judo', is_open=False), weekday=2, start_time=time(12),
+            end_time=time(13))
+
+    def test_sessions_are_expanded(self):
+        occurrences = schedule.occurrences(date(2015, 11, 1), date(2015, 11, 16))
+        self.assertEqual([(occurrence.date, occurrence.start_time)
+            for occurrence in occurrences], [(date(2015, 11, 2), time(18)),
+            (date(2015, 11, 4), time(14)), (date(2015, 11, 9), time(18)),
+            (date(2015, 11, 16), time(18))])
+
+    def test_weeks_are_cached_until_cancellation(self):
+        schedule.occurrences(date(2015, 11, 2), date(2015, 11, 8))
+        with self.assertNumQueries(0):
+            schedule.occurrences(date(2015, 11, 2), date(2015, 11, 8))
+        CancelledSession.objects.create(cancelled_session=self.weekly,
+            cancellation_date=date(2015, 11, 9), title='Gymnase fermé')
+        self.assertEqual(len(schedule.occurrences(date(2015, 11, 9),
+            date(2015, 11, 15))), 0)
+        cancelled = schedule.occurrences(date(2015, 11, 9), date(2015, 11, 15),
+            cancelled=True)
+        self.assertEqual(cancelled[0].cancellation.title, 'Gymnase fermé')
+
+
+class CalendarViewTest(TestCase):
+
+    def setUp(self):
+        self.sport = Sport.objects.create(name='Escalade', slug='escalade')
+        self.session = Session.objects.create(sport=self.sport, weekday=2,
+            start_time=time(18), end_time=time(20))
+        self.url = reverse('sports:calendar', kwargs={'pk':self.sport.pk})
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(getattr(response, 'streaming_content', [])).\
+            decode('utf-8')
+        return response, content
+
+    def test_weekly_session_is_a_recurring_event(self):
+        CancelledSession.objects.create(cancelled_session=self.session,
+            cancellation_date=date(2099, 11, 2), title='Gymnase fermé')
+        response, content = self.get()
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=MO\r\n', content)
+        self.assertIn('EXDATE;TZID=Europe/Paris:20991102T180000\r\n', content)
+
+    def test_series_starts_at_the_creation(self):
+        Session.objects.filter(pk=self.session.pk).update(creation_date=\
+            timezone.now() - timedelta(400))
+        response, first = self.get()
+        session = Session.objects.get(pk=self.session.pk)
+        session.location = Location.objects.create(name='Gymnase')
+        session.save()
+        response, content = self.get()
+        self.assertIn('LOCATION:Gymnase', content)
+        dtstart = [line for line in first.split('\r\n')
+            if line.startswith('DTSTART;')]
+        self.assertEqual(dtstart, [line for line in content.split('\r\n')
+            if line.startswith('DTSTART;')])
+
+    def test_timezone_rules(self):
+        #Last Sunday of October at 3:00 in summer time.
+        self.assertEqual(ical._observance(datetime(2026, 10, 25, 1,
+            tzinfo=timezone.utc), timedelta(hours=2), timedelta(hours=1)),
+            ['BEGIN:STANDARD', 'DTSTART:19701025T030000',
+            'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU', 'TZOFFSETFROM:+0200',
+            'TZOFFSETTO:+0100', 'END:STANDARD'])
+        #Second Sunday of March at 2:00 in winter time.
+        self.assertEqual(ical._observance(datetime(2026, 3, 8, 10,
+            tzinfo=timezone.utc), timedelta(hours=-8), timedelta(hours=-7))[:3],
+            ['BEGIN:DAYLIGHT', 'DTSTART:19700308T020000',
+            'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU'])
+        response, content = self.get()
+        self.assertIn('RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\n', content)
+
+    def test_unchanged_feed_is_not_modified(self):
+        response, content = self.get()
+        etag = response['ETag']
+        response, content = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.session.delete()
+        response, content = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('BEGIN:VEVENT', content)
+
+
+class DetailViewTest(QueryBudgetMixin, TestCase):
+    query_budgets = {'sports:sport': 13}
+
+    def setUp(self):
+        cache.clear()
+        self.sport = Sport.objects.create(name='Escalade', slug='escalade')
+        location = Location.objects.create(name='Gymnase')
+        for index in range(5):
+            manager = CustomUser.objects.create(user=User.objects.create(
+                username='manager%s' % index, first_name='Manager %s' % index),
+                id_photo='protected/users/manager.jpg')
+            self.sport.managers.add(manager)
+            Session.objects.create(sport=self.sport, weekday=index + 1,
+                start_time=time(18), end_time=time(20), location=location,
+                manager=manager)
+        User.objects.create_user('jdoe', 'jdoe@example.com', 'secret')
+        self.client.login(username='jdoe', password='secret')
+        self.url = reverse('sports:sport', kwargs={'pk': self.sport.pk,
+            'slug': 'escalade'})
+
+    def test_page_is_prefetched_then_cached(self):
+        #Session and user of the request, sport, managers, sessions and
+        #matches, 3 weeks of schedule and the photo of the managers, whatever
+        #the number of managers and sessions.
+        self.assertWithinBudget(self.client.get(self.url))
+        self.assertContains(self.client.get(self.url), 'Manager 4')
+        response = self.client.get(self.url)
+        self.assertEqual(response.measures.query_count, 2)
+
+    def test_writes_invalidate_context(self):
+        self.client.get(self.url)
+        Match.objects.create(sport=self.sport, name='Finale',
+            description='', date=timezone.now() + timedelta(7))
+        self.assertContains(self.client.get(self.url), 'Finale')
+
+        self.sport.managers.clear()
+        self.assertNotContains(self.client.get(self.url), 'Manager 4')
+
+        other = Sport.objects.create(name='Judo', slug='judo')
+        detail.get_context(other.pk)
+        match = Match.objects.get()
+        match.sport = other
+        match.save()
+        self.assertNotContains(self.client.get(self.url), 'Finale')
+        self.assertEqual(detail.get_context(other.pk)['matches'], [match])
+
+    def test_started_match_is_not_upcoming(self):
+        match = Match.objects.create(sport=self.sport, name='Finale',
+            description='', date=timezone.now() + timedelta(hours=1))
+        self.assertEqual(detail.get_context(self.sport.pk)['matches'], [match])
+        self.assertEqual(detail.get_context(self.sport.pk,
+            now=timezone.now() + timedelta(hours=2))['matches'], [])
@@ -1,8 +1,11 @@
 from django.conf.urls import include, url
-from .views import (OverviewView, DetailView)
+from .views import (OverviewView, DetailView, CalendarView)
 
 urlpatterns = [
     url(r'^$', OverviewView.as_view(), name='overview'),
+    url(r'^calendar.ics$', CalendarView.as_view(), name='calendar'),
+    url(r'^(?P<pk>[0-9]+)/calendar.ics$', CalendarView.as_view(),
+        name='calendar'),
     url(r'^(?P<pk>[0-9]+)/(?P<slug>[-\w]+)/$', DetailView.as_view(), name='sport'),
     url(r'^(?P<pk>[0-9]+)/$', DetailView.as_view(), name='sport'),
 ]
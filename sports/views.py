@@ -1,10 +1,13 @@
 from django.shortcuts import get_object_or_404, render
 from django.views.generic import (View, ListView)
+from django.views.decorators.http import condition
 from .models import Sport
+from . import (detail, ical, schedule)
+from datetime import timedelta
 from django.core.urlresolvers import reverse
 from django.utils import timezone
 from django.http import (HttpResponseRedirect, HttpResponsePermanentRedirect,
-                        HttpResponse, Http404)
+                        HttpResponse, Http404, StreamingHttpResponse)
 
 class OverviewView(View):
     template_name = 'sports/sport_list.html'
@@ -20,15 +23,42 @@ class OverviewView(View):
 
 class DetailView(View):
     template_name = 'sports/sport.html'
+    schedule_days = 14
 
     def get(self, request, pk, slug=None):
-        sport = get_object_or_404(Sport, pk=pk)
-        content = {'sport':sport}
+        content = detail.get_context(int(pk))
+        if content is None:
+            raise Http404()
+        sport = content['sport']
         if sport.slug != slug:
             return HttpResponsePermanentRedirect(reverse('sports:sport',
                 kwargs={'pk':pk, 'slug':sport.slug}))
+        today = timezone.localtime(timezone.now()).date()
+        content = dict(content, occurrences=schedule.occurrences(today,
+            today + timedelta(self.schedule_days - 1), sport=sport,
+            cancelled=True))
         return render(request, self.template_name, content)
 
     def post(self, request):
         return HttpResponseRedirect(reverse('sports:sport',
             kwargs={'pk':pk, 'slug':sport.slug}))
+
+class CalendarView(View):
+    """iCalendar feed of a sport, or of every sport and activity if no pk is
+    given. Polls get a 304 until the feed changes.
+    """
+
+    def get(self, request, pk=None):
+        sport = get_object_or_404(Sport, pk=pk) if pk is not None else None
+        last_modified, etag = ical.feed_state(sport)
+
+        @condition(etag_func=lambda request: etag,
+            last_modified_func=lambda request: last_modified)
+        def calendar(request):
+            response = StreamingHttpResponse(ical.calendar_lines(\
+                request.get_host(), sport=sport, name=sport.name if sport else\
+                None), content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="%s.ics"' % \
+                (sport.slug if sport else 'calendar')
+            return response
+        return calendar(request)
@@ -30,7 +30,7 @@ class TreasuryOperationAdmin(admin.ModelAdmin):
 
 @admin.register(CashRegister)
 class CashRegisterAdmin(admin.ModelAdmin):
-    list_display = ('name', 'creation_date', 'modification_date',)
+    list_display = ('name', 'balance', 'creation_date', 'modification_date',)
     search_fields = ('name',)
     list_filter = ('creation_date', 'modification_date',)
     ordering = ('-creation_date',)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class TreasuryConfig(AppConfig):
+    name = 'treasury'
+
+    def ready(self):
+        #Connect the receivers keeping the ledger of cash registers in sync.
+        from . import signals
@@ -0,0 +1,204 @@
+"""Ledger of the cash registers.
+
+Every treasury operation, membership and bought item (see Participant) paid to a
+cash register is written as a LedgerEntry by signals. Writing an entry updates
+the balance of the cash register and the snapshots of its day and of the
+following days with F() expressions, so the balance at any moment is a snapshot
+found by index plus the entries of a single day.
+
+Prices are those of the moment of the payment:
+    - a treasury operation brings its amount.
+    - a membership brings the year fee of its type if it expires after the end
+        of the semester it was created in, the semester fee otherwise.
+    - a participant brings the member price of its item if the user was a member
+        when registering (see is_member), the default price otherwise.
+
+This exports:
+    - is_member: return whether memberships cover a moment.
+    - membership_fee: return the amount paid for a membership.
+    - participant_price: return the amount paid by a participant.
+    - record: write or update the entry of an operation.
+    - forget: remove the entry of an operation.
+    - reconcile: recompute every entry, balance and snapshot from scratch.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from decimal import Decimal
+from activities.models import Participant
+from management.models import Membership
+from treasury.models import (CashRegister, TreasuryOperation, LedgerEntry,
+                            BalanceSnapshot)
+from treasury.periods import semester
+
+
+def membership_fee(membership):
+    if membership.membership_type is None:
+        return Decimal(0)
+    start, end = semester(timezone.localtime(membership.creation_date).date())
+    if membership.expiration_date >= end:
+        return membership.membership_type.year_fee
+    return membership.membership_type.semester_fee
+
+
+def is_member(moment, memberships):
+    """Return whether one of memberships, pairs (creation date, expiration date),
+    covers moment. A membership covers the whole local day of its expiration.
+    """
+
+    day = timezone.localtime(moment).date()
+    return any(creation_date <= moment and expiration_date >= day
+        for creation_date, expiration_date in memberships)
+
+
+def participant_price(participant):
+    item = participant.item
+    if participant.registered_user_id is not None and \
+            is_member(participant.creation_date, Membership.objects.filter(
+            member=participant.registered_user_id).values_list(
+            'creation_date', 'expiration_date')):
+        return item.member_price
+    return item.default_price
+
+
+AMOUNTS = {
+    TreasuryOperation: lambda operation: operation.amount,
+    Membership: membership_fee,
+    Participant: participant_price,
+}
+
+
+def _expected(instance):
+    #Tuple (cash register id, amount, date) of the entry of instance, None if
+    #it was not paid to a cash register.
+    if instance.cash_register_id is None:
+        return None
+    return (instance.cash_register_id, Decimal(str(AMOUNTS[type(instance)](\
+        instance))), instance.creation_date)
+
+
+def _apply(cash_register_id, amount, moment):
+    if not amount:
+        return
+    day = timezone.localtime(moment).date()
+    CashRegister.objects.filter(pk=cash_register_id).\
+        update(balance=F('balance') + amount)
+    snapshots = BalanceSnapshot.objects.filter(cash_register=cash_register_id)
+    if not snapshots.filter(date=day).exists():
+        previous = snapshots.filter(date__lt=day).order_by('-date').\
+            values_list('balance', flat=True).first()
+        BalanceSnapshot.objects.get_or_create(cash_register_id=cash_register_id,
+            date=day, defaults={'balance': previous or 0})
+    snapshots.filter(date__gte=day).update(balance=F('balance') + amount)
+
+
+def record(instance):
+    """Write the entry of instance, reverting its previous version if any."""
+
+    expected = _expected(instance)
+    content_type = ContentType.objects.get_for_model(instance)
+    with transaction.atomic():
+        entry = LedgerEntry.objects.select_for_update().filter(\
+            content_type=content_type, object_id=instance.pk).first()
+        if entry is not None:
+            if expected == (entry.cash_register_id, entry.amount, entry.date):
+                return
+            _apply(entry.cash_register_id, -entry.amount, entry.date)
+            if expected is None:
+                entry.delete()
+                return
+        elif expected is None:
+            return
+        else:
+            entry = LedgerEntry(content_type=content_type, object_id=instance.pk)
+        entry.cash_register_id, entry.amount, entry.date = expected
+        entry.save()
+        _apply(entry.cash_register_id, entry.amount, entry.date)
+
+
+def forget(instance):
+    """Remove the entry of instance and revert its amount."""
+
+    content_type = ContentType.objects.get_for_model(instance)
+    with transaction.atomic():
+        entry = LedgerEntry.objects.select_for_update().filter(\
+            content_type=content_type, object_id=instance.pk).first()
+        if entry is not None:
+            _apply(entry.cash_register_id, -entry.amount, entry.date)
+            entry.delete()
+
+
+def _expected_entries():
+    entries = {}
+    for model, related in ((TreasuryOperation, ()),
+            (Membership, ('membership_type',)), (Participant, ('item',))):
+        content_type = ContentType.objects.get_for_model(model)
+        for instance in model.objects.filter(cash_register__isnull=False).\
+                select_related(*related).iterator():
+            entries[(content_type.pk, instance.pk)] = _expected(instance)
+    return entries
+
+
+def _snapshots(entries):
+    totals = {}
+    for cash_register, amount, date in entries:
+        day = timezone.localtime(date).date()
+        totals[(cash_register, day)] = totals.get((cash_register, day), 0) + \
+            amount
+    snapshots = {}
+    balances = {}
+    for cash_register, day in sorted(totals):
+        balances[cash_register] = balances.get(cash_register, 0) + \
+            totals[(cash_register, day)]
+        snapshots[(cash_register, day)] = balances[cash_register]
+    return snapshots, balances
+
+
+def reconcile(dry_run=False):
+    """Recompute the entries, snapshots and balances of every cash register.
+
+    Return a list of (cash register, stored balance, recomputed balance) for
+    the cash registers whose entries, snapshots or balance drifted. They are
+    repaired unless dry_run is True.
+    """
+
+    with transaction.atomic():
+        registers = list(CashRegister.objects.select_for_update())
+        expected = _expected_entries()
+        stored = dict(((content_type, object_id), (cash_register, amount, date))
+            for content_type, object_id, cash_register, amount, date in \
+            LedgerEntry.objects.values_list('content_type', 'object_id',
+            'cash_register', 'amount', 'date'))
+        snapshots, balances = _snapshots(expected.values())
+        stored_snapshots = dict(((cash_register, day), balance)
+            for cash_register, day, balance in BalanceSnapshot.objects.\
+            values_list('cash_register', 'date', 'balance'))
+
+        drifted = set()
+        for key in set(expected) | set(stored):
+            if expected.get(key) != stored.get(key):
+                drifted.update(entry[0] for entry in (expected.get(key),
+                    stored.get(key)) if entry is not None)
+        for key in set(snapshots) | set(stored_snapshots):
+            if snapshots.get(key) != stored_snapshots.get(key):
+                drifted.add(key[0])
+        report = [(register, register.balance, balances.get(register.pk, 0))
+            for register in registers if register.pk in drifted or \
+            register.balance != balances.get(register.pk, 0)]
+
+        if report and not dry_run:
+            LedgerEntry.objects.all().delete()
+            LedgerEntry.objects.bulk_create([LedgerEntry(content_type_id=\
+                content_type, object_id=object_id, cash_register_id=\
+                cash_register, amount=amount, date=date)
+                for (content_type, object_id), (cash_register, amount, date) \
+                in expected.items()])
+            BalanceSnapshot.objects.all().delete()
+            BalanceSnapshot.objects.bulk_create([BalanceSnapshot(\
+                cash_register_id=cash_register, date=day, balance=balance)
+                for (cash_register, day), balance in snapshots.items()])
+            for register, stored_balance, balance in report:
+                CashRegister.objects.filter(pk=register.pk).\
+                    update(balance=balance)
+        return report
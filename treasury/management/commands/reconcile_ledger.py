@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from treasury.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ledger of the cash registers and report any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False,
+            help='Only report the cash registers which drifted.')
+
+    def handle(self, *args, **options):
+        report = reconcile(dry_run=options['dry_run'])
+        for register, stored, balance in report:
+            self.stdout.write('%s: %s stored, %s recomputed.' % (register,
+                stored, balance))
+        self.stdout.write('%s cash register(s) %s.' % (len(report),
+            'out of sync' if options['dry_run'] else 'repaired'))
@@ -0,0 +1,28 @@
+from django.core.management.base import (BaseCommand, CommandError)
+from datetime import (date, datetime)
+from treasury.reports import csv_lines
+
+
+class Command(BaseCommand):
+    help = 'Write the profit and loss of the activities and the membership \
+            income of a fiscal year as CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None,
+            help='Any date of the fiscal year (YYYY-MM-DD), today by default.')
+        parser.add_argument('--output', default=None,
+            help='File to write, the standard output by default.')
+
+    def handle(self, *args, **options):
+        day = date.today()
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date %s.' % options['date'])
+        if options['output'] is None:
+            for line in csv_lines(day):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(csv_lines(day))
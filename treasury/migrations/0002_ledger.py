@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('treasury', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('balance', models.DecimalField(verbose_name='balance', max_digits=10, decimal_places=2)),
+                ('date', models.DateField(verbose_name='date')),
+            ],
+            options={
+                'verbose_name': 'balance snapshot',
+                'verbose_name_plural': 'balance snapshots',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', primary_key=True, serialize=False, auto_created=True)),
+                ('amount', models.DecimalField(verbose_name='amount', max_digits=8, decimal_places=2)),
+                ('date', models.DateTimeField(verbose_name='date')),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'ledger entry',
+                'verbose_name_plural': 'ledger entries',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cashregister',
+            name='balance',
+            field=models.DecimalField(verbose_name='balance', default=0, editable=False, max_digits=10, decimal_places=2),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='cash_register',
+            field=models.ForeignKey(verbose_name='cash register', related_name='ledger_entries', to='treasury.CashRegister'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='content_type',
+            field=models.ForeignKey(to='contenttypes.ContentType'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='cash_register',
+            field=models.ForeignKey(verbose_name='cash register', related_name='snapshots', to='treasury.CashRegister'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ledgerentry',
+            unique_together=set([('content_type', 'object_id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='ledgerentry',
+            index_together=set([('cash_register', 'date')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='balancesnapshot',
+            unique_together=set([('cash_register', 'date')]),
+        ),
+    ]
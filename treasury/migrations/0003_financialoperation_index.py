@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('treasury', '0002_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='financialoperation',
+            index_together=set([('processed_date', 'amount')]),
+        ),
+    ]
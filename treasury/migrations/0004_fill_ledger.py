@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.utils import timezone
+from decimal import Decimal
+from treasury.periods import semester
+
+
+def _local_date(moment):
+    return timezone.localtime(moment).date() if timezone.is_aware(moment) \
+        else moment.date()
+
+
+def _membership_fee(membership):
+    #Same prices as treasury.ledger.membership_fee.
+    if membership.membership_type is None:
+        return Decimal(0)
+    start, end = semester(_local_date(membership.creation_date))
+    if membership.expiration_date >= end:
+        return membership.membership_type.year_fee
+    return membership.membership_type.semester_fee
+
+
+def fill_ledger(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    CashRegister = apps.get_model('treasury', 'CashRegister')
+    TreasuryOperation = apps.get_model('treasury', 'TreasuryOperation')
+    LedgerEntry = apps.get_model('treasury', 'LedgerEntry')
+    BalanceSnapshot = apps.get_model('treasury', 'BalanceSnapshot')
+    Membership = apps.get_model('management', 'Membership')
+    Participant = apps.get_model('activities', 'Participant')
+    #A ledger already written is checked by reconcile_ledger instead.
+    if LedgerEntry.objects.exists():
+        return
+
+    memberships = {}
+    for member, creation_date, expiration_date in Membership.objects.\
+            values_list('member', 'creation_date', 'expiration_date'):
+        memberships.setdefault(member, []).append((creation_date,
+            expiration_date))
+
+    def participant_price(participant):
+        #Same prices as treasury.ledger.participant_price.
+        day = _local_date(participant.creation_date)
+        if any(creation_date <= participant.creation_date and \
+                expiration_date >= day for creation_date, expiration_date in \
+                memberships.get(participant.registered_user_id, ())):
+            return participant.item.member_price
+        return participant.item.default_price
+
+    entries = []
+    for model, related, amount in (
+            (TreasuryOperation, (), lambda operation: operation.amount),
+            (Membership, ('membership_type',), _membership_fee),
+            (Participant, ('item',), participant_price)):
+        instances = model.objects.filter(cash_register__isnull=False).\
+            select_related(*related)
+        if not instances.exists():
+            continue
+        content_type, created = ContentType.objects.get_or_create(
+            app_label=model._meta.app_label, model=model._meta.model_name)
+        entries.extend(LedgerEntry(content_type_id=content_type.pk,
+            object_id=instance.pk, cash_register_id=instance.cash_register_id,
+            amount=Decimal(str(amount(instance))), date=instance.creation_date)
+            for instance in instances.iterator())
+    LedgerEntry.objects.bulk_create(entries, batch_size=500)
+
+    totals = {}
+    for entry in entries:
+        key = (entry.cash_register_id, _local_date(entry.date))
+        totals[key] = totals.get(key, 0) + entry.amount
+    balances = {}
+    snapshots = []
+    for cash_register, day in sorted(totals):
+        balances[cash_register] = balances.get(cash_register, 0) + \
+            totals[(cash_register, day)]
+        snapshots.append(BalanceSnapshot(cash_register_id=cash_register,
+            date=day, balance=balances[cash_register]))
+    BalanceSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    for cash_register, balance in balances.items():
+        CashRegister.objects.filter(pk=cash_register).update(balance=balance)
+
+
+class Migration(migrations.Migration):
+    #The ledger of the operations saved before upgrading is written once, in
+    #its own migration.
+
+    dependencies = [
+        ('treasury', '0003_financialoperation_index'),
+        ('management', '0005_blobs'),
+        ('activities', '0003_bought_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_ledger, migrations.RunPython.noop),
+    ]
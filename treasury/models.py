@@ -1,10 +1,66 @@
+"""Classes related to the treasury of the association.
+
+This exports:
+    - FinancialOperationQuerySet: class of the querysets of financial operations.
+    - FinancialOperation: class representing fees and subventions.
+    - CashRegister: class representing a cash register.
+    - TreasuryOperation: class representing a transfer of money on a cash
+        register.
+    - LedgerEntry: class representing money entering or leaving a cash register.
+    - BalanceSnapshot: class representing the balance of a cash register at the
+        end of a day.
+"""
 from django.db import models
+from django.db.models import (Case, When, Sum, Value, DecimalField)
 from django.utils.translation import ugettext as _
+from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.contrib.contenttypes.fields import GenericRelation
+from django.contrib.contenttypes.fields import (GenericForeignKey,
+                                                GenericRelation)
+from django.contrib.contenttypes.models import ContentType
+from datetime import (datetime, time)
 from users.models import CustomUser
 
 
+class FinancialOperationQuerySet(models.QuerySet):
+    """QuerySet of financial operations.
+
+    Methods:
+        - fees: return the financial operations with a negative amount.
+        - subventions: return the financial operations with a positive amount.
+        - unprocessed: return the financial operations not paid back or received
+            yet.
+        - by_period: return the financial operations processed from a start date
+            (included) to an end date (excluded).
+        - totals: return a dict of the sums of the fees, of the subventions and
+            of both (balance) computed by a single query.
+    """
+
+    def fees(self):
+        return self.filter(amount__lt=0)
+
+    def subventions(self):
+        return self.filter(amount__gt=0)
+
+    def unprocessed(self):
+        return self.filter(processed_date__isnull=True)
+
+    def by_period(self, start_date, end_date):
+        return self.filter(processed_date__gte=start_date,
+            processed_date__lt=end_date)
+
+    def totals(self):
+        zero = Value(0, output_field=DecimalField())
+        totals = self.order_by().aggregate(
+            fees=Sum(Case(When(amount__lt=0, then='amount'), default=zero,
+                output_field=DecimalField())),
+            subventions=Sum(Case(When(amount__gt=0, then='amount'),
+                default=zero, output_field=DecimalField())))
+        totals = dict((key, value or 0) for key, value in totals.items())
+        totals['balance'] = totals['fees'] + totals['subventions']
+        return totals
+
+
 class FinancialOperation(models.Model):
     """Model representing fees and subventions.
 
@@ -47,6 +103,9 @@ class FinancialOperation(models.Model):
 
     Ordering by DESCending creation_date.
 
+    Indexed together: processed_date and amount, for the queryset methods of
+    FinancialOperationQuerySet.
+
     Clean:
         - one of unregistered_user and registered_user has to be set.
         - unregistered_user and registered_user cannot both be set.
@@ -66,16 +125,19 @@ class FinancialOperation(models.Model):
     related_activity = models.ForeignKey('activities.Activity', null=True,
                         related_name='financial_operations', blank=True, verbose_name=_('related activity'))
 
+    objects = FinancialOperationQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('financial operation')
         verbose_name_plural = _('financial operations')
         ordering = ['-creation_date']
+        index_together = (('processed_date', 'amount'),)
 
     def is_fee(self):
-        return amount < 0
+        return self.amount < 0
 
     def is_subvention(self):
-        return amount > 0
+        return self.amount > 0
 
     def clean(self):
         if not self.unregistered_user and self.registered_user is None:
@@ -91,7 +153,12 @@ class FinancialOperation(models.Model):
 class CashRegister(models.Model):
     """Cash register used to monitor finances.
 
+    The balance is kept up to date by the ledger (see treasury.ledger), the
+    balance at any moment is read from the daily snapshots.
+
     Attributes:
+        - balance: float storing the current balance of the cash register. Not
+            editable.
         - creation_date: datetime of the creation of the cash register.
             Not editable.
         - modification_date: datetime of the last modification of the cash
@@ -101,13 +168,21 @@ class CashRegister(models.Model):
     Relationships with other models:
         - bought_items: several bought items (see Participant) associated to this
             cash register.
+        - ledger_entries: several entries of money in or out of this cash
+            register.
         - memberships: several memberships associated to this cash register.
+        - snapshots: several balances of this cash register at the end of a day.
         - treasury_operations: several treasury operations related to this cash
             register.
 
     Ordering by ASCending creation_date.
+
+    Methods:
+        - balance_at: return the balance at a given datetime.
     """
 
+    balance = models.DecimalField(_('balance'), max_digits=10, decimal_places=2,
+                default=0, editable=False)
     creation_date = models.DateTimeField(_('creation date'), auto_now_add=True)
     modification_date = models.DateTimeField(_('modification date'), auto_now=True)
     name = models.CharField(_('name'), max_length=50)
@@ -117,6 +192,18 @@ class CashRegister(models.Model):
         verbose_name_plural = _('cash registers')
         ordering = ['creation_date']
 
+    def balance_at(self, moment):
+        #The snapshot of the previous day is found with the unique index, only
+        #the entries of the day of moment are summed.
+        day = timezone.localtime(moment).date()
+        snapshot = self.snapshots.filter(date__lt=day).order_by('-date').\
+            values_list('balance', flat=True).first()
+        start = timezone.make_aware(datetime.combine(day, time()),
+            timezone.get_current_timezone())
+        today = self.ledger_entries.filter(date__gte=start, date__lte=moment).\
+            aggregate(models.Sum('amount'))['amount__sum']
+        return (snapshot or 0) + (today or 0)
+
     def __str__(self):
         return '%s' % (self.name)
 
@@ -164,3 +251,75 @@ class TreasuryOperation(models.Model):
 
     def __str__(self):
         return '%s (%s)' % (self.name, str(self.creation_date))
+
+
+class LedgerEntry(models.Model):
+    """Money entering or leaving a cash register.
+
+    An entry is written by the ledger for each treasury operation, membership and
+    bought item (see Participant) associated to a cash register. The amount is
+    stored so that the entry can be reverted even if prices changed since.
+
+    Attributes:
+        - amount: float representing the amount of money added to (positive) or
+            taken from (negative) the cash register.
+        - date: datetime of the operation.
+
+    Relationships with other models:
+        - cash_register: cash register associated to this entry.
+        - source: treasury operation, membership or participant which produced
+            this entry.
+
+    Ordering by ASCending date.
+    """
+
+    amount = models.DecimalField(_('amount'), max_digits=8, decimal_places=2)
+    date = models.DateTimeField(_('date'))
+    object_id = models.PositiveIntegerField()
+
+    cash_register = models.ForeignKey(CashRegister, related_name='ledger_entries',
+                    verbose_name=_('cash register'))
+    content_type = models.ForeignKey(ContentType)
+    source = GenericForeignKey('content_type', 'object_id')
+
+    class Meta:
+        verbose_name = _('ledger entry')
+        verbose_name_plural = _('ledger entries')
+        ordering = ['date']
+        unique_together = ('content_type', 'object_id')
+        index_together = ('cash_register', 'date')
+
+    def __str__(self):
+        return '%s (%s)' % (str(self.amount), str(self.date))
+
+
+class BalanceSnapshot(models.Model):
+    """Balance of a cash register at the end of a day.
+
+    A snapshot is created for each day with ledger entries, and updated when
+    entries of this day or of a previous day are written.
+
+    Attributes:
+        - balance: float storing the balance at the end of the day.
+        - date: date of the day.
+
+    Relationships with other models:
+        - cash_register: cash register associated to this snapshot.
+
+    Ordering by DESCending date.
+    """
+
+    balance = models.DecimalField(_('balance'), max_digits=10, decimal_places=2)
+    date = models.DateField(_('date'))
+
+    cash_register = models.ForeignKey(CashRegister, related_name='snapshots',
+                    verbose_name=_('cash register'))
+
+    class Meta:
+        verbose_name = _('balance snapshot')
+        verbose_name_plural = _('balance snapshots')
+        ordering = ['-date']
+        unique_together = ('cash_register', 'date')
+
+    def __str__(self):
+        return '%s (%s)' % (str(self.cash_register), str(self.date))
@@ -0,0 +1,36 @@
+"""Fiscal periods of the association.
+
+The fiscal year begins on the first day of FISCAL_YEAR_START_MONTH and is split
+in two semesters of six months. Periods are half-open: start included, end
+excluded.
+
+This exports:
+    - fiscal_year: return the bounds of the fiscal year of a date.
+    - semester: return the bounds of the semester of a date.
+"""
+from datetime import date
+from sportassociation import settings
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def fiscal_year(day):
+    """Return (start, end) of the fiscal year containing day."""
+
+    start_month = settings.FISCAL_YEAR_START_MONTH
+    year = day.year if day.month >= start_month else day.year - 1
+    start = date(year, start_month, 1)
+    return (start, _add_months(start, 12))
+
+
+def semester(day):
+    """Return (start, end) of the semester containing day."""
+
+    start, end = fiscal_year(day)
+    middle = _add_months(start, 6)
+    if day < middle:
+        return (start, middle)
+    return (middle, end)
@@ -0,0 +1,189 @@
+"""Financial reports of the association.
+
+Reports are computed by the database with conditional aggregation:
+    - the profit and loss of the activities of a period costs one query for the
+        fees and subventions, one per level of parameters, one for the
+        participants and one for the memberships of their users. Prices are
+        those of the ledger (see treasury.ledger.is_member), the ledger itself
+        being read for cross-checking only.
+    - the income of each membership type for both semesters of a fiscal year
+        costs one query, fees following the same rule as the ledger.
+    - the fees and subventions processed during a fiscal year cost one query
+        (see FinancialOperationQuerySet).
+
+This exports:
+    - ActivityReport: class representing the profit and loss of an activity.
+    - activity_reports: return the reports of the activities of a period.
+    - membership_income: return the income of each membership type.
+    - csv_lines: yield the CSV lines of the reports of a fiscal year.
+"""
+from django.db.models import (Case, When, Sum, F, Q, Value, DecimalField,
+                              IntegerField)
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+from datetime import (datetime, time)
+from decimal import Decimal
+import csv
+from activities.export import Echo
+from activities.models import (Activity, Parameter, Participant)
+from management.models import (Membership, MembershipType)
+from treasury.ledger import is_member
+from treasury.models import FinancialOperation
+from treasury.periods import (fiscal_year, semester)
+
+ZERO = Value(0, output_field=DecimalField())
+
+
+class ActivityReport(object):
+    """Profit and loss of an activity.
+
+    Attributes:
+        - activity: activity of the report.
+        - costs: float storing the sum of the fees, negative.
+        - participants: integer storing the number of participants.
+        - recorded: float storing the payments of the participants written in
+            the ledger, only those paid to a cash register.
+        - revenue: float storing the prices paid by the participants.
+        - subventions: float storing the sum of the subventions.
+    """
+
+    def __init__(self, activity, revenue, participants, recorded=Decimal(0)):
+        self.activity = activity
+        self.revenue = revenue
+        self.participants = participants
+        self.recorded = recorded
+        self.subventions = activity.subventions or Decimal(0)
+        self.costs = activity.costs or Decimal(0)
+
+    @property
+    def margin(self):
+        return self.revenue + self.subventions + self.costs
+
+    def __repr__(self):
+        return '<Report of %s>' % (self.activity)
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time()),
+        timezone.get_current_timezone())
+
+
+def _activities_of_parameters(period):
+    #Subcategories are walked level by level, one query per level, as in
+    #activities.export.participants_of.
+    activities = dict(Parameter.objects.filter(activity__in=period).\
+        values_list('pk', 'activity'))
+    level = list(activities)
+    while level:
+        children = Parameter.objects.filter(parent_parameter__in=level).\
+            values_list('pk', 'parent_parameter')
+        level = []
+        for pk, parent in children:
+            if pk not in activities:
+                activities[pk] = activities[parent]
+                level.append(pk)
+    return activities
+
+
+def activity_reports(start_date, end_date):
+    """Return the ActivityReport of the activities starting from start_date
+    (included) to end_date (excluded), ordered by start date.
+    """
+
+    period = Activity.objects.filter(start_date__gte=_aware(start_date),
+        start_date__lt=_aware(end_date))
+    activities = period.annotate(
+        subventions=Sum(Case(When(financial_operations__amount__gt=0,
+            then=F('financial_operations__amount')), default=ZERO,
+            output_field=DecimalField())),
+        costs=Sum(Case(When(financial_operations__amount__lt=0,
+            then=F('financial_operations__amount')), default=ZERO,
+            output_field=DecimalField()))).order_by('start_date', 'pk')
+
+    parameters = _activities_of_parameters(period.values('pk'))
+    participants = Participant.objects.filter(
+        item__parameter__in=list(parameters))
+    memberships = {}
+    for member, creation_date, expiration_date in Membership.objects.filter(
+            member__in=participants.values('registered_user')).values_list(
+            'member', 'creation_date', 'expiration_date'):
+        memberships.setdefault(member, []).append((creation_date,
+            expiration_date))
+
+    payments = {}
+    for pk, parameter, user, creation_date, member_price, default_price, \
+            recorded in participants.values_list('pk', 'item__parameter',
+            'registered_user', 'creation_date', 'item__member_price',
+            'item__default_price').annotate(
+            recorded=Sum('ledger_entries__amount')).order_by():
+        revenue, count, total = payments.get(parameters[parameter],
+            (Decimal(0), 0, Decimal(0)))
+        if is_member(creation_date, memberships.get(user, ())):
+            revenue += member_price
+        else:
+            revenue += default_price
+        payments[parameters[parameter]] = (revenue, count + 1,
+            total + (recorded or 0))
+    return [ActivityReport(activity, *payments.get(activity.pk,
+        (Decimal(0), 0, Decimal(0)))) for activity in activities]
+
+
+def _semester_fee(start, end):
+    #A membership created during the semester pays the year fee if it expires
+    #after the end of the semester.
+    created = Q(memberships__creation_date__gte=_aware(start),
+        memberships__creation_date__lt=_aware(end))
+    return Sum(Case(
+        When(created & Q(memberships__expiration_date__gte=end),
+            then=F('year_fee')),
+        When(created, then=F('semester_fee')),
+        default=ZERO, output_field=DecimalField()))
+
+
+def _semester_count(start, end):
+    return Sum(Case(When(memberships__creation_date__gte=_aware(start),
+        memberships__creation_date__lt=_aware(end), then=Value(1)),
+        default=Value(0), output_field=IntegerField()))
+
+
+def membership_income(day):
+    """Return the membership types annotated with the memberships created and
+    the fees received in both semesters of the fiscal year of day:
+    first_semester_count, first_semester_income, second_semester_count and
+    second_semester_income.
+    """
+
+    start, end = fiscal_year(day)
+    middle = semester(start)[1]
+    return list(MembershipType.objects.annotate(
+        first_semester_count=_semester_count(start, middle),
+        first_semester_income=_semester_fee(start, middle),
+        second_semester_count=_semester_count(middle, end),
+        second_semester_income=_semester_fee(middle, end)).order_by('title'))
+
+
+def csv_lines(day):
+    """Yield the CSV lines of the reports of the fiscal year of day."""
+
+    writer = csv.writer(Echo())
+    start, end = fiscal_year(day)
+    yield writer.writerow((_('activity'), _('start date'), _('participants'),
+        _('revenue'), _('subventions'), _('costs'), _('margin')))
+    for report in activity_reports(start, end):
+        yield writer.writerow((report.activity.title,
+            report.activity.start_date.date().isoformat(), report.participants,
+            report.revenue, report.subventions, report.costs, report.margin))
+    yield writer.writerow(())
+    yield writer.writerow((_('membership type'), _('first semester'),
+        _('income'), _('second semester'), _('income')))
+    for membership_type in membership_income(day):
+        yield writer.writerow((membership_type.title,
+            membership_type.first_semester_count,
+            membership_type.first_semester_income or 0,
+            membership_type.second_semester_count,
+            membership_type.second_semester_income or 0))
+    totals = FinancialOperation.objects.by_period(start, end).totals()
+    yield writer.writerow(())
+    yield writer.writerow((_('fees'), _('subventions'), _('balance')))
+    yield writer.writerow((totals['fees'], totals['subventions'],
+        totals['balance']))
@@ -0,0 +1,18 @@
+"""Receivers writing the ledger entries of the cash registers."""
+from django.db.models.signals import (post_save, pre_delete)
+from . import ledger
+
+
+def record_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ledger.record(instance)
+
+
+def forget_entry(sender, instance, **kwargs):
+    ledger.forget(instance)
+
+#Entries are forgotten before the deletion, which removes the entries of a
+#participant along with it.
+for model in ledger.AMOUNTS:
+    post_save.connect(record_entry, sender=model)
+    pre_delete.connect(forget_entry, sender=model)
@@ -1,3 +1,254 @@
 from django.test import TestCase
+from django.apps import apps as global_apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import (date, datetime, timedelta)
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from activities.models import (Activity, Item, Parameter, Participant)
+from activities.registration import register
+from management.models import (Membership, MembershipType, CASH)
+from treasury import ledger
+from treasury.models import (CashRegister, FinancialOperation,
+                            TreasuryOperation, LedgerEntry, BalanceSnapshot)
+from treasury.reports import (activity_reports, membership_income)
+from users.models import CustomUser
 
-#  Create your tests here.
+
+class LedgerTest(TestCase):
+
+    def setUp(self):
+        self.register = CashRegister.objects.create(name='Caisse')
+
+    def balance(self):
+        return CashRegister.objects.get(pk=self.register.pk).balance
+
+    def test_operations_update_balance(self):
+        operation = TreasuryOperation.objects.create(name='Fond de caisse',
+            amount=Decimal('100.00'), cash_register=self.register)
+        TreasuryOperation.objects.create(name='Dépôt', amount=Decimal('-40.00'),
+            cash_register=self.register)
+        self.assertEqual(self.balance(), Decimal('60.00'))
+        operation.amount = Decimal('120.00')
+        operation.save()
+        self.assertEqual(self.balance(), Decimal('80.00'))
+        operation.delete()
+        self.assertEqual(self.balance(), Decimal('-40.00'))
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+    def test_membership_pays_its_fee(self):
+        member = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        membership_type = MembershipType.objects.create(title='Étudiant',
+            description='', semester_fee=Decimal('15'), year_fee=Decimal('25'))
+        Membership.objects.create(member=member, membership_type=membership_type,
+            certificate_date=date.today(), payment_mean=CASH,
+            membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date.today() + timedelta(400),
+            cash_register=self.register)
+        self.assertEqual(self.balance(), Decimal('25'))
+
+    def test_balance_at_a_moment(self):
+        operation = TreasuryOperation.objects.create(name='Fond de caisse',
+            amount=Decimal('100.00'), cash_register=self.register)
+        yesterday = timezone.now() - timedelta(1)
+        #Back-dated operation, the snapshots of the following days include it.
+        TreasuryOperation.objects.filter(pk=operation.pk).update(
+            creation_date=yesterday)
+        operation.refresh_from_db()
+        operation.save()
+        TreasuryOperation.objects.create(name='Recette', amount=Decimal('5'),
+            cash_register=self.register)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.register.balance_at(yesterday), Decimal('100'))
+        self.assertEqual(self.register.balance_at(yesterday - timedelta(1)), 0)
+        self.assertEqual(self.register.balance_at(timezone.now()),
+            Decimal('105'))
+
+    def test_reconcile_command(self):
+        TreasuryOperation.objects.create(name='Fond de caisse',
+            amount=Decimal('100.00'), cash_register=self.register)
+        CashRegister.objects.update(balance=0)
+        LedgerEntry.objects.all().delete()
+        output = StringIO()
+        call_command('reconcile_ledger', stdout=output)
+        self.assertIn('1 cash register(s) repaired', output.getvalue())
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        output = StringIO()
+        call_command('reconcile_ledger', '--dry-run', stdout=output)
+        self.assertIn('0 cash register(s) out of sync', output.getvalue())
+
+    def test_migration_fills_the_ledger(self):
+        fill = import_module('treasury.migrations.0004_fill_ledger').fill_ledger
+        member = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        Membership.objects.create(member=member, certificate_date=date.today(),
+            payment_mean=CASH, membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date.today() + timedelta(400),
+            membership_type=MembershipType.objects.create(title='Étudiant',
+            description='', semester_fee=Decimal('15'), year_fee=Decimal('25')),
+            cash_register=self.register)
+        activity = Activity.objects.create(title='Sortie', slug='sortie',
+            content='', start_date=timezone.now(), end_date=timezone.now())
+        item = Item.objects.create(name='Forfait', member_price=Decimal('10'),
+            default_price=Decimal('20'), parameter=Parameter.objects.create(
+            name='Inscription', activity=activity))
+        register(item, [Participant(registered_user=member, payment_mean=CASH,
+            cash_register=self.register), Participant(unregistered_user='Paul',
+            payment_mean=CASH, cash_register=self.register)])
+        self.assertEqual(self.balance(), Decimal('55'))
+        LedgerEntry.objects.all().delete()
+        BalanceSnapshot.objects.all().delete()
+        CashRegister.objects.update(balance=0)
+        fill(global_apps, None)
+        self.assertEqual(self.balance(), Decimal('55'))
+        self.assertEqual(ledger.reconcile(dry_run=True), [])
+
+
+class ReportsTest(TestCase):
+
+    def setUp(self):
+        self.register = CashRegister.objects.create(name='Caisse')
+        start = timezone.make_aware(datetime(2015, 10, 1, 10),
+            timezone.get_current_timezone())
+        for index in range(200):
+            activity = Activity.objects.create(title='Sortie %s' % index,
+                slug='sortie', content='', start_date=start + timedelta(index),
+                end_date=start + timedelta(index))
+            FinancialOperation.objects.create(name='Bus', amount=Decimal('-50'),
+                description='', unregistered_user='Transports',
+                related_activity=activity)
+            FinancialOperation.objects.create(name='Mairie',
+                amount=Decimal('20'), description='',
+                unregistered_user='Mairie', related_activity=activity)
+        parameter = Parameter.objects.create(name='Place', activity=activity)
+        item = Item.objects.create(name='Place', parameter=parameter,
+            default_price=Decimal('12'))
+        register(item, [Participant(unregistered_user='Jean', payment_mean=CASH,
+            cash_register=self.register) for index in range(3)])
+
+    def test_activity_reports_queries(self):
+        #Activities, two levels of parameters, participants and memberships.
+        with self.assertNumQueries(5):
+            reports = activity_reports(date(2015, 9, 1), date(2016, 9, 1))
+        self.assertEqual(len(reports), 200)
+        self.assertEqual((reports[0].revenue, reports[0].margin),
+            (0, Decimal('-30')))
+        self.assertEqual((reports[-1].participants, reports[-1].revenue,
+            reports[-1].margin), (3, Decimal('36'), Decimal('6')))
+
+    def test_revenue_does_not_depend_on_the_ledger(self):
+        member = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        Membership.objects.create(member=member, certificate_date=date.today(),
+            payment_mean=CASH, membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date.today() + timedelta(30))
+        Membership.objects.create(member=member, certificate_date=date.today(),
+            payment_mean=CASH, membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date.today() + timedelta(60))
+        activity = Activity.objects.create(title='Tournoi', slug='tournoi',
+            content='', start_date=timezone.now(), end_date=timezone.now())
+        parameter = Parameter.objects.create(name='Inscription',
+            activity=activity)
+        #The activity is found through any depth of subcategories.
+        item = Item.objects.create(name='Simple', default_price=Decimal('8'),
+            member_price=Decimal('5'), parameter=Parameter.objects.create(
+            name='Série', parent_parameter=Parameter.objects.create(
+            name='Tableau', parent_parameter=parameter)))
+        register(item, [Participant(registered_user=member, payment_mean=CASH,
+            cash_register=self.register), Participant(unregistered_user='Paul',
+            payment_mean=CASH, cash_register=self.register)])
+        #The ledger is behind, a cash register was removed.
+        LedgerEntry.objects.all().delete()
+        Participant.objects.filter(registered_user=member).\
+            update(cash_register=None)
+        report, = activity_reports(date.today(), date.today() + timedelta(1))
+        self.assertEqual((report.participants, report.revenue, report.recorded),
+            (2, Decimal('13'), 0))
+
+    def test_member_price_follows_the_ledger(self):
+        member = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        membership = Membership.objects.create(member=member,
+            certificate_date=date(2016, 1, 1), payment_mean=CASH,
+            membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date(2016, 6, 30))
+        Membership.objects.filter(pk=membership.pk).update(
+            creation_date=timezone.now() - timedelta(10000))
+        activity = Activity.objects.create(title='Tournoi', slug='tournoi',
+            content='', start_date=timezone.now(), end_date=timezone.now())
+        item = Item.objects.create(name='Simple', default_price=Decimal('8'),
+            member_price=Decimal('5'), parameter=Parameter.objects.create(
+            name='Inscription', activity=activity))
+        participant, = register(item, [Participant(registered_user=member,
+            payment_mean=CASH, cash_register=self.register)])
+        with timezone.override(timezone.get_fixed_timezone(120)):
+            #The day after the expiration in local time, not in UTC.
+            Participant.objects.filter(pk=participant.pk).update(
+                creation_date=timezone.make_aware(datetime(2016, 7, 1, 1, 30),
+                timezone.get_current_timezone()))
+            participant = Participant.objects.get(pk=participant.pk)
+            report, = activity_reports(date.today(),
+                date.today() + timedelta(1))
+            self.assertEqual(ledger.participant_price(participant),
+                Decimal('8'))
+            self.assertEqual(report.revenue, Decimal('8'))
+
+    def test_membership_income_per_semester(self):
+        membership_type = MembershipType.objects.create(title='Étudiant',
+            description='', semester_fee=Decimal('15'), year_fee=Decimal('25'))
+        member = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+        for created, expiration in (((2015, 10, 1), (2016, 8, 31)),
+                ((2015, 10, 2), (2016, 2, 1)), ((2016, 3, 1), (2016, 8, 31))):
+            membership = Membership.objects.create(member=member,
+                membership_type=membership_type, certificate_date=date(*created),
+                payment_mean=CASH, membership_copy='admin/memberships/jdoe.jpg',
+                expiration_date=date(*expiration))
+            Membership.objects.filter(pk=membership.pk).update(creation_date=\
+                timezone.make_aware(datetime(*created), timezone.utc))
+        with self.assertNumQueries(1):
+            income, = membership_income(date(2016, 1, 1))
+        self.assertEqual((income.first_semester_count,
+            income.first_semester_income, income.second_semester_count,
+            income.second_semester_income), (2, Decimal('40'), 1, Decimal('15')))
+
+
+class FinancialOperationQuerySetTest(TestCase):
+
+    def setUp(self):
+        for amount, processed_date in (('-30', date(2015, 10, 1)),
+                ('-20', None), ('100', date(2016, 2, 1)),
+                ('50', date(2016, 10, 1))):
+            FinancialOperation.objects.create(name='Opération',
+                amount=Decimal(amount), description='', unregistered_user='BDE',
+                processed_date=processed_date)
+
+    def test_instance_methods(self):
+        operation = FinancialOperation.objects.fees().first()
+        self.assertTrue(operation.is_fee())
+        self.assertFalse(operation.is_subvention())
+
+    def test_filters(self):
+        operations = FinancialOperation.objects
+        self.assertEqual(operations.fees().count(), 2)
+        self.assertEqual(operations.subventions().count(), 2)
+        self.assertEqual(operations.unprocessed().get().amount, Decimal('-20'))
+        self.assertEqual(operations.by_period(date(2015, 9, 1),
+            date(2016, 9, 1)).subventions().get().amount, Decimal('100'))
+
+    def test_totals_cost_one_query(self):
+        with self.assertNumQueries(1):
+            totals = FinancialOperation.objects.by_period(date(2015, 9, 1),
+                date(2016, 9, 1)).totals()
+        self.assertEqual(totals, {'fees': Decimal('-30'),
+            'subventions': Decimal('100'), 'balance': Decimal('70')})
+        self.assertEqual(FinancialOperation.objects.none().totals(),
+            {'fees': 0, 'subventions': 0, 'balance': 0})
@@ -0,0 +1,211 @@
+"""Rendering of member cards.
+
+The card template and the fonts are loaded once per process and the size of
+each text is found by a binary search. Cards are rendered in a pool of processes,
+created once per web process and replaced when a worker crashed, or in the
+process itself for small selections, and laid out on the pages of a single PDF. Members without a readable id photo
+get a placeholder instead.
+
+This exports:
+    - CARD_TEMPLATE: path of the PNG template of the card.
+    - CARD_FONT: name of the TrueType font used on the card.
+
+    - Card: named tuple with the information printed on a card.
+    - CardRenderer: class rendering cards with cached assets.
+    - cards_for: return the cards of the current members of a queryset.
+    - render_cards: return a PDF with the given cards.
+"""
+from PIL import Image, ImageDraw, ImageFont
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from sportassociation import settings
+
+CARD_TEMPLATE = 'static/member_card.png'
+CARD_FONT = 'DroidSansMono.ttf'
+
+#Selections smaller than this are rendered without the pool of processes.
+SERIAL_CARDS = 16
+
+PLACEHOLDER_COLOR = (220, 220, 220)
+
+#A4 page at 300 dpi.
+PAGE_SIZE = (2480, 3508)
+PAGE_MARGIN = 60
+
+Card = namedtuple('Card', ['expiration_date', 'id', 'first_name', 'last_name',
+                            'id_photo'])
+
+
+class CardRenderer(object):
+    """Render member cards.
+
+    Attributes:
+        - template: image of the card template, loaded once.
+    """
+
+    width = 900
+    height = 570
+    header_height = 120.0
+    interspace = 27.0
+    big_width = 210.0
+    diff_big_small_width = 18.0
+    info_height = 69
+    max_font_size = 45
+    color1 = (52,152,219)
+    id_ratio = 45/35
+
+    def __init__(self, template=CARD_TEMPLATE, font=CARD_FONT):
+        self.template = Image.open(template)
+        self.template.load()
+        self.font_name = font
+        self._fonts = {}
+
+    def font(self, size):
+        """Return the font of the given size, loading it only once."""
+
+        if size not in self._fonts:
+            self._fonts[size] = ImageFont.truetype(self.font_name, size)
+        return self._fonts[size]
+
+    def fit(self, value, max_width):
+        """Return the biggest font for value to fit in max_width pixels."""
+
+        low, high = 1, self.max_font_size
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.font(middle).getsize(value)[0] <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+        return self.font(low)
+
+    def crop_photo(self, id_photo):
+        """Return id_photo cropped to an id photo ratio and resized."""
+
+        if id_photo.height / id_photo.width > self.id_ratio:
+            new_height = id_photo.width * self.id_ratio
+            diff_height = (id_photo.height - new_height)
+            id_photo = id_photo.crop((0, int(diff_height/2), id_photo.width,
+                int(id_photo.height - diff_height/2)))
+        elif id_photo.height / id_photo.width < self.id_ratio:
+            new_width = id_photo.height / self.id_ratio
+            diff_width = (id_photo.width - new_width)
+            id_photo = id_photo.crop((int(diff_width/2), 0,
+                int(id_photo.width - diff_width/2), id_photo.height))
+
+        height_id = int(self.height - self.header_height - 75)
+        width_id = int(height_id / self.id_ratio)
+        return id_photo.resize((width_id, height_id))
+
+    def photo(self, path):
+        """Return the cropped id photo at path, a placeholder if there is none
+        or if it cannot be read.
+        """
+
+        if path:
+            try:
+                return self.crop_photo(Image.open(path))
+            except OSError:
+                pass
+        height_id = int(self.height - self.header_height - 75)
+        return Image.new('RGB', (int(height_id / self.id_ratio), height_id),
+            PLACEHOLDER_COLOR)
+
+    def render(self, card):
+        """Return the image of card."""
+
+        im = self.template.copy()
+        id_photo = self.photo(card.id_photo)
+        draw = ImageDraw.Draw(im)
+
+        big_width = self.big_width
+        space = self.interspace + self.header_height
+        for value in (str(card.expiration_date), str(card.id), card.first_name,
+                card.last_name):
+            #Adapt font size to available space.
+            font = self.fit(value, self.width - (big_width + id_photo.width))
+            value_height = font.getsize(value)[1]
+            draw.text((2 + big_width, space + \
+                        (self.info_height - value_height ) / 2), value,
+                        fill=self.color1, font=font)
+            space = space + self.interspace + self.info_height
+            big_width = big_width - self.diff_big_small_width - \
+                (self.diff_big_small_width) * (self.interspace / self.info_height)
+
+        im.paste(id_photo, (self.width - id_photo.width - 2,
+            int(self.header_height + 5)))
+        del draw
+        return im
+
+
+_renderer = None
+_executor = None
+
+
+def _render(card):
+    #Each process of the pool loads the assets once.
+    global _renderer
+    if _renderer is None:
+        _renderer = CardRenderer()
+    im = _renderer.render(card).convert('RGB')
+    return (im.size, im.tobytes())
+
+
+def _pool(processes):
+    #The pool is created once per web process instead of once per request.
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=processes)
+    return _executor
+
+
+def _render_all(cards, processes):
+    #A crashed worker breaks the pool for good: the cards of the request are
+    #rendered in this process and the next request creates a new pool.
+    global _executor
+    try:
+        return list(_pool(processes).map(_render, cards, chunksize=8))
+    except BrokenProcessPool:
+        _executor.shutdown(wait=False)
+        _executor = None
+        return list(map(_render, cards))
+
+
+def cards_for(queryset, today=None):
+    """Return the cards of the current members of queryset in one query."""
+
+    users = queryset.model.objects.filter(pk__in=queryset.values('pk')).\
+        members(on=today).select_related('user')
+    return [Card(user.membership_expiration, user.user.id, user.user.first_name,
+        user.user.last_name, user.id_photo.path if user.id_photo else None)
+        for user in users]
+
+
+def render_cards(cards, processes=None):
+    """Return a BytesIO with a PDF of the cards, several cards per page."""
+
+    processes = processes or settings.MEMBER_CARD_PROCESSES
+    width, height = CardRenderer.width, CardRenderer.height
+    columns = (PAGE_SIZE[0] - 2 * PAGE_MARGIN) // width
+    rows = (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // height
+
+    if len(cards) < SERIAL_CARDS:
+        images = map(_render, cards)
+    else:
+        images = _render_all(cards, processes)
+    pages = []
+    for index, (size, data) in enumerate(images):
+        position = index % (columns * rows)
+        if position == 0:
+            pages.append(Image.new('RGB', PAGE_SIZE, 'white'))
+        pages[-1].paste(Image.frombytes('RGB', size, data),
+            (PAGE_MARGIN + (position % columns) * width,
+            PAGE_MARGIN + (position // columns) * height))
+
+    output = BytesIO()
+    pages[0].save(output, 'PDF', resolution=300.0, save_all=True,
+        append_images=pages[1:])
+    output.seek(0)
+    return output
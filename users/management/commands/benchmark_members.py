@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import (connection, transaction)
+from django.test.utils import CaptureQueriesContext
+from datetime import (date, timedelta)
+from management.models import Membership
+from users.models import CustomUser
+import time
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-user membership check with the indexed members() \
+            query on synthetic users. Nothing is kept in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000,
+            help='Number of synthetic users.')
+
+    def measure(self, label, function):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = function()
+            duration = time.perf_counter() - start
+        self.stdout.write('%-40s %8.3f s %6d queries %6d members' % (label,
+            duration, len(queries), result))
+
+    def populate(self, number):
+        today = date.today()
+        users = User.objects.bulk_create([User(username='benchmark-%s' % index,
+            email='benchmark-%s@example.com' % index) for index in range(number)])
+        users = User.objects.filter(username__startswith='benchmark-')
+        CustomUser.objects.bulk_create([CustomUser(user=user,
+            id_photo='protected/users/benchmark.jpg') for user in users])
+        members = CustomUser.objects.filter(user__username__startswith='benchmark-')
+        #Two memberships per user, half of the users are not members anymore.
+        Membership.objects.bulk_create([Membership(member=member,
+            certificate_date=today, membership_copy='admin/memberships/benchmark.jpg',
+            expiration_date=today + timedelta(days=offset if index % 2 else -offset),
+            payment_mean='cash') for index, member in enumerate(members)
+            for offset in (30, 200)])
+        #bulk_create sends no signal, fill the denormalized field by hand.
+        for member in members:
+            member.update_membership_expiration()
+        return members
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                members = self.populate(options['users'])
+                self.measure('is_member() on each user (before)',
+                    lambda: sum(1 for member in members.all()
+                        if member.last_membership() and
+                        member.last_membership().expiration_date >= date.today()))
+                self.measure('members() indexed query (after)',
+                    lambda: len(CustomUser.objects.members().\
+                        filter(user__username__startswith='benchmark-')))
+                raise Rollback()
+        except Rollback:
+            pass
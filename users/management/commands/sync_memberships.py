@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from management.models import Membership
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Recompute the membership expiration date stored on users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', default=False,
+            help='Only report the users whose stored date is wrong.')
+
+    def handle(self, *args, **options):
+        expected = dict(Membership.objects.values_list('member').\
+            annotate(Max('expiration_date')))
+        stored = CustomUser.objects.values_list('pk', 'membership_expiration')
+        drifted = [(pk, expected.get(pk)) for pk, expiration in stored.iterator()
+            if expected.get(pk) != expiration]
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                for pk, expiration in drifted:
+                    CustomUser.objects.filter(pk=pk).\
+                        update(membership_expiration=expiration)
+        self.stdout.write('%s user(s) %s.' % (len(drifted), 'out of sync' if \
+            options['dry_run'] else 'repaired'))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def fill_membership_expiration(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Membership = apps.get_model('management', 'Membership')
+    expirations = Membership.objects.values('member').\
+        annotate(expiration=models.Max('expiration_date'))
+    for expiration in expirations:
+        CustomUser.objects.filter(pk=expiration['member']).\
+            update(membership_expiration=expiration['expiration'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20151026_2012'),
+        ('management', '0003_auto_20151026_2012'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='membership_expiration',
+            field=models.DateField(verbose_name='membership expiration date', blank=True, null=True, db_index=True, editable=False),
+        ),
+        migrations.RunPython(fill_membership_expiration,
+            migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+#The directory is walked in the order of the names and id of auth_user (see
+#users.views.DirectoryView.cursor_ordering), which django.contrib.auth does not
+#index.
+def add_name_index(apps, schema_editor):
+    schema_editor.execute('CREATE INDEX users_directory_name ON auth_user '
+        '(last_name, first_name, id)')
+
+
+def remove_name_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX users_directory_name')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0006_require_contenttypes_0002'),
+        ('users', '0004_customuser_membership_expiration'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_name_index, remove_name_index),
+    ]
@@ -15,6 +15,7 @@ This exports:
     - SCOPES: enumeration for privacy scopes.
     - SHIRT_SIZES: enumeration for shirt sizes. Either 'S', 'M', 'L' or 'XL'.
 
+    - CustomUserQuerySet: class of the querysets of users.
     - CustomUser: class representing the user.
 """
 from django.db import models
@@ -54,6 +55,39 @@ SHIRT_SIZES = (
 )
 
 
+class CustomUserQuerySet(models.QuerySet):
+    """QuerySet of users.
+
+    Methods:
+        - members: return the users who are members on a given date (today by
+            default), using the denormalized membership_expiration.
+        - directory: return the profiles visible with a scope, with only the
+            email addresses and phones visible with this scope.
+    """
+
+    def members(self, on=None):
+        return self.filter(membership_expiration__gte=on or date.today())
+
+    def directory(self, scope):
+        """Return the active users whose profile is visible with scope.
+
+        The email address and the phone are read as visible_email and
+        visible_phone, empty strings when their scope is above scope: hidden
+        values are not selected. The other private fields are deferred.
+        """
+
+        hidden = models.Value('', output_field=models.CharField())
+        return self.filter(global_scope__lte=scope, user__is_active=True).\
+            select_related('user').only('nickname', 'membership_expiration',
+            'global_scope', 'user__first_name', 'user__last_name').\
+            annotate(visible_email=models.Case(models.When(mail_scope__lte=scope,
+                then=models.F('user__email')), default=hidden,
+                output_field=models.CharField()),
+            visible_phone=models.Case(models.When(phone_scope__lte=scope,
+                then=models.F('phone')), default=hidden,
+                output_field=models.CharField()))
+
+
 class CustomUser(models.Model):
     """Model representing a user.
 
@@ -96,6 +130,9 @@ class CustomUser(models.Model):
             Not editable.
         - mail_scope: value of SCOPES enumeration indicating the privacy scope
             for the email address.
+        - membership_expiration: date of expiration of the last membership of
+            the user, kept in sync with membership_history. Can be None. Not
+            editable.
         - nickname: string storing the nickname of the user. Can be None.
         - phone: string storing the phone number of the user.
             Format: +99 9 99 99 99 (up to 15 digits).
@@ -125,6 +162,9 @@ class CustomUser(models.Model):
         - is_manager: return True if the user is the manager of at least one sport.
         - is_member: return True if the user is currently a member (membership
             fees paid for the ongoing semester/year).
+        - last_membership: return the membership expiring last. Can be None.
+        - update_membership_expiration: store the expiration date of the last
+            membership in membership_expiration.
     """
 
     user = models.OneToOneField(User, verbose_name=_('user'))
@@ -140,6 +180,8 @@ class CustomUser(models.Model):
     id_photo = ImageField(_('identity photo'), upload_to='protected/users/')
     mail_scope = models.PositiveSmallIntegerField(_('mail scope'), choices=SCOPES, default=1,
                     validators = [MinValueValidator(SCOPE_REGISTERED),])
+    membership_expiration = models.DateField(_('membership expiration date'), null=True,
+                            blank=True, db_index=True, editable=False)
     modification_date = models.DateTimeField(_('modification date'), auto_now=True)
     nickname = models.CharField(_('nickname'), max_length=20, blank=True)
     phone_regex = RegexValidator(regex = r'^\+?1?\d{9,15}$',
@@ -154,17 +196,16 @@ class CustomUser(models.Model):
     position = models.ForeignKey('management.Position', related_name='users',
                 null=True, blank=True, on_delete=models.SET_NULL, verbose_name=_('position'))
 
+    objects = CustomUserQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
         ordering = ['id',]
 
     def is_member(self):
-        last_membership = self.last_membership()
-        if last_membership:
-            return last_membership.expiration_date >= date.today()
-        else:
-            return False
+        return self.membership_expiration is not None and\
+            self.membership_expiration >= date.today()
 
     def is_manager(self):
         return self.managed_sports.exists()
@@ -175,5 +216,11 @@ class CustomUser(models.Model):
         except ObjectDoesNotExist:
             return None
 
+    def update_membership_expiration(self):
+        self.membership_expiration = self.membership_history.\
+            aggregate(models.Max('expiration_date'))['expiration_date__max']
+        CustomUser.objects.filter(pk=self.pk).\
+            update(membership_expiration=self.membership_expiration)
+
     def __str__(self):
         return '%s (%s)' % (self.user.get_full_name(), self.id)
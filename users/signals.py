@@ -0,0 +1,29 @@
+"""Receivers keeping the membership expiration of users in sync and generating
+the thumbnails of identity photos.
+"""
+from django.db.models.signals import (post_init, post_save, post_delete)
+from django.dispatch import receiver
+from management.models import Membership
+from sportassociation import thumbnails
+from users.models import CustomUser
+
+
+@receiver(post_init, sender=Membership)
+def remember_member(sender, instance, **kwargs):
+    #A membership given to another member leaves the previous one.
+    instance._loaded_member_id = instance.member_id
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def update_membership_expiration(sender, instance, **kwargs):
+    CustomUser(pk=instance.member_id).update_membership_expiration()
+    previous = getattr(instance, '_loaded_member_id', None)
+    if previous is not None and previous != instance.member_id:
+        CustomUser(pk=previous).update_membership_expiration()
+    instance._loaded_member_id = instance.member_id
+
+
+@receiver(post_save, sender=CustomUser)
+def pregenerate_id_photo(sender, instance, **kwargs):
+    thumbnails.pregenerate(instance)
@@ -1,3 +1,156 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from datetime import (date, timedelta)
+from io import StringIO
+from PIL import (Image, ImageFont)
+import tempfile
+from unittest import mock
+from management.models import Membership
+from sports.models import Sport
+from sportassociation.instrumentation import QueryBudgetMixin
+from users import cards
+from users.models import (CustomUser, SCOPE_REGISTERED, SCOPE_MEMBER,
+                        SCOPE_MANAGER, SCOPE_STAFF)
 
-#  Create your tests here.
+
+class MembershipExpirationTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(user=User.objects.create(
+            username='jdoe', email='jdoe@example.com'),
+            id_photo='protected/users/jdoe.jpg')
+
+    def add_membership(self, days):
+        return Membership.objects.create(member=self.user,
+            certificate_date=date.today(), payment_mean='cash',
+            membership_copy='admin/memberships/jdoe.jpg',
+            expiration_date=date.today() + timedelta(days))
+
+    def test_memberships_keep_expiration_in_sync(self):
+        self.add_membership(-10)
+        self.assertFalse(CustomUser.objects.members().exists())
+        current = self.add_membership(100)
+        self.assertEqual(list(CustomUser.objects.members()), [self.user])
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).is_member())
+        current.delete()
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).\
+            membership_expiration, date.today() - timedelta(10))
+
+    def test_membership_given_to_another_member(self):
+        membership = self.add_membership(100)
+        other = CustomUser.objects.create(user=User.objects.create(
+            username='jsmith', email='jsmith@example.com'),
+            id_photo='protected/users/jsmith.jpg')
+        membership = Membership.objects.get(pk=membership.pk)
+        membership.member = other
+        membership.save()
+        self.assertEqual(list(CustomUser.objects.members()), [other])
+        self.assertIsNone(CustomUser.objects.get(pk=self.user.pk).\
+            membership_expiration)
+
+    def test_repair_command(self):
+        self.add_membership(100)
+        CustomUser.objects.update(membership_expiration=None)
+        output = StringIO()
+        call_command('sync_memberships', stdout=output)
+        self.assertIn('1 user(s) repaired', output.getvalue())
+        self.assertTrue(CustomUser.objects.members().exists())
+
+
+class DirectoryTest(QueryBudgetMixin, TestCase):
+    #Session, user, page, subscribed and managed sports, and on the first
+    #request the scope of the user and the saving of the session.
+    query_budgets = {'users:directory': 9}
+
+    def setUp(self):
+        expiration = date.today() + timedelta(100)
+        sport = Sport.objects.create(name='Escalade', slug='escalade')
+        for index in range(60):
+            member = CustomUser.objects.create(user=User.objects.create(
+                username='member%02d' % index, last_name='Member %02d' % index,
+                email='member%02d@example.com' % index),
+                id_photo='protected/users/member.jpg', phone='+33600000%03d' %
+                index, global_scope=SCOPE_REGISTERED if index % 2 else
+                SCOPE_STAFF, mail_scope=SCOPE_MEMBER if index % 3 else
+                SCOPE_REGISTERED, phone_scope=SCOPE_MANAGER)
+            CustomUser.objects.filter(pk=member.pk).\
+                update(membership_expiration=expiration)
+            sport.participants.add(member)
+        User.objects.create_user('jdoe', 'jdoe@example.com', 'secret')
+        self.client.login(username='jdoe', password='secret')
+
+    def test_scopes_are_applied_in_sql(self):
+        visible = CustomUser.objects.directory(SCOPE_REGISTERED).\
+            order_by('user__last_name')
+        self.assertEqual(len(visible), 30)
+        self.assertEqual((visible[0].user.last_name, visible[0].visible_email,
+            visible[0].visible_phone), ('Member 01', '', ''))
+        self.assertEqual(visible[1].visible_email, 'member03@example.com')
+        #Hidden fields are deferred, not selected then blanked.
+        self.assertIn('phone', visible[0].get_deferred_fields())
+        staff = CustomUser.objects.directory(SCOPE_STAFF)
+        self.assertEqual(staff.count(), 60)
+        self.assertEqual(staff.get(user__username='member00').visible_phone,
+            '+33600000000')
+
+    def test_directory_pages(self):
+        response = self.client.get(reverse('users:directory'))
+        self.assertWithinBudget(response)
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 30)
+        self.assertFalse(page.has_next())
+        self.assertNotContains(response, 'member01@example.com')
+        self.assertContains(response, 'member03@example.com')
+        self.assertNotContains(response, 'Member 00')
+        self.assertContains(response, 'Escalade', count=30)
+
+        User.objects.filter(username='jdoe').update(is_staff=True)
+        self.client.logout()
+        self.client.login(username='jdoe', password='secret')
+        response = self.client.get(reverse('users:directory'))
+        self.assertEqual(len(response.context['page_obj']), 50)
+        response = self.client.get(reverse('users:directory'),
+            {'cursor': response.context['page_obj'].next_cursor})
+        #The scope of the user is cached in the session.
+        self.assertWithinBudget(response, 5)
+        self.assertEqual([member.user.last_name for member in \
+            response.context['page_obj']][0], 'Member 50')
+        self.assertContains(response, '+33600000059')
+
+
+class CardTest(TestCase):
+
+    def setUp(self):
+        template = tempfile.NamedTemporaryFile(suffix='.png')
+        self.addCleanup(template.close)
+        Image.new('RGB', (cards.CardRenderer.width,
+            cards.CardRenderer.height), 'white').save(template, 'PNG')
+        template.flush()
+        patch = mock.patch.object(cards.CardRenderer, 'font',
+            lambda renderer, size: ImageFont.load_default())
+        patch.start()
+        self.addCleanup(patch.stop)
+        #The renderer of the process is loaded with the test template.
+        cards._renderer = cards.CardRenderer(template=template.name)
+        self.addCleanup(setattr, cards, '_renderer', None)
+
+    def test_members_without_photo_get_a_placeholder(self):
+        card = cards.Card(date.today(), 1, 'John', 'Doe', None)
+        missing = card._replace(id_photo='/nonexistent/jdoe.jpg')
+        with mock.patch.object(cards, 'ProcessPoolExecutor') as pool:
+            pdf = cards.render_cards([card, missing])
+        #Small selections are rendered without the pool of processes.
+        self.assertFalse(pool.called)
+        self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+    def test_broken_pool_is_replaced(self):
+        card = cards.Card(date.today(), 1, 'John', 'Doe', None)
+        broken = mock.Mock()
+        broken.map.side_effect = cards.BrokenProcessPool()
+        with mock.patch.object(cards, '_executor', broken):
+            pdf = cards.render_cards([card] * cards.SERIAL_CARDS)
+            self.assertIsNone(cards._executor)
+        self.assertTrue(broken.shutdown.called)
+        self.assertTrue(pdf.read().startswith(b'%PDF'))
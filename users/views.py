@@ -3,7 +3,8 @@ from django.http import HttpResponseRedirect
 from .forms import AdminUserForm
 from .models import CustomUser
 from sportassociation import settings
-from django.views.generic import (View, DetailView, UpdateView)
+from django.views.generic import (View, DetailView, UpdateView, ListView)
+from django.db.models import Prefetch
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import permission_required
 from django.utils.decorators import method_decorator
@@ -15,6 +16,9 @@ from django.utils import text
 from django.core.exceptions import ObjectDoesNotExist
 from smtplib import SMTPException
 from django.core.urlresolvers import reverse_lazy
+from management.media import user_scope
+from sports.models import Sport
+from sportassociation.pagination import CursorPaginationMixin
 
 class AdminUserCreateView(View):
     initial = {'form': AdminUserForm()}
@@ -87,3 +91,21 @@ class AccountEdit(UpdateView):
 
 class DisplayView(DetailView):
     model = CustomUser
+
+class DirectoryView(CursorPaginationMixin, ListView):
+    """Directory of the current members whose profile is visible to the user,
+    showing the email addresses and phones their scope allows.
+    """
+
+    template_name = 'users/directory.html'
+    paginate_by = 50
+    #Same columns as the users_directory_name index of auth_user, the user
+    #being unique to its profile.
+    cursor_ordering = ('user__last_name', 'user__first_name', 'user__pk')
+
+    def get_queryset(self):
+        sports = Sport.objects.only('name', 'slug')
+        return CustomUser.objects.members().\
+            directory(user_scope(self.request)).prefetch_related(
+            Prefetch('subscribed_sports', queryset=sports),
+            Prefetch('managed_sports', queryset=sports))